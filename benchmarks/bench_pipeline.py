@@ -0,0 +1,259 @@
+"""GifMaker 渲染流程基准测试
+
+生成不同数量、分辨率、格式 (PNG/JPEG) 和模式 (RGB/RGBA/P) 的合成图片，
+测量 create_gif 的端到端耗时和各阶段耗时、峰值内存和输出文件大小，
+结果写入JSON，可以与之前的结果比较并按阈值判断是否变慢。
+每个用例还会解码输出的第一帧和最后一帧，检查淡入淡出的颜色，不符合时运行失败。
+
+用法:
+    python benchmarks/bench_pipeline.py -o results.json
+    python benchmarks/bench_pipeline.py --quick -o new.json --compare results.json --threshold 0.1
+
+每个用例在单独的进程中运行，峰值内存 (peak_rss_kb) 只包含该用例。
+比较时任一指标比基准增加超过阈值即视为退化，退出码为1。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from gif_maker import GifMaker  # noqa: E402
+from instrument import StageAggregator  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# (图片数, 图片分辨率, 格式, 模式)
+DEFAULT_CASES = [
+    (10, (1280, 720), 'JPEG', 'RGB'),
+    (10, (1920, 1080), 'PNG', 'RGB'),
+    (10, (1024, 768), 'PNG', 'RGBA'),
+    (10, (800, 600), 'PNG', 'P'),
+    (40, (1920, 1080), 'JPEG', 'RGB'),
+]
+QUICK_CASES = [
+    (4, (640, 480), 'JPEG', 'RGB'),
+    (4, (640, 480), 'PNG', 'RGBA'),
+    (4, (640, 480), 'PNG', 'P'),
+]
+
+# 端到端渲染中单独记录耗时的阶段：结果中的指标名 -> Instrumentation 的阶段名
+PIPELINE_STAGES = {
+    'decode_seconds': 'decode',
+    'resize_seconds': 'resize',
+    'blend_seconds': 'blend',
+    'pipeline_quantize_seconds': 'quantize',
+    'pipeline_write_seconds': 'write',
+}
+
+# 最后一帧（淡出）与未量化的参考帧之间允许的平均误差
+FADE_TOLERANCE = 8
+
+# 参与比较的指标，数值越大越差
+COMPARED_METRICS = (
+    'end_to_end_seconds', 'decode_seconds', 'resize_seconds', 'blend_seconds',
+    'pipeline_quantize_seconds', 'pipeline_write_seconds',
+    'peak_rss_kb', 'output_bytes',
+)
+
+
+def case_id(count, resolution, image_format, mode):
+    return f"{count}x{resolution[0]}x{resolution[1]}-{image_format.lower()}-{mode.lower()}"
+
+
+def generate_slides(directory, count, resolution, image_format, mode, seed=0):
+    """生成带渐变和噪声的合成图片
+    
+    Returns:
+        list: 图片路径列表
+    """
+    rng = np.random.default_rng(seed)
+    width, height = resolution
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    paths = []
+    for i in range(count):
+        base = np.stack([
+            x / width * 255,
+            y / height * 255,
+            np.full_like(x, (i * 37) % 256),
+        ], axis=-1)
+        noise = rng.normal(0, 12, base.shape)
+        array = np.clip(base + noise, 0, 255).astype(np.uint8)
+        image = Image.fromarray(array)
+        if mode == 'RGBA':
+            image = image.convert('RGBA')
+        elif mode == 'P':
+            image = image.convert('P', palette=Image.Palette.ADAPTIVE)
+        extension = '.jpg' if image_format == 'JPEG' else '.png'
+        path = os.path.join(directory, f"slide_{i:04d}{extension}")
+        image.save(path, image_format)
+        paths.append(path)
+    return paths
+
+
+def pipeline_stages(aggregator):
+    """从 StageAggregator 读取 PIPELINE_STAGES 中各阶段的总耗时
+    
+    Raises:
+        RuntimeError: 当某个阶段没有任何记录时（渲染流程不再报告该阶段，指标没有意义）
+    """
+    stages = aggregator.summary()['stages']
+    result = {}
+    for metric, stage in PIPELINE_STAGES.items():
+        if stages.get(stage, {}).get('calls', 0) == 0:
+            raise RuntimeError(f"渲染过程中没有记录 '{stage}' 阶段")
+        result[metric] = stages[stage]['seconds']
+    return result
+
+
+def check_fade_frames(maker, output_path, size, transition_frames):
+    """解码输出的第一帧和最后一帧，与过渡色和未量化的参考帧比较
+    
+    第一帧是淡入的起点，必须与过渡色完全相同；最后一帧是淡出的最后一步，
+    与参考帧的平均误差不能超过 FADE_TOLERANCE。
+    
+    Returns:
+        dict: 'fade_in_error' 和 'fade_out_error'（每个通道的平均绝对误差）
+    
+    Raises:
+        RuntimeError: 当淡入淡出的颜色不正确时
+    """
+    timeline = maker.build_timeline(transition_frames)
+    slides = {}
+    
+    def slide(index):
+        if index not in slides:
+            slides[index] = np.asarray(maker.load_slide(maker.image_items[index], size))
+        return slides[index]
+    
+    errors = {}
+    with Image.open(output_path) as image:
+        for key, position in (('fade_in_error', 0), ('fade_out_error', image.n_frames - 1)):
+            image.seek(position)
+            decoded = np.asarray(image.convert('RGB'), dtype=np.int16)
+            reference = maker.render_frame(timeline[position], slide).astype(np.int16)
+            errors[key] = float(np.abs(decoded - reference).mean())
+    
+    fade_color = maker.fade_color()
+    if errors['fade_in_error'] != 0:
+        raise RuntimeError(f"第一帧不是过渡色 {fade_color}，平均误差 {errors['fade_in_error']:.2f}")
+    if errors['fade_out_error'] > FADE_TOLERANCE:
+        raise RuntimeError(f"最后一帧与过渡色 {fade_color} 的淡出参考帧相差 {errors['fade_out_error']:.2f}")
+    return errors
+
+
+def run_case(case, size, transition_frames):
+    """运行一个用例（在子进程中调用）"""
+    count, resolution, image_format, mode = case
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_slides(directory, count, tuple(resolution), image_format, mode)
+        maker = GifMaker()
+        for path in paths:
+            maker.add_image(path, 1000)
+        
+        result = {'id': case_id(*case), 'slides': count, 'resolution': list(resolution),
+                  'format': image_format, 'mode': mode, 'size': list(size),
+                  'transition_frames': transition_frames}
+        
+        # 端到端渲染，各阶段耗时取自 Instrumentation 记录的区间
+        aggregator = StageAggregator()
+        maker.instrumentation.add_listener(aggregator)
+        output_path = os.path.join(directory, 'out.gif')
+        start = time.perf_counter()
+        maker.create_gif(output_path, size=size, transition_frames=transition_frames)
+        result['end_to_end_seconds'] = time.perf_counter() - start
+        maker.instrumentation.remove_listener(aggregator)
+        result.update(pipeline_stages(aggregator))
+        result.update(check_fade_frames(maker, output_path, size, transition_frames))
+        result['frames'] = maker.count_frames(transition_frames)
+        result['output_bytes'] = os.path.getsize(output_path)
+    
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以字节为单位，Linux 以KB为单位
+        result['peak_rss_kb'] = peak // 1024 if sys.platform == 'darwin' else peak
+    else:
+        result['peak_rss_kb'] = None
+    for key, value in result.items():
+        if isinstance(value, float):
+            result[key] = round(value, 4)
+    return result
+
+
+def run_all(cases, size, transition_frames):
+    """每个用例使用新的子进程运行，避免内存峰值相互影响"""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for case in cases:
+        with context.Pool(1) as pool:
+            result = pool.apply(run_case, (case, size, transition_frames))
+        print(f"{result['id']}: {result['end_to_end_seconds']:.3f}s, "
+              f"{result['output_bytes']} bytes, peak {result['peak_rss_kb']} KB", file=sys.stderr)
+        results.append(result)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """与基准结果比较，返回退化的指标列表"""
+    baseline_cases = {case['id']: case for case in baseline.get('cases', [])}
+    regressions = []
+    for case in results:
+        old = baseline_cases.get(case['id'])
+        if old is None:
+            continue
+        for metric in COMPARED_METRICS:
+            new_value, old_value = case.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = new_value / old_value - 1
+            if change > threshold:
+                regressions.append({'id': case['id'], 'metric': metric, 'baseline': old_value,
+                                    'current': new_value, 'change': round(change, 4)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GifMaker 渲染流程基准测试")
+    parser.add_argument('-o', '--output', default='bench_results.json', help="结果JSON路径")
+    parser.add_argument('--quick', action='store_true', help="只运行少量小用例")
+    parser.add_argument('--size', type=int, nargs=2, default=(800, 600), help="输出GIF大小")
+    parser.add_argument('--transition-frames', type=int, default=15, help="过渡帧数")
+    parser.add_argument('--compare', help="用于比较的基准结果JSON")
+    parser.add_argument('--threshold', type=float, default=0.1, help="判定退化的相对增幅")
+    args = parser.parse_args(argv)
+    
+    cases = QUICK_CASES if args.quick else DEFAULT_CASES
+    results = run_all(cases, tuple(args.size), args.transition_frames)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cases': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for item in regressions:
+            print(f"退化: {item['id']} {item['metric']} {item['baseline']} -> {item['current']} "
+                  f"(+{item['change']:.1%})", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
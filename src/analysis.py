@@ -0,0 +1,211 @@
+"""图片内容分析
+
+每张图片按最小的比例解码后缩小到 ANALYSIS_EDGE x ANALYSIS_EDGE，一次计算
+平均颜色、主要颜色、稀疏颜色直方图（用于生成调色板）、感知哈希（用于查找重复图片）
+和 SIGNATURE_EDGE x SIGNATURE_EDGE 的缩略数组（用于比较相邻图片的差异）。
+所有统计都是对整个数组的 numpy 运算，不逐像素循环。
+"""
+from collections import namedtuple
+from PIL import Image
+import numpy as np
+
+# 分析时图片缩小到的边长
+ANALYSIS_EDGE = 64
+# 比较相邻图片时使用的缩略数组边长
+SIGNATURE_EDGE = 32
+# 颜色直方图每个通道的位数，与 PaletteQuantizer 查找表的默认精度相同
+HISTOGRAM_BITS = 5
+# 选取主要颜色时每个通道的位数（更粗的分组，避免渐变被分散到很多格子里）
+DOMINANT_BITS = 4
+# 感知哈希：对缩略数组的灰度图做DCT，取左上角 HASH_SIZE x HASH_SIZE 的低频系数
+HASH_SIZE = 8
+# 判定为重复图片的最大哈希距离（64位中不同的位数）
+DUPLICATE_DISTANCE = 6
+# 判定为重复图片时平均颜色每个通道允许的最大差值；纯色图片的哈希都相同，需要用颜色区分
+DUPLICATE_COLOR_DISTANCE = 24
+# 缩小JPEG时 draft 预留的倍数，与 gif_maker.REDUCING_GAP 相同
+REDUCING_GAP = 2.0
+
+# 分析结果
+#   mean: 平均颜色 (R, G, B)
+#   dominant: 主要颜色 (R, G, B)，即像素最多的颜色分组的平均颜色
+#   bins: 颜色直方图中非空格子的索引（uint16，RGB 各 HISTOGRAM_BITS 位）
+#   counts: 对应格子的像素数（uint16），总数为 ANALYSIS_EDGE ** 2
+#   phash: 64位感知哈希
+#   signature: int16 RGB 数组 (SIGNATURE_EDGE, SIGNATURE_EDGE, 3)
+SlideStats = namedtuple('SlideStats', ['mean', 'dominant', 'bins', 'counts', 'phash', 'signature'])
+
+# 每个字节中为1的位数
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n):
+    """n 点正交 DCT-II 变换矩阵"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(SIGNATURE_EDGE)
+# 哈希的第 k 位对应的权重，用于把64个布尔值打包为整数
+_HASH_WEIGHTS = np.uint64(1) << np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64)
+
+
+def perceptual_hash(gray):
+    """计算灰度图的64位感知哈希
+    
+    低频DCT系数大于中值（不含直流分量）的位置为1，对缩放、压缩和轻微的颜色调整不敏感。
+    
+    Args:
+        gray: float 灰度数组 (SIGNATURE_EDGE, SIGNATURE_EDGE)
+    
+    Returns:
+        int: 64位哈希
+    """
+    coefficients = (_DCT @ gray @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = coefficients > np.median(coefficients[1:])
+    return int(_HASH_WEIGHTS[bits].sum())
+
+
+def hash_distances(phash, hashes):
+    """计算一个哈希与一组哈希之间的汉明距离
+    
+    Args:
+        phash: 64位哈希
+        hashes: uint64 哈希数组
+    
+    Returns:
+        numpy.ndarray: 每个哈希不同的位数
+    """
+    hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+    different = np.bitwise_xor(hashes, np.uint64(phash))
+    return _POPCOUNT[different.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def analyze_image(image):
+    """分析一张已打开的图片
+    
+    JPEG 按不小于 ANALYSIS_EDGE 的最小比例直接解码。
+    
+    Args:
+        image: PIL Image 对象（尚未加载时可以使用 draft）
+    
+    Returns:
+        SlideStats: 分析结果
+    """
+    image.draft(None, (int(ANALYSIS_EDGE * REDUCING_GAP), int(ANALYSIS_EDGE * REDUCING_GAP)))
+    rgb = image.convert('RGB')
+    small = rgb.resize((ANALYSIS_EDGE, ANALYSIS_EDGE), Image.Resampling.BOX, reducing_gap=REDUCING_GAP)
+    signature = np.asarray(
+        rgb.resize((SIGNATURE_EDGE, SIGNATURE_EDGE), Image.Resampling.BOX, reducing_gap=REDUCING_GAP),
+        dtype=np.int16
+    )
+    
+    pixels = np.asarray(small).reshape(-1, 3)
+    mean = tuple(int(v) for v in pixels.mean(axis=0).round())
+    
+    # 稀疏直方图：只保存非空格子
+    shift = 8 - HISTOGRAM_BITS
+    channels = (pixels >> shift).astype(np.uint32)
+    index = (channels[:, 0] << (2 * HISTOGRAM_BITS)) | (channels[:, 1] << HISTOGRAM_BITS) | channels[:, 2]
+    histogram = np.bincount(index, minlength=1 << (3 * HISTOGRAM_BITS))
+    bins = np.flatnonzero(histogram)
+    
+    # 主要颜色：按更粗的分组找出像素最多的一组，取组内像素的平均值
+    shift = 8 - DOMINANT_BITS
+    coarse = (pixels >> shift).astype(np.uint32)
+    group = (coarse[:, 0] << (2 * DOMINANT_BITS)) | (coarse[:, 1] << DOMINANT_BITS) | coarse[:, 2]
+    members = pixels[group == np.bincount(group).argmax()]
+    dominant = tuple(int(v) for v in members.mean(axis=0).round())
+    
+    gray = signature @ np.array([0.299, 0.587, 0.114])
+    return SlideStats(
+        mean, dominant, bins.astype(np.uint16), histogram[bins].astype(np.uint16),
+        perceptual_hash(gray), signature
+    )
+
+
+def analyze_file(path):
+    """打开并分析一个图片文件（见 analyze_image）
+    
+    Raises:
+        Exception: 当文件无法作为图片打开或解码时
+    """
+    with Image.open(path) as image:
+        return analyze_image(image)
+
+
+def histogram_colors(stats):
+    """把稀疏直方图展开为颜色数组和对应的像素数
+    
+    Args:
+        stats: SlideStats
+    
+    Returns:
+        tuple: (uint8 颜色数组 (n, 3)，每个颜色为格子中心, 像素数数组 (n,))
+    """
+    bins = stats.bins.astype(np.uint32)
+    mask = (1 << HISTOGRAM_BITS) - 1
+    channels = np.stack([bins >> (2 * HISTOGRAM_BITS), (bins >> HISTOGRAM_BITS) & mask, bins & mask], axis=1)
+    step = 1 << (8 - HISTOGRAM_BITS)
+    return (channels * step + step // 2).astype(np.uint8), stats.counts.astype(np.int64)
+
+
+def combined_dominant_color(stats_list):
+    """合并多张图片的直方图，返回整体的主要颜色
+    
+    Args:
+        stats_list: SlideStats 列表
+    
+    Returns:
+        tuple: (R, G, B)，列表为空时返回 None
+    """
+    if not stats_list:
+        return None
+    colors, counts = zip(*(histogram_colors(stats) for stats in stats_list))
+    colors = np.concatenate(colors)
+    counts = np.concatenate(counts)
+    coarse = (colors >> (8 - DOMINANT_BITS)).astype(np.uint32)
+    group = (coarse[:, 0] << (2 * DOMINANT_BITS)) | (coarse[:, 1] << DOMINANT_BITS) | coarse[:, 2]
+    members = group == np.bincount(group, weights=counts).argmax()
+    color = (colors[members] * counts[members, None]).sum(axis=0) / counts[members].sum()
+    return tuple(int(v) for v in color.round())
+
+
+def find_duplicates(stats_list, max_distance=DUPLICATE_DISTANCE, max_color_distance=DUPLICATE_COLOR_DISTANCE,
+                    block=256):
+    """查找与前面某张图片几乎相同的图片
+    
+    哈希距离不超过 max_distance 且平均颜色每个通道相差不超过 max_color_distance
+    即视为重复。按 block 行分块计算距离矩阵，内存占用与图片数成正比。
+    
+    Args:
+        stats_list: SlideStats 列表，无法分析的图片为 None
+        max_distance: 最大哈希距离
+        max_color_distance: 平均颜色每个通道的最大差值
+        block: 每次计算的行数
+    
+    Returns:
+        list: (图片索引, 最早的相同图片索引) 的列表，按图片索引排序
+    """
+    valid = [i for i, stats in enumerate(stats_list) if stats is not None]
+    if len(valid) < 2:
+        return []
+    hashes = np.array([stats_list[i].phash for i in valid], dtype=np.uint64)
+    means = np.array([stats_list[i].mean for i in valid], dtype=np.int16)
+    hash_bytes = hashes.view(np.uint8).reshape(-1, 8)
+    
+    duplicates = []
+    for start in range(1, len(valid), block):
+        stop = min(start + block, len(valid))
+        # 只需要和前面的图片比较
+        different = np.bitwise_xor(hash_bytes[start:stop, None, :], hash_bytes[None, :stop, :])
+        distance = _POPCOUNT[different].sum(axis=2, dtype=np.uint16)
+        color = np.abs(means[start:stop, None, :] - means[None, :stop, :]).max(axis=2)
+        similar = (distance <= max_distance) & (color <= max_color_distance)
+        similar &= np.arange(stop)[None, :] < np.arange(start, stop)[:, None]
+        for row in np.flatnonzero(similar.any(axis=1)):
+            duplicates.append((valid[start + row], valid[int(similar[row].argmax())]))
+    return duplicates
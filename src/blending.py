@@ -0,0 +1,96 @@
+import numpy as np
+
+# 定点混合权重的精度：权重取值 0..256，对应 alpha 0.0..1.0
+WEIGHT_BITS = 8
+WEIGHT_ONE = 1 << WEIGHT_BITS
+
+# 每个批次允许使用的缓冲区大小（字节）
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def alpha_weights(steps, reverse=False):
+    """计算过渡每一步的定点权重
+    
+    第 i 步的权重为 round(256 * i / steps)，与原来的 alpha = i / steps 对应。
+    
+    Args:
+        steps: 过渡步数
+        reverse: 为True时权重从大到小排列（alpha = 1 - i / steps）
+        
+    Returns:
+        numpy.ndarray: uint16 权重数组
+    """
+    i = np.arange(steps, dtype=np.uint32)
+    if reverse:
+        i = steps - i
+    return ((i * WEIGHT_ONE + steps // 2) // steps).astype(np.uint16)
+
+
+def blend_frames(src, dst, weights, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """批量计算 src 与 dst 之间的混合帧
+    
+    使用 uint16 定点运算：out = (src * (256 - w) + dst * w + 128) >> 8。
+    每个批次同时计算多帧，所有中间结果写入预先分配的缓冲区。
+    src 和 dst 之一可以是颜色元组，此时按常量颜色混合，不会创建整幅背景数组。
+    
+    注意：生成的数组是内部缓冲区的视图，在取下一帧之前有效，需要保留时请自行复制。
+    
+    Args:
+        src: uint8 图片数组 (高, 宽, 通道) 或颜色元组
+        dst: uint8 图片数组 (高, 宽, 通道) 或颜色元组
+        weights: dst 的权重序列，取值 0..256
+        chunk_bytes: 每个批次允许使用的缓冲区大小（字节）
+        
+    Yields:
+        numpy.ndarray: uint8 混合帧
+        
+    Raises:
+        ValueError: 当 src 和 dst 都是颜色或尺寸不一致时
+    """
+    weights = np.asarray(weights, dtype=np.uint16)
+    if not isinstance(src, np.ndarray):
+        if not isinstance(dst, np.ndarray):
+            raise ValueError("至少需要一张图片参与混合")
+        # 颜色在前时交换两者并反转权重
+        src, dst = dst, src
+        weights = WEIGHT_ONE - weights
+    
+    src = np.asarray(src, dtype=np.uint8)
+    if isinstance(dst, np.ndarray):
+        dst = np.asarray(dst, dtype=np.uint8)
+        if dst.shape != src.shape:
+            raise ValueError("混合的两张图片尺寸不一致")
+        color = None
+    else:
+        # 只展开成一行像素，按行广播时内层循环是连续内存
+        color = np.broadcast_to(np.asarray(dst, dtype=np.uint16), src.shape[1:]).copy()
+    
+    steps = len(weights)
+    if steps == 0:
+        return
+    
+    # 每帧需要 uint16 累加缓冲、uint16 临时缓冲和 uint8 输出缓冲
+    per_frame = src.size * (2 + (2 if color is None else 0) + 1)
+    chunk = max(1, min(steps, chunk_bytes // per_frame))
+    
+    work = np.empty((chunk,) + src.shape, dtype=np.uint16)
+    temp = np.empty_like(work) if color is None else None
+    out = np.empty((chunk,) + src.shape, dtype=np.uint8)
+    shape = (-1,) + (1,) * src.ndim
+    
+    for start in range(0, steps, chunk):
+        w = weights[start:start + chunk]
+        n = len(w)
+        acc = work[:n]
+        np.multiply(src, (WEIGHT_ONE - w).reshape(shape), out=acc)
+        if color is None:
+            np.multiply(dst, w.reshape(shape), out=temp[:n])
+            np.add(acc, temp[:n], out=acc)
+            np.add(acc, WEIGHT_ONE // 2, out=acc)
+        else:
+            # 常量颜色项只有 (n, 1, 宽, 通道) 大小
+            np.add(acc, color[np.newaxis] * w.reshape(shape) + WEIGHT_ONE // 2, out=acc)
+        np.right_shift(acc, WEIGHT_BITS, out=acc)
+        np.copyto(out[:n], acc, casting='unsafe')
+        for j in range(n):
+            yield out[j]
@@ -0,0 +1,346 @@
+"""命令行批量渲染
+
+不依赖 tkinter，可以在没有显示器的服务器上运行。
+
+用法:
+    python cli.py deck.json
+    python cli.py manifests/ --jobs 4 --summary summary.json
+
+清单文件 (JSON) 格式:
+    {
+        "output": "deck.gif",
+        "size": [800, 600],
+        "transition_frames": 15,
+        "duration": 1000,
+        "transition": "crossfade",
+        "slides": [
+            "cover.png",
+            {"path": "photo.jpg", "duration": 2000, "transition": "slide_left"}
+        ],
+        "renditions": [
+            {"output": "deck_thumb.gif", "size": [320, 240]}
+        ]
+    }
+相对路径相对于清单文件所在目录。"transition" 为到下一张图片的过渡效果，
+可选名称见 transitions.TRANSITIONS。可选的 "options" 会原样传给 GifMaker.create_gif，
+例如 {"palette": "pair", "dither": true, "workers": 4}。
+输出格式按 "output" 的扩展名判断（.gif/.webp/.png/.mp4/.webm）。
+可选的 "renditions" 列出其他尺寸的输出，与主输出在同一遍中生成，每张图片只解码一次。
+可选的 "max_bytes" 为GIF文件大小上限，此时 "size"、"transition_frames" 和 "colors" 选项是上限，
+实际使用的设置由 GifMaker.create_gif_within 选择并记录在结果的 'budget' 中。
+可选的 "fade_color" 为开头淡入、结尾淡出的过渡色 [R, G, B]，或 "auto" 表示使用首尾图片的主要颜色，
+默认为白色。
+使用 --compare 时以输出路径去掉扩展名为基础，生成当前环境可用的全部格式并比较大小和耗时。
+
+退出码: 0 全部成功，1 有任务失败，2 参数错误。
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+
+from gif_maker import GifMaker
+from outputs import compare_formats, detect_format, format_report
+from transitions import get_transition
+
+# 清单中可以传给 create_gif 的选项
+RENDER_OPTIONS = (
+    'workers', 'executor', 'palette', 'colors', 'dither', 'optimize', 'output_format', 'quality',
+    'adaptive_transitions', 'merge_tolerance', 'encode_workers',
+)
+
+
+def load_manifest(manifest_path):
+    """读取并检查清单文件
+    
+    Args:
+        manifest_path: 清单文件路径
+        
+    Returns:
+        dict: 规范化后的清单，路径均为绝对路径
+        
+    Raises:
+        ValueError: 当清单格式无效时
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        try:
+            manifest = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"清单不是有效的JSON: {e}")
+    default_output = os.path.splitext(os.path.basename(manifest_path))[0] + '.gif'
+    return parse_manifest(manifest, os.path.dirname(os.path.abspath(manifest_path)), default_output)
+
+
+def parse_manifest(manifest, base_dir, default_output='output.gif'):
+    """检查已读取的清单对象
+    
+    Args:
+        manifest: 清单对象（JSON解析结果）
+        base_dir: 解析相对路径使用的目录
+        default_output: 清单中没有 "output" 时使用的输出文件名
+        
+    Returns:
+        dict: 规范化后的清单，路径均为绝对路径
+        
+    Raises:
+        ValueError: 当清单格式无效时
+    """
+    if not isinstance(manifest, dict):
+        raise ValueError("清单必须是JSON对象")
+    
+    resolve = lambda path: os.path.normpath(os.path.join(base_dir, path))
+    
+    slides = manifest.get('slides')
+    if not slides:
+        raise ValueError("清单中没有图片 (slides)")
+    default_duration = int(manifest.get('duration', 1000))
+    default_transition = get_transition(manifest.get('transition')).name
+    items = []
+    for slide in slides:
+        if isinstance(slide, str):
+            slide = {'path': slide}
+        if not isinstance(slide, dict) or 'path' not in slide:
+            raise ValueError(f"无效的图片条目: {slide!r}")
+        items.append({
+            'path': resolve(slide['path']),
+            'duration': int(slide.get('duration', default_duration)),
+            'transition': get_transition(slide.get('transition', default_transition)).name,
+        })
+    
+    output = manifest.get('output') or default_output
+    
+    size = _parse_size(manifest.get('size', (800, 600)))
+    
+    renditions = []
+    for rendition in manifest.get('renditions', []):
+        if not isinstance(rendition, dict) or 'output' not in rendition or 'size' not in rendition:
+            raise ValueError(f"无效的输出条目: {rendition!r}")
+        renditions.append({'output': resolve(rendition['output']), 'size': _parse_size(rendition['size'])})
+    
+    transition_frames = int(manifest.get('transition_frames', 15))
+    if transition_frames < 1:
+        raise ValueError("过渡帧数必须大于0")
+    
+    max_bytes = manifest.get('max_bytes')
+    if max_bytes is not None and int(max_bytes) < 1:
+        raise ValueError(f"无效的文件大小上限: {max_bytes!r}")
+    
+    fade_color = manifest.get('fade_color')
+    if fade_color is not None and fade_color != 'auto':
+        if (not isinstance(fade_color, (list, tuple)) or len(fade_color) != 3
+                or not all(isinstance(v, int) and 0 <= v <= 255 for v in fade_color)):
+            raise ValueError(f"无效的过渡色: {fade_color!r}")
+        fade_color = tuple(fade_color)
+    
+    options = manifest.get('options', {})
+    unknown = set(options) - set(RENDER_OPTIONS)
+    if unknown:
+        raise ValueError(f"不支持的选项: {', '.join(sorted(unknown))}")
+    
+    return {
+        'slides': items,
+        'output': resolve(output),
+        'size': size,
+        'renditions': renditions,
+        'max_bytes': int(max_bytes) if max_bytes is not None else None,
+        'transition_frames': transition_frames,
+        'fade_color': fade_color,
+        'options': options,
+    }
+
+
+def _parse_size(size):
+    """检查并规范化输出大小 [宽, 高]"""
+    if len(size) != 2 or min(int(v) for v in size) < 1:
+        raise ValueError(f"无效的输出大小: {size!r}")
+    return (int(size[0]), int(size[1]))
+
+
+def render_manifest(manifest_path, compare=False, manifest=None, slide_cache=None, segment_cache=None):
+    """渲染一个清单，返回可序列化为JSON的结果
+    
+    Args:
+        manifest_path: 清单文件路径，传入 manifest 时只作为结果中的标识
+        compare: 为True时生成全部可用格式，结果中的 'formats' 为各格式的大小和耗时
+            （只比较主输出，不生成 renditions）
+        manifest: 已由 parse_manifest 检查过的清单，None 表示从 manifest_path 读取
+        slide_cache: 可选的 SlideCache，在多个任务之间复用
+        segment_cache: 可选的 SegmentCache，在多个任务之间复用
+        
+    Returns:
+        dict: 任务结果，包含状态、输出路径、帧数、文件大小和各阶段耗时
+    """
+    result = {'manifest': manifest_path, 'status': 'error'}
+    start = time.perf_counter()
+    try:
+        if manifest is None:
+            manifest = load_manifest(manifest_path)
+        result['output'] = manifest['output']
+        
+        maker = GifMaker(slide_cache=slide_cache, segment_cache=segment_cache)
+        if manifest['fade_color'] == 'auto':
+            maker.auto_fade_color = True
+        elif manifest['fade_color'] is not None:
+            maker.transition_color = manifest['fade_color']
+        with contextlib.redirect_stdout(sys.stderr):
+            for slide in manifest['slides']:
+                if not maker.add_image(slide['path'], slide['duration']):
+                    raise ValueError(f"添加图片失败: {slide['path']}")
+                maker.set_transition(len(maker.image_items) - 1, slide['transition'])
+        loaded = time.perf_counter()
+        
+        transition_frames = manifest['transition_frames']
+        if compare:
+            options = dict(manifest['options'])
+            output_format = detect_format(manifest['output'], options.pop('output_format', None))
+            formats = compare_formats(
+                maker,
+                os.path.splitext(manifest['output'])[0],
+                size=manifest['size'],
+                transition_frames=manifest['transition_frames'],
+                **options
+            )
+            result['formats'] = formats
+            primary = next((item for item in formats if item['format'] == output_format), formats[0])
+            result['output'] = manifest['output'] = primary['path']
+        elif manifest['max_bytes'] is not None:
+            result['budget'] = maker.create_gif_within(
+                manifest['output'],
+                manifest['max_bytes'],
+                size=manifest['size'],
+                transition_frames=manifest['transition_frames'],
+                **manifest['options']
+            )
+            transition_frames = result['budget']['transition_frames']
+        elif manifest['renditions']:
+            renditions = manifest['renditions']
+            maker.create_gif(
+                [manifest['output']] + [rendition['output'] for rendition in renditions],
+                size=[manifest['size']] + [rendition['size'] for rendition in renditions],
+                transition_frames=manifest['transition_frames'],
+                **manifest['options']
+            )
+            result['renditions'] = [
+                {'output': rendition['output'], 'bytes': os.path.getsize(rendition['output'])}
+                for rendition in renditions
+            ]
+        else:
+            maker.create_gif(
+                manifest['output'],
+                size=manifest['size'],
+                transition_frames=manifest['transition_frames'],
+                **manifest['options']
+            )
+        finished = time.perf_counter()
+        
+        result.update({
+            'status': 'ok',
+            'slides': len(maker.image_items),
+            'frames': maker.count_frames(
+                transition_frames, manifest['options'].get('adaptive_transitions', False)
+            ),
+            'bytes': os.path.getsize(manifest['output']),
+            'timings': {
+                'load': round(loaded - start, 4),
+                'render': round(finished - loaded, 4),
+            },
+        })
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def find_manifests(paths):
+    """展开命令行参数中的清单文件和目录
+    
+    Args:
+        paths: 清单文件或包含清单文件的目录列表
+        
+    Returns:
+        list: 清单文件路径列表，目录中的 *.json 按文件名排序
+    """
+    manifests = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.lower().endswith('.json'))
+            manifests.extend(os.path.join(path, name) for name in names)
+        else:
+            manifests.append(path)
+    return manifests
+
+
+def run_batch(manifests, jobs=1, compare=False):
+    """渲染多个清单，jobs 大于1时分配到进程池
+    
+    Args:
+        manifests: 清单文件路径列表
+        jobs: 同时渲染的任务数
+        compare: 是否为每个清单生成全部可用格式（见 render_manifest）
+        
+    Returns:
+        dict: 汇总结果，包含每个任务的结果和总耗时
+    """
+    start = time.perf_counter()
+    render = functools.partial(render_manifest, compare=compare)
+    if jobs > 1 and len(manifests) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(manifests))) as pool:
+            results = list(pool.map(render, manifests))
+    else:
+        results = [render(path) for path in manifests]
+    
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    return {
+        'total': len(results),
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'seconds': round(time.perf_counter() - start, 4),
+        'jobs': results,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="根据JSON清单批量生成GIF")
+    parser.add_argument('paths', nargs='+', help="清单文件或包含清单文件的目录")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="同时渲染的任务数（进程数）")
+    parser.add_argument('-o', '--summary', help="把汇总JSON写入文件，默认输出到标准输出")
+    parser.add_argument('--compare', action='store_true',
+                        help="生成全部可用的输出格式，并在标准错误输出中打印大小和耗时对比")
+    return parser
+
+
+def main(argv=None):
+    """命令行入口
+    
+    Returns:
+        int: 退出码
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs 必须大于0")
+    
+    manifests = find_manifests(args.paths)
+    if not manifests:
+        parser.error("没有找到清单文件")
+    
+    summary = run_batch(manifests, args.jobs, args.compare)
+    if args.compare:
+        for result in summary['jobs']:
+            if 'formats' in result:
+                print(f"{result['manifest']}:\n{format_report(result['formats'])}\n", file=sys.stderr)
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import numpy as np
+
+
+def pack_rgb(palette):
+    """把调色板打包为 0xRRGGBB 形式的 uint32 数组，便于整像素比较
+    
+    Args:
+        palette: uint8 调色板数组 (n, 3)
+        
+    Returns:
+        numpy.ndarray: uint32 数组 (n,)
+    """
+    palette = np.asarray(palette, dtype=np.uint32).reshape(-1, 3)
+    return (palette[:, 0] << 16) | (palette[:, 1] << 8) | palette[:, 2]
+
+
+class DeltaOptimizer:
+    """差分帧优化器
+    
+    记录已合成的画面，把每一帧与之比较，只输出发生变化的矩形区域及其偏移。
+    区域内没有变化的像素可以标记为透明色，让LZW编码器得到更长的重复序列。
+    输出的帧需要以"不处置"(disposal=1)方式写入GIF。
+    """
+    
+    def __init__(self):
+        """初始化优化器"""
+        self._canvas = None  # 已合成画面的 0xRRGGBB 值
+    
+    def reset(self):
+        """清空已合成的画面，下一帧将完整输出"""
+        self._canvas = None
+    
+    def apply(self, indices, palette, transparent_index=None):
+        """计算一帧相对已合成画面的差分
+        
+        Args:
+            indices: uint8 调色板索引数组 (高, 宽)
+            palette: 该帧使用的 uint8 调色板数组 (n, 3)
+            transparent_index: 透明色索引，None 表示只裁剪不使用透明
+            
+        Returns:
+            tuple: (裁剪后的索引数组, 偏移 (x, y), 透明色索引或None)
+        """
+        # 比较实际显示的颜色，帧之间切换调色板时同样适用
+        colors = pack_rgb(palette)[indices]
+        if self._canvas is None or self._canvas.shape != colors.shape:
+            self._canvas = colors
+            return indices, (0, 0), None
+        
+        changed = colors != self._canvas
+        rows = np.flatnonzero(changed.any(axis=1))
+        if len(rows) == 0:
+            # 画面完全没有变化，只输出左上角的一个像素
+            return indices[:1, :1], (0, 0), None
+        cols = np.flatnonzero(changed.any(axis=0))
+        top, bottom = rows[0], rows[-1] + 1
+        left, right = cols[0], cols[-1] + 1
+        
+        self._canvas[top:bottom, left:right] = colors[top:bottom, left:right]
+        crop = indices[top:bottom, left:right]
+        if transparent_index is None:
+            return crop, (int(left), int(top)), None
+        
+        crop = np.where(changed[top:bottom, left:right], crop, np.uint8(transparent_index))
+        return crop, (int(left), int(top)), transparent_index
+
+
+def frames_similar(a, b, tolerance=0):
+    """判断两帧是否相同或几乎相同
+    
+    Args:
+        a: uint8 帧数组
+        b: uint8 帧数组
+        tolerance: 每个通道允许的最大差值，0 表示必须完全相同
+        
+    Returns:
+        bool: 尺寸相同且所有像素差值都不超过 tolerance 时为 True
+    """
+    if a.shape != b.shape:
+        return False
+    if tolerance <= 0:
+        return np.array_equal(a, b)
+    # uint8 上 max - min 即差的绝对值，不需要转换为更宽的类型
+    return int((np.maximum(a, b) - np.minimum(a, b)).max()) <= tolerance
+
+
+class FrameMerger:
+    """逐帧合并连续的相同或几乎相同的帧，显示时间相加
+    
+    每一帧都与当前保留的帧比较，而不是与上一帧比较，缓慢变化不会累积成可见的跳变。
+    保留的帧会被复制，输入可以是复用的缓冲区视图。
+    """
+    
+    def __init__(self, tolerance=0):
+        """初始化合并器
+        
+        Args:
+            tolerance: 每个通道允许的最大差值，0 表示只合并完全相同的帧
+        """
+        self.tolerance = tolerance
+        self._held = None  # [帧数组, 显示时间, 附加信息, 合并的帧数]
+    
+    def push(self, frame, duration, extra=None):
+        """加入一帧
+        
+        Args:
+            frame: uint8 帧数组
+            duration: 显示时间（毫秒）
+            extra: 附加信息，合并后保留第一帧的
+            
+        Returns:
+            tuple: 新帧与保留的帧不同时返回之前保留的 (帧数组, 显示时间, 附加信息, 合并的帧数)，
+                否则返回 None
+        """
+        held = self._held
+        if held is not None and frames_similar(held[0], frame, self.tolerance):
+            held[1] += duration
+            held[3] += 1
+            return None
+        self._held = [np.array(frame, copy=True), duration, extra, 1]
+        return tuple(held) if held is not None else None
+    
+    def flush(self):
+        """取出保留的最后一帧
+        
+        Returns:
+            tuple: (帧数组, 显示时间, 附加信息, 合并的帧数)，没有保留的帧时返回 None
+        """
+        held, self._held = self._held, None
+        return tuple(held) if held is not None else None
+
+
+def merge_similar_frames(frames, tolerance=0):
+    """合并连续的相同或几乎相同的帧，显示时间相加（见 FrameMerger）
+    
+    Args:
+        frames: (uint8 帧数组, 显示时间, 附加信息) 的可迭代对象
+        tolerance: 每个通道允许的最大差值，0 表示只合并完全相同的帧
+        
+    Yields:
+        tuple: (帧数组, 合并后的显示时间, 第一帧的附加信息, 合并的帧数)
+    """
+    merger = FrameMerger(tolerance)
+    for frame, duration, extra in frames:
+        merged = merger.push(frame, duration, extra)
+        if merged is not None:
+            yield merged
+    merged = merger.flush()
+    if merged is not None:
+        yield merged
@@ -1,7 +1,547 @@
-from PIL import Image
-import imageio
+from PIL import Image, GifImagePlugin
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque, namedtuple
+from contextlib import ExitStack
+from multiprocessing import shared_memory
+import functools
+import hashlib
+import itertools
+import math
+import operator
 import os
+import re
+import threading
+import struct
 import numpy as np
+from analysis import (DUPLICATE_COLOR_DISTANCE, DUPLICATE_DISTANCE, analyze_file, combined_dominant_color,
+                      find_duplicates, hash_distances, histogram_colors)
+from blending import WEIGHT_ONE, alpha_weights, blend_frames
+from palette import PaletteQuantizer, fade_colors, sample_pixels
+from delta import DeltaOptimizer, FrameMerger, frames_similar, merge_similar_frames
+from instrument import Instrumentation
+from segment_cache import source_identity
+from slides import Slide, read_project, write_project
+from transitions import get_transition
+from outputs import detect_format, open_writer
+
+# 生成全局调色板时，采样用的缩小图片的最长边
+PALETTE_SAMPLE_EDGE = 256
+
+# 缩放时先用 reduce 按整数倍缩小，再用滤镜缩放剩余的不超过该倍数的部分；
+# JPEG 只有在原图至少是目标大小的该倍数时才按缩小比例解码
+REDUCING_GAP = 2.0
+
+# 批量导入支持的图片扩展名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# 批量导入时读取文件头的线程数（读取文件头以I/O为主）
+IMPORT_WORKERS = 8
+# 批量导入时每批返回的图片数
+IMPORT_BATCH = 64
+
+# 按文件大小限制生成：估算时抽样编码的帧数
+ESTIMATE_SAMPLES = 12
+# 估算值需要低于限制的比例，留出估算误差的余量
+BUDGET_MARGIN = 0.9
+# 抽样位置使用的黄金分割数列的步长
+GOLDEN_RATIO_FRACTION = (5 ** 0.5 - 1) / 2
+# 依次尝试的输出尺寸比例
+BUDGET_SCALES = (1.0, 0.85, 0.7, 0.6, 0.5, 0.42, 0.35, 0.3, 0.25, 0.2)
+# 依次尝试的调色板颜色数
+BUDGET_COLORS = (256, 128, 64, 32)
+# 依次尝试的过渡帧数比例
+BUDGET_FRAME_RATIOS = (1.0, 2 / 3, 1 / 2, 1 / 3)
+# 其他设置都降到最低后使用的合并几乎相同帧的容差
+BUDGET_MERGE_TOLERANCE = 4
+# 估算不准时最多完整生成的次数
+BUDGET_MAX_RENDERS = 3
+
+# 缩小后平均每通道差值达到该值时使用全部过渡帧，差异越小帧数越少
+ADAPTIVE_FULL_DIFFERENCE = 48
+# 自适应时每个过渡至少保留的帧数
+ADAPTIVE_MIN_STEPS = 2
+
+# 时间轴中的一帧：
+#   kind: 'fade_in'、'slide'、'transition' 或 'fade_out'
+#   slides: 参与的图片索引，淡入淡出为 (None, 图片索引)，None 表示过渡色
+#   weight: 最后一个来源的定点混合权重 (0..256)
+#   duration: 帧显示时间（毫秒）
+#   effect: 过渡效果名称，只用于 'transition' 帧
+TimelineFrame = namedtuple(
+    'TimelineFrame', ['kind', 'slides', 'weight', 'duration', 'effect'], defaults=(None,)
+)
+
+
+def natural_sort_key(path):
+    """自然排序的键，文件名中的数字按数值比较（img2 排在 img10 之前）
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        list: 文本和数字交替的列表，文本不区分大小写
+    """
+    parts = re.split(r'(\d+)', os.path.normpath(path))
+    return [int(part) if i % 2 else part.lower() for i, part in enumerate(parts)]
+
+
+def expand_image_paths(paths):
+    """把文件和目录展开为图片文件列表
+    
+    目录只列出其中直接包含的图片文件，不进入子目录。扩展名不在 IMAGE_EXTENSIONS 中的文件被忽略。
+    
+    Args:
+        paths: 文件或目录路径列表
+        
+    Returns:
+        list: 图片文件路径，按传入顺序排列
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            with os.scandir(path) as entries:
+                files.extend(entry.path for entry in entries if entry.is_file())
+        else:
+            files.append(path)
+    return [path for path in files if path.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def fit_size(image_size, target_size):
+    """计算保持比例放入目标尺寸后的图片大小
+    
+    Args:
+        image_size: 原始尺寸 (宽, 高)
+        target_size: 目标尺寸 (宽, 高)
+        
+    Returns:
+        tuple: 缩放后的尺寸 (宽, 高)
+    """
+    width, height = image_size
+    ratio = min(target_size[0]/width, target_size[1]/height)
+    return (int(width * ratio), int(height * ratio))
+
+
+def _locked_iter(iterator, lock):
+    """在锁内逐项读取迭代器，供多个线程读取 itertools.tee 的分支"""
+    while True:
+        with lock:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def _encode_block(indices, palette, offset, include_color_table):
+    """把调色板索引数组编码为GIF图像块（图像描述符、可选的局部颜色表和LZW数据）"""
+    image = Image.fromarray(indices)
+    image.putpalette(palette)
+    return b''.join(GifImagePlugin.getdata(image, offset, include_color_table=include_color_table))
+
+
+def _encode_block_in_worker(buffer_name, start, shape, palette, offset, include_color_table):
+    """在进程池中编码一帧，索引从共享内存中读取（需要可被pickle的顶层函数）"""
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    try:
+        count = shape[0] * shape[1]
+        indices = np.ndarray(shape, dtype=np.uint8, buffer=buffer.buf[start:start + count]).copy()
+        return _encode_block(indices, palette, offset, include_color_table)
+    finally:
+        buffer.close()
+
+
+def _load_slides_in_worker(maker_class, item, sizes):
+    """在进程池中处理单张图片（需要可被pickle的顶层函数）
+    
+    子进程中使用新的 GifMaker，其插桩事件不会传回主进程。
+    """
+    return maker_class().load_slides(item, sizes)
+
+
+class RenderCancelled(Exception):
+    """渲染被取消"""
+
+
+class RenderMonitor:
+    """渲染进度回调和取消检查
+    
+    进度回调的参数为 (阶段, 已完成数量, 总数量)，阶段为
+    'palette'（采样调色板）、'decode'、'blend'、'quantize' 或 'write'。
+    回调在渲染线程中调用，界面需要自行转发到主线程。
+    """
+    
+    def __init__(self, progress=None, cancel_event=None):
+        """初始化监视器
+        
+        Args:
+            progress: 进度回调函数，None 表示不报告进度
+            cancel_event: threading.Event，被设置后渲染尽快停止
+        """
+        self.progress = progress
+        self.cancel_event = cancel_event
+    
+    def check(self):
+        """检查是否已取消
+        
+        Raises:
+            RenderCancelled: 当取消事件已被设置时
+        """
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise RenderCancelled("渲染已取消")
+    
+    def report(self, stage, done, total):
+        """报告进度并检查是否已取消"""
+        self.check()
+        if self.progress is not None:
+            self.progress(stage, done, total)
+
+
+class GifWriter:
+    """增量GIF写入器
+    
+    每写入一帧就立即编码并写入文件，不需要在内存中保留全部帧。
+    提供全局调色板时写入全局颜色表，使用该调色板的帧不再携带局部颜色表；
+    其他帧使用自己的局部调色板。
+    
+    workers 大于1时，write_frame 把各帧的LZW编码交给线程池或进程池并行执行，
+    编码结果按帧的顺序写入文件，最多同时编码 2 * workers 帧。使用进程池时
+    帧的调色板索引通过一块共享内存传给子进程，共享内存分为 2 * workers 个整帧大小的槽位。
+    """
+    
+    def __init__(self, output_path, size, loop=0, palette=None, workers=1, executor='process'):
+        """初始化写入器并写入文件头
+        
+        Args:
+            output_path: 输出GIF路径
+            size: 画布大小 (宽, 高)
+            loop: 循环次数，0 表示无限循环
+            palette: 全局调色板的 RGBRGB... 字节，None 表示不使用全局调色板
+            workers: 并行编码的工作线程/进程数，1 表示在调用线程中编码
+            executor: 'thread' 使用线程池，'process' 使用进程池
+            
+        Raises:
+            ValueError: 当 executor 无效时
+        """
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"不支持的并行方式: {executor}")
+        self.output_path = output_path
+        self.size = size
+        self.loop = loop
+        self.palette = bytes(palette) if palette else None
+        self.frame_count = 0
+        self.bytes_written = 0
+        self._pool = None
+        self._shared = None  # 进程池使用的共享内存
+        self._slots = None  # 共享内存中各槽位的视图
+        self._free_slots = []
+        self._pending = deque()  # 按顺序等待写入的帧 (结果, 显示时间, 透明色, 处置方式, 槽位)
+        self._fp = open(output_path, 'wb')
+        try:
+            self._write_header()
+            if workers > 1:
+                self._open_pool(workers, executor)
+        except Exception:
+            self.abort()
+            raise
+    
+    def _open_pool(self, workers, executor):
+        """创建编码用的线程池或进程池，进程池另外分配共享内存"""
+        slots = 2 * workers
+        if executor == 'process':
+            frame_bytes = self.size[0] * self.size[1]
+            self._shared = shared_memory.SharedMemory(create=True, size=max(1, slots * frame_bytes))
+            self._slots = np.ndarray((slots, frame_bytes), dtype=np.uint8, buffer=self._shared.buf)
+            self._free_slots = list(range(slots))
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._max_pending = slots
+    
+    def _write_header(self):
+        """写入GIF文件头、逻辑屏幕描述符和循环扩展"""
+        width, height = self.size
+        if self.palette:
+            # 颜色表大小必须是2的幂，标志位记录 log2(颜色数) - 1
+            colors = len(self.palette) // 3
+            table_bits = max(0, (colors - 1).bit_length() - 1)
+            color_table = self.palette.ljust(3 * (2 << table_bits), b'\x00')
+            flags = 0x80 | table_bits
+        else:
+            color_table = b''
+            flags = 0
+        # 逻辑屏幕描述符：背景色索引0，像素宽高比0
+        self._write(b'GIF89a' + struct.pack('<HHBBB', width, height, flags, 0, 0))
+        self._write(color_table)
+        # NETSCAPE2.0 循环扩展
+        self._write(
+            b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', self.loop) + b'\x00'
+        )
+    
+    def _write(self, data):
+        """写入数据并统计字节数"""
+        self._fp.write(data)
+        self.bytes_written += len(data)
+    
+    def write_frame(self, image, duration, offset=(0, 0), transparency=None, disposal=0):
+        """编码并写入一帧
+        
+        Args:
+            image: PIL Image对象或 uint8 数组，非调色板模式时会自动转换
+            duration: 帧显示时间（毫秒）
+            offset: 帧在画布上的位置 (x, y)
+            transparency: 透明色索引，None 表示不透明
+            disposal: GIF 处置方式，1 表示保留画面供下一帧叠加
+        """
+        if self._pool is None:
+            self.write_encoded(self.encode_frame(image, offset), duration, transparency, disposal)
+            return
+        
+        image = self._to_palette_image(image)
+        indices = np.asarray(image)
+        palette = bytes(image.getpalette())
+        local_palette = self.palette is None or palette != self.palette
+        if len(self._pending) >= self._max_pending:
+            self._write_next()
+        
+        slot = None
+        if self._slots is not None:
+            slot = self._free_slots.pop()
+            count = indices.size
+            self._slots[slot, :count] = indices.ravel()
+            result = self._pool.submit(
+                _encode_block_in_worker, self._shared.name, slot * self._slots.shape[1], indices.shape,
+                palette, offset, local_palette
+            )
+        else:
+            result = self._pool.submit(_encode_block, indices.copy(), palette, offset, local_palette)
+        self._pending.append((result, duration, transparency, disposal, slot))
+        # 顺带写入已经编码完成的帧
+        while self._pending and self._pending[0][0].done():
+            self._write_next()
+    
+    def _write_next(self):
+        """等待最早提交的帧编码完成并写入文件"""
+        result, duration, transparency, disposal, slot = self._pending.popleft()
+        try:
+            block = result.result()
+        finally:
+            if slot is not None:
+                self._free_slots.append(slot)
+        self.write_encoded(block, duration, transparency, disposal)
+    
+    def _to_palette_image(self, image):
+        """把帧转换为调色板模式的 PIL Image"""
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        if image.mode != 'P':
+            image = image.convert('P', palette=Image.Palette.ADAPTIVE)
+        return image
+    
+    def encode_frame(self, image, offset=(0, 0)):
+        """把一帧编码为图像描述符、局部颜色表和LZW数据，不包含图形控制扩展
+        
+        显示时间等信息只保存在图形控制扩展中，编码结果可以缓存后以不同的时间写入。
+        
+        Args:
+            image: PIL Image对象或 uint8 数组，非调色板模式时会自动转换
+            offset: 帧在画布上的位置 (x, y)
+            
+        Returns:
+            bytes: 编码后的图像块
+        """
+        image = self._to_palette_image(image)
+        
+        # 与全局调色板相同时不需要局部颜色表
+        local_palette = self.palette is None or bytes(image.getpalette()) != self.palette
+        return b''.join(GifImagePlugin.getdata(image, offset, include_color_table=local_palette))
+    
+    def write_encoded(self, block, duration, transparency=None, disposal=0):
+        """写入图形控制扩展和 encode_frame 编码的图像块
+        
+        Args:
+            block: encode_frame 返回的图像块
+            duration: 帧显示时间（毫秒）
+            transparency: 透明色索引，None 表示不透明
+            disposal: GIF 处置方式，1 表示保留画面供下一帧叠加
+        """
+        # 与Pillow相同：时间以1/100秒为单位，全部为默认值时省略扩展
+        delay = int(duration / 10)
+        if transparency is not None or delay or disposal:
+            flags = (disposal << 2) | (1 if transparency is not None else 0)
+            self._write(b'!\xf9\x04' + struct.pack('<BHBB', flags, delay, transparency or 0, 0))
+        self._write(block)
+        self.frame_count += 1
+    
+    def close(self):
+        """写入尚未写入的帧和文件结束标记，然后关闭文件"""
+        if self._fp is None:
+            return
+        try:
+            while self._pending:
+                self._write_next()
+        except Exception:
+            self.abort()
+            raise
+        self._write(b';')
+        self._fp.close()
+        self._fp = None
+        self._close_pool()
+    
+    def abort(self):
+        """放弃写入，关闭并删除不完整的文件"""
+        self._pending.clear()
+        self._close_pool(cancel=True)
+        if self._fp is None:
+            return
+        self._fp.close()
+        self._fp = None
+        try:
+            os.remove(self.output_path)
+        except OSError:
+            pass
+    
+    def _close_pool(self, cancel=False):
+        """关闭编码池并释放共享内存"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=cancel)
+            self._pool = None
+        if self._shared is not None:
+            # 关闭共享内存前需要先释放指向它的数组
+            self._slots = None
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class _OutputSink:
+    """create_gif 的一个输出
+    
+    按需合并相似帧（见 FrameMerger），然后量化并写入GIF，或交给其他格式的写入器。
+    有 monitor 时每收到一帧报告 'blend'，每帧量化后报告 'quantize'，写入后报告 'write'
+    （合并的帧按合并前的帧数计算）。
+    """
+    
+    def __init__(self, maker, output_path, size, output_format, palette, colors, dither, optimize, quality,
+                 quantizer, merge_tolerance, encode_workers=1, executor='thread', monitor=None, total=0):
+        """打开输出文件，参数含义见 GifMaker.create_gif
+        
+        Args:
+            maker: 负责量化帧和接收插桩事件的 GifMaker
+            quantizer: 全局调色板量化器，None 表示按 palette 模式生成
+            monitor: 可选的 RenderMonitor，用于报告该输出的进度
+            total: 报告进度时的总帧数
+        """
+        self.maker = maker
+        self.palette = palette
+        self.colors = colors
+        self.dither = dither
+        self.optimize = optimize
+        self.quantizer = quantizer
+        self.merger = FrameMerger(merge_tolerance) if merge_tolerance is not None else None
+        self.is_gif = output_format == 'gif'
+        self.monitor = monitor
+        self.total = total
+        self._segment = None
+        self._counted = 0
+        self._received = 0  # 已收到的帧数
+        self._written = 0  # 已写入的帧数（合并前）
+        if self.is_gif:
+            self.writer = GifWriter(
+                output_path, size, palette=quantizer.palette_bytes if quantizer else None,
+                workers=encode_workers, executor=executor
+            )
+            self.delta = DeltaOptimizer() if optimize else None
+        else:
+            self.writer = open_writer(output_path, size, output_format, quality=quality)
+            self.delta = None
+    
+    def write(self, frame, duration, sources):
+        """加入一帧，合并相似帧时实际写入会推迟到出现不同的帧或关闭时
+        
+        Args:
+            frame: uint8 帧数组
+            duration: 帧显示时间（毫秒）
+            sources: 该帧所在片段的图片（见 GifMaker._iter_frame_arrays）
+        """
+        self._received += 1
+        self._report('blend', self._received)
+        if self.merger is None:
+            self._write(frame, duration, sources)
+            return
+        merged = self.merger.push(frame, duration, sources)
+        if merged is not None:
+            self._write_merged(merged)
+    
+    def _write_merged(self, merged):
+        frame, duration, sources, count = merged
+        if count > 1:
+            self.maker.instrumentation.count('frames_merged', count - 1)
+        self._write(frame, duration, sources, count)
+    
+    def _report(self, stage, done):
+        if self.monitor is not None:
+            self.monitor.report(stage, done, self.total)
+    
+    def _write(self, frame, duration, sources, count=1):
+        instrumentation = self.maker.instrumentation
+        self._written += count
+        if self.is_gif:
+            if self.palette == 'pair' and sources is not self._segment:
+                self._segment = sources
+                with instrumentation.span('palette'):
+                    self.quantizer = PaletteQuantizer.from_sources(
+                        sources, self.colors, dither=self.dither, reserve_transparent=self.optimize,
+                        reserve_colors=fade_colors(sources)
+                    )
+            image, offset, transparency = self.maker._encode_frame(frame, self.quantizer, self.delta)
+            self._report('quantize', self._written)
+            # 差分帧需要保留叠加后的画面
+            disposal = 1 if self.optimize else 0
+            with instrumentation.span('write'):
+                self.writer.write_frame(image, duration, offset, transparency, disposal)
+        else:
+            with instrumentation.span('write'):
+                self.writer.write_frame(frame, duration)
+        self._report('write', self._written)
+        self._count_bytes()
+    
+    def _count_bytes(self):
+        written = self.writer.bytes_written
+        self.maker.instrumentation.count('bytes_written', written - self._counted)
+        self._counted = written
+    
+    def close(self):
+        """写入保留的最后一帧并关闭文件"""
+        if self.merger is not None:
+            merged = self.merger.flush()
+            if merged is not None:
+                self._write_merged(merged)
+        self.writer.close()
+        self._count_bytes()
+    
+    def abort(self):
+        """放弃写入并删除不完整的文件"""
+        self.writer.abort()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
 
 class GifMaker:
     """GIF制作器类
@@ -10,9 +550,27 @@ class GifMaker:
     支持图片的添加、删除、排序，以及自定义过渡效果。
     """
     
-    def __init__(self):
-        """初始化GIF制作器"""
-        self.image_items = []  # 存储图片信息的列表，每项包含路径、持续时间和文件名
+    # 开头淡入、结尾淡出使用的过渡色
+    transition_color = (255, 255, 255)
+    # 为True时过渡色改为第一张和最后一张图片的主要颜色（见 fade_color）
+    auto_fade_color = False
+    # 缩放图片使用的滤镜
+    resample_filter = Image.Resampling.LANCZOS
+    
+    def __init__(self, slide_cache=None, instrumentation=None, segment_cache=None):
+        """初始化GIF制作器
+        
+        Args:
+            slide_cache: 可选的 SlideCache，用于复用已处理过的图片
+            instrumentation: 可选的 Instrumentation，用于接收各阶段的耗时和计数
+            segment_cache: 可选的 SegmentCache，用于在重新生成时复用未变化的已编码片段
+        """
+        self.image_items = []  # 图片队列，每项是一个 Slide
+        self.slide_cache = slide_cache
+        self.instrumentation = instrumentation or Instrumentation()
+        self.segment_cache = segment_cache
+        self._analysis = {}  # 源文件标识 -> analyze_slide 的结果
+        self._auto_fade = None  # (首尾图片的源文件标识, 自动选择的过渡色)
         
     def add_image(self, image_path, duration=1000):
         """添加图片到队列
@@ -25,20 +583,177 @@ class GifMaker:
             bool: 添加是否成功
         """
         try:
-            img = Image.open(image_path)
-            # 将RGBA或调色板模式转换为RGB模式
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            self.image_items.append({
-                'path': image_path,
-                'duration': duration,
-                'name': os.path.basename(image_path)
-            })
+            self.image_items.append(self.probe_image(image_path, duration))
             return True
         except Exception as e:
             print(f"添加图片失败: {str(e)}")
             return False
     
+    def probe_image(self, image_path, duration=1000, exif=False):
+        """读取图片文件头，生成图片信息但不加入队列
+        
+        只记录格式、模式、分辨率和文件状态，完整的解码校验推迟到生成GIF时（见 Slide.probe）。
+        
+        Args:
+            image_path: 图片文件路径
+            duration: 图片显示持续时间（毫秒）
+            exif: 是否读取EXIF拍摄时间，保存在 captured 属性中（没有时为 None）
+            
+        Returns:
+            Slide: 图片信息
+            
+        Raises:
+            Exception: 当文件无法作为图片打开时
+        """
+        return Slide.probe(image_path, duration, exif)
+    
+    def iter_import(self, paths, duration=1000, order='name', workers=IMPORT_WORKERS,
+                    batch_size=IMPORT_BATCH, progress=None, skip_duplicates=False, known_items=None):
+        """批量读取文件和目录中的图片，分批返回图片信息但不加入队列
+        
+        文件头在线程池中并行读取。按文件名排序时先对路径自然排序，
+        每凑满 batch_size 张即按顺序返回一批；按拍摄时间排序时需要读取全部文件后才能返回，
+        没有拍摄时间的图片按文件名排在最后。无法打开的文件被跳过。
+        skip_duplicates 为 True 时同时在线程池中分析每张图片（见 analyze_slide），
+        与 known_items 中的图片或本次已导入的图片几乎相同的图片被跳过（见 find_duplicates）。
+        生成器可能在其他线程中迭代，因此不读取 image_items，已有图片需要由调用方预先复制后传入。
+        
+        Args:
+            paths: 文件或目录路径列表（见 expand_image_paths）
+            duration: 每张图片的显示时间（毫秒）
+            order: 'name' 按文件名自然排序，'exif' 按EXIF拍摄时间排序
+            workers: 读取文件头的线程数
+            batch_size: 每批的图片数
+            progress: 进度回调 progress(已读取数量, 总数量)，在调用线程中调用
+            skip_duplicates: 是否跳过重复的图片
+            known_items: 查重时比较的已有图片列表（例如 image_items 的副本），None 表示没有
+            
+        Yields:
+            list: 一批图片信息
+            
+        Raises:
+            ValueError: 当排序方式无效时
+        """
+        if order not in ('name', 'exif'):
+            raise ValueError(f"不支持的排序方式: {order}")
+        files = sorted(expand_image_paths(paths), key=natural_sort_key)
+        total = len(files)
+        exif = order == 'exif'
+        
+        def probe(path):
+            try:
+                item = self.probe_image(path, duration, exif)
+            except Exception:
+                return None, None
+            return item, self.analyze_slide(item) if skip_duplicates else None
+        
+        if skip_duplicates:
+            # 已接受图片的哈希和平均颜色，预先分配以便向量化比较
+            known = [stats for stats in self.analyze_slides(known_items or [], workers) if stats is not None]
+            hashes = np.zeros(len(known) + total, dtype=np.uint64)
+            means = np.zeros((len(known) + total, 3), dtype=np.int16)
+            for k, stats in enumerate(known):
+                hashes[k], means[k] = stats.phash, stats.mean
+            accepted = len(known)
+        
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            batch = []
+            done = 0
+            for item, stats in pool.map(probe, files):
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+                if item is None:
+                    self.instrumentation.count('images_rejected')
+                    continue
+                if stats is not None:
+                    similar = (
+                        (hash_distances(stats.phash, hashes[:accepted]) <= DUPLICATE_DISTANCE) &
+                        (np.abs(means[:accepted] - stats.mean).max(axis=1) <= DUPLICATE_COLOR_DISTANCE)
+                    )
+                    if similar.any():
+                        self.instrumentation.count('images_duplicate')
+                        continue
+                    hashes[accepted], means[accepted] = stats.phash, stats.mean
+                    accepted += 1
+                batch.append(item)
+                if not exif and len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            
+            if exif:
+                # 排序是稳定的，拍摄时间相同的图片保持文件名顺序
+                batch.sort(key=lambda item: (item.captured is None, item.captured or ''))
+            for start in range(0, len(batch), batch_size):
+                yield batch[start:start + batch_size]
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    def import_images(self, paths, duration=1000, order='name', workers=IMPORT_WORKERS, progress=None,
+                      skip_duplicates=False):
+        """批量添加文件和目录中的图片（见 iter_import）
+        
+        Args:
+            paths: 文件或目录路径列表
+            duration: 每张图片的显示时间（毫秒）
+            order: 'name' 按文件名自然排序，'exif' 按EXIF拍摄时间排序
+            workers: 读取文件头的线程数
+            progress: 进度回调 progress(已读取数量, 总数量)
+            skip_duplicates: 是否跳过重复的图片
+            
+        Returns:
+            int: 成功添加的图片数
+        """
+        added = 0
+        for batch in self.iter_import(paths, duration, order, workers, progress=progress,
+                                      skip_duplicates=skip_duplicates, known_items=list(self.image_items)):
+            self.image_items.extend(batch)
+            added += len(batch)
+        return added
+    
+    def save_project(self, path, settings=None, workers=IMPORT_WORKERS):
+        """把图片队列保存为项目文件（见 slides.write_project）
+        
+        尚未计算的内容摘要先在线程池中并行计算。
+        
+        Args:
+            path: 项目文件路径
+            settings: 可选的设置字典，例如输出大小和过渡帧数
+            workers: 计算内容摘要的线程数
+        """
+        items = list(self.image_items)
+        pending = [item for item in items if item.digest is None]
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                list(pool.map(Slide.ensure_digest, pending))
+        write_project(path, items, settings)
+    
+    def load_project(self, path, workers=IMPORT_WORKERS):
+        """打开项目文件，替换当前的图片队列
+        
+        每张图片的文件状态在线程池中检查（见 Slide.refresh）：未变化的文件不会被读取，
+        只有内容变化的文件才重新读取文件头，任何图片都不会被完整解码。
+        找不到或无法打开的图片保留在队列中，生成GIF时报错。
+        
+        Args:
+            path: 项目文件路径
+            workers: 检查文件状态的线程数
+            
+        Returns:
+            tuple: (项目中保存的设置字典, 找不到或无法打开的图片路径列表)
+            
+        Raises:
+            ValueError: 当文件不是有效的项目文件时
+        """
+        slides, settings = read_project(path)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            states = list(pool.map(Slide.refresh, slides))
+        for state in states:
+            self.instrumentation.count('project_slides_' + state)
+        self.image_items = slides
+        return settings, [slide.path for slide, state in zip(slides, states) if state == 'missing']
+    
     def delete_image(self, index):
         """删除指定索引的图片
         
@@ -63,10 +778,8 @@ class GifMaker:
         Returns:
             PIL Image: 调整大小后的图片
         """
-        width, height = image.size
-        ratio = min(target_size[0]/width, target_size[1]/height)
-        new_size = (int(width * ratio), int(height * ratio))
-        return image.resize(new_size, Image.Resampling.LANCZOS)
+        # 大幅缩小时先按整数倍 reduce，再用滤镜完成剩余缩放
+        return image.resize(fit_size(image.size, target_size), self.resample_filter, reducing_gap=REDUCING_GAP)
     
     def create_transition_frames(self, img1, img2, steps=10):
         """创建两张图片之间的渐变过渡帧
@@ -79,20 +792,24 @@ class GifMaker:
         Returns:
             list: 过渡帧列表
         """
-        img1_array = np.array(img1, dtype=float)
-        img2_array = np.array(img2, dtype=float)
-        
-        transition_frames = []
-        for i in range(steps):
-            alpha = i / steps  # 计算混合比例
-            blend = img1_array * (1 - alpha) + img2_array * alpha  # 线性混合
-            frame = Image.fromarray(np.uint8(blend))
-            transition_frames.append(frame)
+        return list(self.iter_transition_frames(img1, img2, steps))
+    
+    def iter_transition_frames(self, img1, img2, steps=10):
+        """逐帧生成两张图片之间的渐变过渡帧
         
-        return transition_frames
+        Args:
+            img1: 第一张图片
+            img2: 第二张图片
+            steps: 过渡步数
+            
+        Yields:
+            PIL Image: 过渡帧
+        """
+        for frame in blend_frames(np.asarray(img1), np.asarray(img2), alpha_weights(steps)):
+            yield Image.fromarray(frame)
     
     def create_slide_transition(self, img1, img2, steps=10, direction='right'):
-        """创建滑动过渡效果（保留但未使用的功能）
+        """创建滑动过渡效果
         
         Args:
             img1: 第一张图片
@@ -103,48 +820,15 @@ class GifMaker:
         Returns:
             list: 过渡帧列表
         """
-        width, height = img1.size
-        transition_frames = []
-        
-        for i in range(steps):
-            frame = Image.new('RGB', (width, height), (255, 255, 255))
-            progress = i / steps
-            
-            if direction == 'right':
-                # 第一张图片向右移动
-                x1 = int(width * progress)
-                frame.paste(img1, (x1, 0))
-                # 第二张图片从左边进入
-                x2 = int(-width * (1 - progress))
-                frame.paste(img2, (x2, 0))
-            elif direction == 'left':
-                # 第一张图片向左移动
-                x1 = int(-width * progress)
-                frame.paste(img1, (x1, 0))
-                # 第二张图片从右边进入
-                x2 = int(width * (1 - progress))
-                frame.paste(img2, (x2, 0))
-            elif direction == 'down':
-                # 第一张图片向下移动
-                y1 = int(height * progress)
-                frame.paste(img1, (0, y1))
-                # 第二张图片从上边进入
-                y2 = int(-height * (1 - progress))
-                frame.paste(img2, (0, y2))
-            elif direction == 'up':
-                # 第一张图片向上移动
-                y1 = int(-height * progress)
-                frame.paste(img1, (0, y1))
-                # 第二张图片从下边进入
-                y2 = int(height * (1 - progress))
-                frame.paste(img2, (0, y2))
-            
-            transition_frames.append(frame)
-        
-        return transition_frames
+        img1_array = np.asarray(img1.convert('RGB'))
+        img2_array = np.asarray(img2.convert('RGB'))
+        frames = get_transition(f'slide_{direction}').frames(img1_array, img2_array, alpha_weights(steps))
+        return [Image.fromarray(frame.copy()) for frame in frames]
     
     def get_dominant_color(self, image):
-        """获取图片的主要颜色（保留但未使用的功能）
+        """获取图片缩小到 50x50 后的平均颜色
+        
+        队列中的图片应使用 analyze_slide，它同时给出平均颜色和主要颜色并缓存结果。
         
         Args:
             image: PIL Image对象
@@ -152,26 +836,8 @@ class GifMaker:
         Returns:
             tuple: (R, G, B) 颜色元组
         """
-        # 将图片缩小以加快处理速度
-        small_image = image.resize((50, 50))
-        # 确保图片是RGB模式
-        if small_image.mode != 'RGB':
-            small_image = small_image.convert('RGB')
-        
-        # 获取所有像素
-        pixels = list(small_image.getdata())
-        
-        # 计算平均颜色
-        r_total = sum(p[0] for p in pixels)
-        g_total = sum(p[1] for p in pixels)
-        b_total = sum(p[2] for p in pixels)
-        pixel_count = len(pixels)
-        
-        return (
-            r_total // pixel_count,
-            g_total // pixel_count,
-            b_total // pixel_count
-        )
+        pixels = np.asarray(image.resize((50, 50)).convert('RGB')).reshape(-1, 3)
+        return tuple(int(v) for v in pixels.sum(axis=0, dtype=np.int64) // len(pixels))
     
     def create_fade_frames(self, img, steps=10, fade_type='in', fade_color=None):
         """创建淡入或淡出效果的帧
@@ -185,119 +851,1138 @@ class GifMaker:
         Returns:
             list: 过渡帧列表
         """
-        img_array = np.array(img, dtype=float)
+        return list(self.iter_fade_frames(img, steps, fade_type, fade_color))
+    
+    def iter_fade_frames(self, img, steps=10, fade_type='in', fade_color=None):
+        """逐帧生成淡入或淡出效果的帧
+        
+        Args:
+            img: 图片
+            steps: 过渡步数
+            fade_type: 'in' 为淡入，'out' 为淡出
+            fade_color: 过渡颜色，默认为黑色
+            
+        Yields:
+            PIL Image: 过渡帧
+        """
+        for frame in self._fade_arrays(np.asarray(img), steps, fade_type, fade_color):
+            yield Image.fromarray(frame)
+    
+    def _fade_arrays(self, img_array, steps, fade_type='in', fade_color=None):
+        """以定点混合生成淡入淡出帧数组（淡入淡出即与常量颜色混合）"""
         if fade_color is None:
             fade_color = (0, 0, 0)
+        fade_color = tuple(fade_color[:img_array.shape[-1]])
+        
+        # 淡入：从背景色到图片；淡出：从图片到背景色
+        weights = alpha_weights(steps, reverse=(fade_type != 'in'))
+        return blend_frames(fade_color, img_array, weights)
+    
+    def load_slide(self, item, size):
+        """读取并处理单张图片：解码、缩放并居中放置在白色背景上
+        
+        文件只打开一次，解码失败即视为图片损坏。目标尺寸远小于原图的JPEG
+        使用 draft 按 1/2、1/4 或 1/8 的比例直接解码。
+        
+        Args:
+            item: image_items 中的图片信息
+            size: 目标图片大小 (宽, 高)
+            
+        Returns:
+            PIL Image: 处理后的RGB图片
+            
+        Raises:
+            ValueError: 当图片损坏或处理出错时
+        """
+        return self.load_slides(item, [size])[0]
+    
+    def load_slides(self, item, sizes):
+        """读取单张图片并生成多个尺寸的处理结果，文件只解码一次
+        
+        从大到小依次缩放，每个尺寸从上一个尺寸的缩放结果继续缩小（图像金字塔），
+        JPEG 按最大的目标尺寸使用 draft 解码。
+        
+        Args:
+            item: image_items 中的图片信息
+            sizes: 目标图片大小 (宽, 高) 的列表
+            
+        Returns:
+            list: 与 sizes 顺序对应的处理后的RGB图片
+            
+        Raises:
+            ValueError: 当图片损坏或处理出错时
+        """
+        instrumentation = self.instrumentation
+        try:
+            with Image.open(item.path) as image:
+                with instrumentation.span('decode', slide=item.name):
+                    if image.format == 'JPEG':
+                        ratio = max(min(size[0] / image.width, size[1] / image.height) for size in sizes)
+                        image.draft(None, (
+                            int(image.width * ratio * REDUCING_GAP),
+                            int(image.height * ratio * REDUCING_GAP)
+                        ))
+                    try:
+                        image.load()
+                    except Exception:
+                        raise ValueError(f"图片文件可能已损坏: {item.name}")
+                instrumentation.count('bytes_decoded', image.width * image.height * len(image.getbands()))
+                
+                fits = [fit_size(image.size, size) for size in sizes]
+                slides = [None] * len(sizes)
+                source = image
+                for k in sorted(range(len(sizes)), key=lambda k: fits[k], reverse=True):
+                    with instrumentation.span('resize', slide=item.name):
+                        background = Image.new('RGB', sizes[k], (255, 255, 255))
+                        resized_image = source.resize(fits[k], self.resample_filter, reducing_gap=REDUCING_GAP)
+                        
+                        x = (sizes[k][0] - resized_image.size[0]) // 2
+                        y = (sizes[k][1] - resized_image.size[1]) // 2
+                        
+                        background.paste(resized_image, (x, y))
+                    slides[k] = background
+                    # 更小的尺寸从这次的缩放结果继续缩小
+                    source = resized_image
+                return slides
+            
+        except Exception as e:
+            raise ValueError(f"处理图片 {item.name} 时出错: {str(e)}")
+    
+    def iter_slides(self, size, workers=1, executor='thread'):
+        """按顺序逐张加载处理后的图片
+        
+        workers 大于1时在线程池或进程池中并行解码、校验、缩放和居中，
+        结果仍按原顺序返回。最多预先处理 2 * workers 张图片，
+        因此前面的图片可以在后面的图片解码时就开始生成过渡帧。
+        设置了 slide_cache 时，命中缓存的图片不再解码和缩放。
+        
+        Args:
+            size: 目标图片大小 (宽, 高)
+            workers: 并行处理的工作线程/进程数
+            executor: 'thread' 使用线程池，'process' 使用进程池
+            
+        Yields:
+            PIL Image: 处理后的图片
+            
+        Raises:
+            ValueError: 当图片处理出错或 executor 无效时
+        """
+        for slide in self._iter_slide_arrays(size, workers, executor):
+            yield Image.fromarray(slide)
+    
+    def _iter_slide_arrays(self, size, workers=1, executor='thread', monitor=None, stage='decode',
+                           items=None):
+        """按顺序逐张生成处理后的 uint8 图片数组（见 iter_slides）
+        
+        提供 monitor 时每处理完一张图片以 stage 阶段报告进度。
+        items 为要处理的图片信息列表，默认为全部图片。
+        """
+        slide_sets = self._iter_slide_sets([size], workers, executor, monitor, stage, items)
+        try:
+            for slides in slide_sets:
+                yield slides[0]
+        finally:
+            slide_sets.close()
+    
+    def _iter_slide_sets(self, sizes, workers=1, executor='thread', monitor=None, stage='decode', items=None):
+        """按顺序逐张生成每张图片在 sizes 中各个尺寸下的 uint8 数组元组（见 load_slides）
+        
+        其余参数与 _iter_slide_arrays 相同。所有尺寸都命中 slide_cache 时不解码图片。
+        """
+        items = self.image_items if items is None else items
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"不支持的并行方式: {executor}")
         
-        # 创建指定颜色的背景
-        color_array = np.full_like(img_array, [fade_color[0], fade_color[1], fade_color[2]])
+        cache = self.slide_cache
+        pool = None
+        if workers > 1 and executor == 'process':
+            pool = ProcessPoolExecutor(max_workers=workers)
+            submit = lambda item: pool.submit(_load_slides_in_worker, type(self), item, sizes).result
+        elif workers > 1:
+            pool = ThreadPoolExecutor(max_workers=workers)
+            submit = lambda item: pool.submit(self.load_slides, item, sizes).result
+        else:
+            # 不并行时在取用时才处理图片
+            submit = lambda item: lambda: self.load_slides(item, sizes)
         
-        transition_frames = []
-        for i in range(steps):
-            if fade_type == 'in':
-                alpha = i / steps  # 淡入：从背景色到图片
+        # 队列中每项为 (图片信息, 取得结果的函数, 需要写入缓存的尺寸索引)
+        pending = deque()
+        
+        def schedule(item):
+            cached = [cache.get(item.path, size, self.resample_filter) for size in sizes] if cache else []
+            missing = [k for k, slide in enumerate(cached) if slide is None]
+            if cached and not missing:
+                self.instrumentation.count('slides_from_cache', len(sizes))
+                pending.append((item, lambda: cached, []))
             else:
-                alpha = 1 - (i / steps)  # 淡出：从图片到背景色
+                pending.append((item, submit(item), missing))
+        
+        try:
+            total = len(items)
+            items = iter(items)
+            lookahead = workers * 2 if pool else 1
+            for item in items:
+                schedule(item)
+                if len(pending) >= lookahead:
+                    break
+            
+            done = 0
+            while pending:
+                item, result, missing = pending.popleft()
+                slides = tuple(np.asarray(slide) for slide in result())
+                for k in missing:
+                    cache.put(item.path, sizes[k], self.resample_filter, slides[k])
+                done += 1
+                if monitor is not None:
+                    monitor.report(stage, done, total)
+                following = next(items, None)
+                if following is not None:
+                    schedule(following)
+                yield slides
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+    
+    def iter_frames(self, size=(800, 600), transition_frames=15, workers=1, executor='thread',
+                    adaptive_transitions=False):
+        """按播放顺序逐帧生成GIF的所有帧
+        
+        任意时刻最多只保留相邻的两张图片和当前帧，内存占用与图片数量无关。
+        
+        Args:
+            size: 目标图片大小 (宽, 高)
+            transition_frames: 过渡帧数
+            workers: 并行处理图片的工作线程/进程数
+            executor: 'thread' 使用线程池，'process' 使用进程池
+            adaptive_transitions: 是否按图片差异减少过渡帧数（见 transition_steps）
+            
+        Yields:
+            tuple: (PIL Image 帧, 持续时间毫秒)
+            
+        Raises:
+            ValueError: 当没有图片或图片处理出错时
+        """
+        frames = self._iter_frame_arrays(size, transition_frames, workers, executor,
+                                         adaptive_transitions=adaptive_transitions)
+        for frame, duration, _ in frames:
+            yield Image.fromarray(frame), duration
+    
+    def transition_frame_duration(self, item, next_item, transition_frames):
+        """计算两张图片之间每个过渡帧的显示时间
+        
+        Args:
+            item: 当前图片信息
+            next_item: 下一张图片信息
+            transition_frames: 过渡帧数
+            
+        Returns:
+            int: 每帧显示时间（毫秒）
+        """
+        # 过渡总时间为两张图片平均显示时间的三分之一，每帧至少20ms
+        transition_base = (item.duration + next_item.duration) // 2
+        transition_total_time = transition_base // 3
+        return max(transition_total_time // transition_frames, 20)
+    
+    def transition_durations(self, item, next_item, transition_frames, steps):
+        """把 transition_frames 帧的过渡总时间分配给 steps 帧，总时间保持不变
+        
+        Args:
+            item: 当前图片信息
+            next_item: 下一张图片信息
+            transition_frames: 过渡帧数设置
+            steps: 实际生成的过渡帧数（见 transition_steps）
+            
+        Returns:
+            list: 每帧显示时间（毫秒），共 steps 项
+        """
+        total = self.transition_frame_duration(item, next_item, transition_frames) * transition_frames
+        return [total * (k + 1) // steps - total * k // steps for k in range(steps)]
+    
+    def analyze_slide(self, item):
+        """分析图片内容：平均颜色、主要颜色、颜色直方图、感知哈希和缩略数组
+        
+        JPEG 按最小的比例解码，结果按源文件标识缓存，文件变化后重新分析（见 analysis.analyze_image）。
+        
+        Args:
+            item: image_items 中的图片信息
+            
+        Returns:
+            analysis.SlideStats: 分析结果，图片无法读取时为 None
+        """
+        key = source_identity(item.path)
+        stats = self._analysis.get(key)
+        if stats is None:
+            try:
+                with self.instrumentation.span('analyze', slide=item.name):
+                    stats = analyze_file(item.path)
+            except Exception:
+                return None
+            self._analysis[key] = stats
+        return stats
+    
+    def analyze_slides(self, items=None, workers=IMPORT_WORKERS, progress=None):
+        """分析多张图片，未缓存的图片在线程池中并行分析（见 analyze_slide）
+        
+        Args:
+            items: 图片信息列表，默认为 image_items
+            workers: 分析图片的线程数
+            progress: 进度回调 progress(已完成数量, 总数量)
+            
+        Returns:
+            list: 与 items 顺序对应的 SlideStats，无法读取的图片为 None
+        """
+        items = self.image_items if items is None else items
+        total = len(items)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            results = []
+            for stats in pool.map(self.analyze_slide, items):
+                results.append(stats)
+                if progress is not None:
+                    progress(len(results), total)
+        return results
+    
+    def find_duplicates(self, items=None, max_distance=DUPLICATE_DISTANCE, workers=IMPORT_WORKERS):
+        """查找与前面某张图片几乎相同的图片（见 analysis.find_duplicates）
+        
+        Args:
+            items: 图片信息列表，默认为 image_items
+            max_distance: 感知哈希的最大汉明距离（共64位）
+            workers: 分析图片的线程数
+            
+        Returns:
+            list: (图片索引, 最早的相同图片索引) 的列表
+        """
+        return find_duplicates(self.analyze_slides(items, workers), max_distance)
+    
+    def fade_color(self):
+        """返回开头淡入和结尾淡出实际使用的过渡色
+        
+        auto_fade_color 为 False 时即 transition_color；为 True 时合并第一张和最后一张图片的
+        颜色直方图取主要颜色，使淡入淡出从与画面相近的颜色开始和结束。
+        结果按首尾图片的源文件标识缓存，图片无法读取时退回 transition_color。
+        """
+        if not self.auto_fade_color or not self.image_items:
+            return tuple(self.transition_color)
+        ends = (self.image_items[0], self.image_items[-1])
+        key = tuple(source_identity(item.path) for item in ends)
+        if self._auto_fade is None or self._auto_fade[0] != key:
+            stats = [self.analyze_slide(item) for item in ends]
+            if None in stats:
+                return tuple(self.transition_color)
+            self._auto_fade = (key, combined_dominant_color(stats))
+        return self._auto_fade[1]
+    
+    def slide_signature(self, item):
+        """返回图片缩小到 analysis.SIGNATURE_EDGE x analysis.SIGNATURE_EDGE 的数组，用于快速比较两张图片
+        
+        Args:
+            item: image_items 中的图片信息
+            
+        Returns:
+            numpy.ndarray: int16 RGB 数组，图片无法读取时为 None
+        """
+        stats = self.analyze_slide(item)
+        return None if stats is None else stats.signature
+    
+    def transition_steps(self, item, next_item, transition_frames, adaptive=False):
+        """计算两张图片之间实际生成的过渡帧数
+        
+        adaptive 为 True 且过渡效果允许时（见 Transition.adaptive），按两张图片缩小后的
+        平均差值减少帧数：差值达到 ADAPTIVE_FULL_DIFFERENCE 时使用全部帧，
+        几乎相同的图片只保留 ADAPTIVE_MIN_STEPS 帧。
+        
+        Args:
+            item: 当前图片信息
+            next_item: 下一张图片信息
+            transition_frames: 过渡帧数设置
+            adaptive: 是否按图片差异减少帧数
+            
+        Returns:
+            int: 过渡帧数，不超过 transition_frames
+        """
+        if not adaptive or not get_transition(item.transition).adaptive:
+            return transition_frames
+        first = self.slide_signature(item)
+        second = self.slide_signature(next_item)
+        if first is None or second is None:
+            return transition_frames
+        difference = float(np.abs(first - second).mean())
+        steps = math.ceil(transition_frames * difference / ADAPTIVE_FULL_DIFFERENCE)
+        return max(min(steps, transition_frames), min(ADAPTIVE_MIN_STEPS, transition_frames))
+    
+    def build_timeline(self, transition_frames, items=None, adaptive=False):
+        """列出 create_gif 将生成的每一帧，但不渲染任何图片
+        
+        可用于随机访问任意一帧，例如预览播放和拖动定位。
+        
+        Args:
+            transition_frames: 过渡帧数
+            items: 图片信息列表，默认为 image_items
+            adaptive: 是否按图片差异减少过渡帧数（见 transition_steps）
+            
+        Returns:
+            list: TimelineFrame 列表，顺序和持续时间与 create_gif 一致
+        """
+        items = self.image_items if items is None else items
+        if not items:
+            return []
+        
+        last = len(items) - 1
+        timeline = [
+            TimelineFrame('fade_in', (None, 0), int(weight), 40)
+            for weight in alpha_weights(transition_frames)
+        ]
+        for i, item in enumerate(items):
+            timeline.append(TimelineFrame('slide', (i,), WEIGHT_ONE, item.duration))
+            if i < last:
+                steps = self.transition_steps(item, items[i + 1], transition_frames, adaptive)
+                durations = self.transition_durations(item, items[i + 1], transition_frames, steps)
+                effect = get_transition(item.transition).name
+                timeline.extend(
+                    TimelineFrame('transition', (i, i + 1), int(weight), duration, effect)
+                    for weight, duration in zip(alpha_weights(steps), durations)
+                )
+        timeline.extend(
+            TimelineFrame('fade_out', (None, last), int(weight), 40)
+            for weight in alpha_weights(transition_frames, reverse=True)
+        )
+        return timeline
+    
+    def render_frame(self, spec, slide):
+        """单独渲染时间轴中的一帧（见 build_timeline）
+        
+        Args:
+            spec: TimelineFrame
+            slide: 函数 slide(图片索引)，返回处理后的 uint8 图片数组
+            
+        Returns:
+            numpy.ndarray: uint8 帧数组，'slide' 帧直接返回图片数组本身
+        """
+        if spec.kind == 'slide':
+            return slide(spec.slides[0])
+        if spec.kind == 'transition':
+            src, dst = (slide(i) for i in spec.slides)
+            frame = np.empty_like(src)
+            get_transition(spec.effect).render(src, dst, spec.weight, frame)
+            return frame
+        color = self.fade_color()
+        src, dst = (color if i is None else slide(i) for i in spec.slides)
+        return next(blend_frames(src, dst, [spec.weight])).copy()
+    
+    def count_frames(self, transition_frames, adaptive=False):
+        """计算 create_gif 将生成的帧数（合并相同帧之前）
+        
+        Args:
+            transition_frames: 过渡帧数
+            adaptive: 是否按图片差异减少过渡帧数（见 transition_steps）
+            
+        Returns:
+            int: 帧数（淡入、每张图片、图片之间的过渡和淡出）
+        """
+        if adaptive:
+            return len(self.build_timeline(transition_frames, adaptive=True))
+        count = len(self.image_items)
+        if not count:
+            return 0
+        return count + (count + 1) * transition_frames
+    
+    def _iter_frame_arrays(self, size, transition_frames, workers=1, executor='thread', monitor=None,
+                           adaptive_transitions=False, slides=None):
+        """按播放顺序逐帧生成 (uint8 帧数组, 持续时间, 所在片段的图片)
+        
+        第三项是生成该帧所用的图片数组或颜色元组：淡入为 (过渡色, 第一张)，
+        每张图片及其后的过渡为 (当前图片, 下一张)，最后一张和淡出为 (最后一张, 过渡色)。
+        同一片段内的帧返回同一个元组对象，可用于按片段生成调色板。
+        过渡帧是混合缓冲区的视图，只在取下一帧之前有效。
+        slides 为已处理图片数组的迭代器，默认按 size 读取全部图片。
+        """
+        if not self.image_items:
+            raise ValueError("没有添加任何图片")
+        
+        transition_color = self.fade_color()
+        instrumentation = self.instrumentation
+        frame_pixels = size[0] * size[1]
+        
+        if slides is None:
+            slides = self._iter_slide_arrays(size, workers, executor, monitor)
+        current = next(slides)
+        
+        # 添加开头淡入效果，淡入用40ms每帧
+        segment = (transition_color, current)
+        fade_in = self._fade_arrays(current, transition_frames, 'in', transition_color)
+        for frame in instrumentation.timed('blend', fade_in, slide=0):
+            instrumentation.count('pixels_blended', frame_pixels)
+            yield frame, 40, segment
+        
+        for i in range(len(self.image_items)):
+            # 先读取下一张图片，当前图片和它的过渡属于同一片段
+            if i < len(self.image_items) - 1:
+                following = next(slides)
+                segment = (current, following)
+            else:
+                following = None
+                segment = (current, transition_color)
+            
+            # 添加当前帧
+            yield current, self.image_items[i].duration, segment
+            
+            # 添加过渡帧（最后一张图片不需要过渡）
+            if following is not None:
+                item, next_item = self.image_items[i], self.image_items[i + 1]
+                steps = self.transition_steps(item, next_item, transition_frames, adaptive_transitions)
+                durations = self.transition_durations(item, next_item, transition_frames, steps)
+                
+                effect = get_transition(item.transition)
+                transition = effect.frames(current, following, alpha_weights(steps))
+                for frame, frame_duration in zip(instrumentation.timed('blend', transition, slide=i), durations):
+                    instrumentation.count('pixels_blended', frame_pixels)
+                    yield frame, frame_duration, segment
+                current = following
+        
+        # 添加结尾淡出效果，淡出用40ms每帧
+        fade_out = self._fade_arrays(current, transition_frames, 'out', transition_color)
+        for frame in instrumentation.timed('blend', fade_out, slide=len(self.image_items) - 1):
+            instrumentation.count('pixels_blended', frame_pixels)
+            yield frame, 40, segment
+    
+    def _open_frame_streams(self, sizes, transition_frames, workers=1, executor='thread', monitor=None,
+                            adaptive_transitions=False):
+        """为每个尺寸创建一个帧生成器（见 _iter_frame_arrays），所有尺寸共用一次图片解码
+        
+        各生成器可以在不同线程中推进，但应保持步调一致，否则先行的生成器会让
+        共享的图片在内存中积压。
+        
+        Returns:
+            tuple: (帧生成器列表, 共享的图片生成器)，结束后需要关闭后者以释放进程池或线程池
+        """
+        slide_sets = self._iter_slide_sets(sizes, workers, executor, monitor)
+        lock = threading.Lock()
+        branches = itertools.tee(slide_sets, len(sizes))
+        streams = [
+            self._iter_frame_arrays(
+                size, transition_frames, adaptive_transitions=adaptive_transitions,
+                slides=map(operator.itemgetter(k), _locked_iter(branch, lock))
+            )
+            for k, (size, branch) in enumerate(zip(sizes, branches))
+        ]
+        return streams, slide_sets
+    
+    def build_palette(self, size, colors=256, dither=False, workers=1, executor='thread',
+                      reserve_transparent=False, monitor=None, histogram=False):
+        """从全部图片的缩小版本中采样生成全局调色板
+        
+        histogram 为 True 时不重新解码图片，而是用 analyze_slide 缓存的颜色直方图生成调色板，
+        按图片在输出中的面积加权，并计入留白的背景色。
+        
+        Args:
+            size: 目标图片大小 (宽, 高)
+            colors: 调色板颜色数
+            dither: 量化时是否使用有序抖动
+            workers: 并行处理图片的工作线程/进程数
+            executor: 'thread' 使用线程池，'process' 使用进程池
+            reserve_transparent: 是否保留一个透明色索引
+            monitor: 可选的 RenderMonitor，以 'palette' 阶段报告进度
+            histogram: 是否使用缓存的颜色直方图
+            
+        Returns:
+            PaletteQuantizer: 全局调色板量化器
+        """
+        fade_color = self.fade_color()
+        if histogram:
+            samples = self._histogram_samples(size, monitor)
+            ends = [self.analyze_slide(item) for item in (self.image_items[0], self.image_items[-1])]
+            ends = [np.array([stats.mean], dtype=np.uint8) for stats in ends]
+        else:
+            scale = min(1.0, PALETTE_SAMPLE_EDGE / max(size))
+            sample_size = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
             
-            blend = img_array * alpha + color_array * (1 - alpha)
-            frame = Image.fromarray(np.uint8(blend))
-            transition_frames.append(frame)
+            # 只保留每张图片的采样像素
+            samples = []
+            for slide in self._iter_slide_arrays(sample_size, workers, executor, monitor, 'palette'):
+                samples.append(sample_pixels(slide).copy())
+            ends = [samples[0], samples[-1]]
+        # 过渡色和淡入淡出的中间颜色在调色板中单独保留
+        return PaletteQuantizer.from_sources(
+            samples, colors, dither=dither, reserve_transparent=reserve_transparent,
+            reserve_colors=fade_colors([fade_color] + ends)
+        )
+    
+    def _histogram_samples(self, size, monitor=None):
+        """把每张图片缓存的颜色直方图展开为采样像素，供 build_palette 使用
         
-        return transition_frames
+        每张图片展开为 analysis.ANALYSIS_EDGE ** 2 个像素，留白部分按面积比例以白色计入。
+        """
+        report = None if monitor is None else functools.partial(monitor.report, 'palette')
+        samples = []
+        for item, stats in zip(self.image_items, self.analyze_slides(progress=report)):
+            if stats is None:
+                raise ValueError(f"无法读取图片 {item.name}")
+            colors, counts = histogram_colors(stats)
+            samples.append(np.repeat(colors, counts, axis=0))
+            fitted = fit_size(item.size, size)
+            border = size[0] * size[1] - fitted[0] * fitted[1]
+            if border > 0:
+                count = round(border / (fitted[0] * fitted[1]) * int(counts.sum()))
+                samples.append(np.full((count, 3), 255, dtype=np.uint8))
+        return samples
     
-    def create_gif(self, output_path, size=(800, 600), transition_frames=15):
+    def create_gif(self, output_path, size=(800, 600), transition_frames=15, workers=1, executor='thread',
+                   palette='global', colors=256, dither=False, optimize=True,
+                   progress=None, cancel_event=None, output_format=None, quality=80,
+                   adaptive_transitions=False, merge_tolerance=None, encode_workers=1):
         """生成GIF文件，包含淡入淡出和过渡效果
         
+        帧在生成后立即写入文件，峰值内存约为两张图片加一帧
+        （并行处理图片时另有最多 2 * workers 张预处理的图片）。
+        每张图片到下一张的过渡效果由图片信息的 transition 属性指定（见 set_transition），
+        默认为交叉淡化。
+        设置了 segment_cache 时只重新生成内容变化的片段，其余片段直接写入缓存的编码结果，
+        只修改显示时间时不需要重新处理任何图片。
+        
+        output_format 为 'webp'、'apng'、'mp4' 或 'webm' 时（默认按扩展名判断）
+        以相同的帧和显示时间写入对应格式（见 outputs 模块），调色板相关参数不适用。
+        
+        output_path 和 size 可以是等长的列表，一次生成多个尺寸：每张图片只解码一次，
+        各尺寸从同一个缩放金字塔中得到（见 load_slides），各输出在同一遍中逐帧推进，
+        混合和编码在各自的线程中进行。全局调色板按最大的尺寸采样，所有输出共用。
+        生成多个尺寸时不使用 segment_cache。
+        
+        adaptive_transitions 为 True 时按相邻图片的差异减少交叉淡化的帧数，过渡总时间不变；
+        merge_tolerance 不为 None 时把连续的相同或几乎相同的帧合并为一帧，显示时间相加
+        （使用 segment_cache 时只在片段内合并）。
+        
+        encode_workers 大于1时GIF各帧的LZW编码在线程池或进程池（由 executor 选择）中并行执行，
+        量化和差分仍按顺序进行（见 GifWriter）。使用 segment_cache 时不并行编码。
+        
+        调色板模式：
+            'global': 从所有图片采样生成一个全局调色板，所有帧共用
+            'pair': 每张图片和它之后的过渡共用一个由相邻两张图片生成的调色板
+            'adaptive': 由Pillow为每一帧单独生成调色板
+            'histogram': 与 'global' 相同，但由缓存的颜色直方图生成，不需要重新解码图片（见 build_palette）
+        
+        Args:
+            output_path: 输出GIF路径，或多个输出路径的列表
+            size: 目标图片大小 (宽, 高)，或与 output_path 对应的大小列表
+            transition_frames: 过渡帧数
+            workers: 并行处理图片的工作线程/进程数，1 表示不并行
+            executor: 'thread' 使用线程池，'process' 使用进程池
+            palette: 调色板模式 'global'、'pair'、'adaptive' 或 'histogram'
+            colors: 调色板颜色数
+            dither: 是否使用有序抖动
+            optimize: 是否只写入与上一帧相比变化的区域，未变化的像素设为透明
+            progress: 进度回调 progress(阶段, 已完成数量, 总数量)，见 RenderMonitor
+            cancel_event: threading.Event，被设置后停止渲染并删除未完成的文件
+            output_format: 输出格式，None 表示按扩展名判断，未知扩展名按GIF处理
+            quality: WebP 有损压缩质量 0..100
+            adaptive_transitions: 是否按图片差异减少过渡帧数（见 transition_steps）
+            merge_tolerance: 合并相邻帧时每个通道允许的最大差值，0 表示只合并完全相同的帧，
+                None 表示不合并
+            encode_workers: 并行编码GIF帧的工作线程/进程数，1 表示不并行
+            
+        Raises:
+            ValueError: 当没有图片、参数无效、格式不可用或图片处理出错时
+            RenderCancelled: 当渲染被取消时
+        """
+        if not self.image_items:
+            raise ValueError("没有添加任何图片")
+        if palette not in ('global', 'pair', 'adaptive', 'histogram'):
+            raise ValueError(f"不支持的调色板模式: {palette}")
+        
+        multiple = isinstance(output_path, (list, tuple))
+        output_paths = list(output_path) if multiple else [output_path]
+        sizes = [tuple(item) for item in size] if multiple else [tuple(size)]
+        if not output_paths or len(output_paths) != len(sizes):
+            raise ValueError("输出路径和尺寸的数量不一致")
+        
+        monitor = RenderMonitor(progress, cancel_event)
+        instrumentation = self.instrumentation
+        total = self.count_frames(transition_frames, adaptive_transitions)
+        formats = [detect_format(path, output_format) for path in output_paths]
+        
+        quantizer = None
+        if palette in ('global', 'histogram') and 'gif' in formats:
+            with instrumentation.span('palette'):
+                largest = max(sizes, key=lambda item: item[0] * item[1])
+                quantizer = self._global_palette(
+                    largest, colors, dither, workers, executor, optimize, monitor, palette == 'histogram'
+                )
+        
+        if self.segment_cache is not None and not multiple and formats[0] == 'gif':
+            delta = DeltaOptimizer() if optimize else None
+            with GifWriter(output_path, size, palette=quantizer.palette_bytes if quantizer else None) as writer:
+                self._write_segments(
+                    writer, size, transition_frames, workers, executor, palette, colors, dither,
+                    quantizer, delta, monitor, adaptive_transitions, merge_tolerance
+                )
+            return
+        
+        with ExitStack() as stack:
+            # 各输出在同一遍中逐帧推进，只由第一个输出报告进度
+            sinks = [
+                stack.enter_context(_OutputSink(
+                    self, path, target_size, output_format, palette, colors, dither, optimize, quality,
+                    quantizer, merge_tolerance, encode_workers, executor,
+                    monitor if k == 0 else None, total
+                ))
+                for k, (path, target_size, output_format) in enumerate(zip(output_paths, sizes, formats))
+            ]
+            streams, slide_sets = self._open_frame_streams(
+                sizes, transition_frames, workers, executor, monitor, adaptive_transitions
+            )
+            stack.callback(slide_sets.close)
+            pool = stack.enter_context(ThreadPoolExecutor(max_workers=len(sinks))) if len(sinks) > 1 else None
+            
+            def step(k):
+                # 推进一个输出：混合下一帧并交给对应的输出
+                frame = next(streams[k], None)
+                if frame is not None:
+                    sinks[k].write(*frame)
+                return frame is not None
+            
+            while True:
+                advanced = list(pool.map(step, range(len(sinks)))) if pool else [step(0)]
+                if not any(advanced):
+                    break
+                instrumentation.count('frames_produced', sum(advanced))
+    
+    def estimate_gif_size(self, size=(800, 600), transition_frames=15, colors=256, dither=False,
+                          merge_tolerance=None, samples=ESTIMATE_SAMPLES):
+        """抽样编码少量帧，估算 create_gif 生成的GIF文件大小（全局调色板、差分帧）
+        
+        按帧的类型（淡入、图片、过渡、淡出）分层抽样，每个样本帧与时间轴中的上一帧比较后
+        编码变化区域，用每类样本的平均大小乘以该类的帧数。调色板只由抽样用到的图片生成。
+        
         Args:
-            output_path: 输出GIF路径
             size: 目标图片大小 (宽, 高)
             transition_frames: 过渡帧数
+            colors: 调色板颜色数
+            dither: 是否使用有序抖动
+            merge_tolerance: 合并相邻帧的容差，见 create_gif
+            samples: 抽样编码的帧数
+            
+        Returns:
+            int: 估算的文件大小（字节）
             
         Raises:
             ValueError: 当没有图片或图片处理出错时
         """
+        return self._estimate_gif_size(tuple(size), transition_frames, colors, dither, merge_tolerance, samples, {})
+    
+    def _estimate_gif_size(self, size, transition_frames, colors, dither, merge_tolerance, samples, loaded):
+        """estimate_gif_size 的实现
+        
+        loaded 为可在多次估算间共用的字典，保存 (图片索引, 尺寸) -> 图片数组，
+        以及 (尺寸, 颜色数, 抖动, 图片索引) -> 调色板量化器。
+        """
         if not self.image_items:
             raise ValueError("没有添加任何图片")
+        timeline = self.build_timeline(transition_frames)
         
-        frames = []
-        durations = []
+        def slide(i):
+            key = (i, size)
+            if key not in loaded:
+                loaded[key] = np.asarray(self.load_slide(self.image_items[i], size))
+            return loaded[key]
         
-        processed_images = []
+        # 分层抽样：每类帧至少抽一帧，其余按帧数比例分配。等间距抽样会总是落在
+        # 每个过渡的同一步上，因此按黄金分割数列取位置
+        kinds = {}
+        for position, spec in enumerate(timeline):
+            kinds.setdefault(spec.kind, []).append(position)
+        positions = set()
+        for kind_positions in kinds.values():
+            count = min(len(kind_positions), max(1, round(samples * len(kind_positions) / len(timeline))))
+            positions.update(
+                kind_positions[int((0.5 + j) * GOLDEN_RATIO_FRACTION % 1 * len(kind_positions))]
+                for j in range(count)
+            )
+        positions = sorted(positions)
         
-        # 首先处理所有图片
-        for item in self.image_items:
-            try:
-                with Image.open(item['path']) as verify_img:
-                    try:
-                        verify_img.verify()
-                    except Exception:
-                        raise ValueError(f"图片文件可能已损坏: {item['name']}")
+        used = sorted({i for p in positions for spec in timeline[max(p - 1, 0):p + 1]
+                       for i in spec.slides if i is not None})
+        palette_key = (size, colors, dither, tuple(used))
+        quantizer = loaded.get(palette_key)
+        if quantizer is None:
+            ends = [slide(i) for i in used if i in (0, len(self.image_items) - 1)]
+            quantizer = loaded[palette_key] = PaletteQuantizer.from_sources(
+                [sample_pixels(slide(i)) for i in used], colors, dither=dither, reserve_transparent=True,
+                reserve_colors=fade_colors([self.fade_color()] + ends)
+            )
+        
+        sampled = {}
+        for position in positions:
+            frame = self.render_frame(timeline[position], slide)
+            delta = DeltaOptimizer()
+            if position > 0:
+                previous = self.render_frame(timeline[position - 1], slide)
+                if merge_tolerance is not None and frames_similar(previous, frame, merge_tolerance):
+                    # 与上一帧合并，不占用空间
+                    sampled.setdefault(timeline[position].kind, []).append(0)
+                    continue
+                delta.apply(quantizer.quantize(previous), quantizer.palette, quantizer.transparent_index)
+            indices, offset, _ = delta.apply(quantizer.quantize(frame), quantizer.palette, quantizer.transparent_index)
+            block = b''.join(GifImagePlugin.getdata(quantizer.to_image(indices), offset, include_color_table=False))
+            # 图形控制扩展占8字节
+            sampled.setdefault(timeline[position].kind, []).append(len(block) + 8)
+        
+        # 文件头、全局颜色表、循环扩展和结束标记
+        table_bits = max(0, (len(quantizer.palette_bytes) // 3 - 1).bit_length() - 1)
+        estimate = 13 + 3 * (2 << table_bits) + 19 + 1
+        for kind, kind_positions in kinds.items():
+            estimate += len(kind_positions) * sum(sampled[kind]) / len(sampled[kind])
+        return int(estimate)
+    
+    def budget_settings(self, transition_frames=15, colors=256):
+        """列出按文件大小限制生成时在同一尺寸下依次尝试的设置，画质从高到低
+        
+        依次交替减少过渡帧数和调色板颜色数，最后合并几乎相同的帧。
+        始终合并完全相同的帧，这不影响画质。
+        
+        Args:
+            transition_frames: 最多的过渡帧数
+            colors: 最多的调色板颜色数
+            
+        Returns:
+            list: (过渡帧数, 颜色数, 合并容差) 的列表
+        """
+        frame_steps = sorted({max(min(2, transition_frames), round(transition_frames * ratio))
+                              for ratio in BUDGET_FRAME_RATIOS}, reverse=True)
+        color_steps = [value for value in BUDGET_COLORS if value <= colors] or [colors]
+        settings = []
+        f = c = 0
+        while True:
+            settings.append((frame_steps[f], color_steps[c], 0))
+            if f == len(frame_steps) - 1 and c == len(color_steps) - 1:
+                break
+            if c == len(color_steps) - 1 or (f <= c and f < len(frame_steps) - 1):
+                f += 1
+            else:
+                c += 1
+        settings.append((frame_steps[-1], color_steps[-1], BUDGET_MERGE_TOLERANCE))
+        return settings
+    
+    def create_gif_within(self, output_path, max_bytes, size=(800, 600), transition_frames=15, colors=256,
+                          dither=False, samples=ESTIMATE_SAMPLES, **options):
+        """生成不超过 max_bytes 字节的GIF
+        
+        先用 estimate_gif_size 估算，不完整生成任何候选：从原尺寸开始依次缩小
+        （BUDGET_SCALES），在每个尺寸下按 budget_settings 的顺序二分查找第一个估算值
+        低于 max_bytes * BUDGET_MARGIN 的设置，找到后只完整生成一次。
+        实际大小仍然超出时按实际与估算的比例修正后继续查找，最多生成 BUDGET_MAX_RENDERS 次。
+        
+        Args:
+            output_path: 输出GIF路径
+            max_bytes: 文件大小上限（字节）
+            size: 最大的目标图片大小 (宽, 高)
+            transition_frames: 最多的过渡帧数
+            colors: 最多的调色板颜色数
+            dither: 是否使用有序抖动
+            samples: 每次估算抽样编码的帧数
+            **options: 传给 create_gif 的其他参数（palette 和 optimize 固定为默认值）
+            
+        Returns:
+            dict: 选定的设置 {'size', 'transition_frames', 'colors', 'merge_tolerance'}，
+                以及估算大小 'estimated_bytes'、实际大小 'bytes' 和完整生成次数 'renders'
+            
+        Raises:
+            ValueError: 当没有图片、输出不是GIF、或最小的设置也超出限制时
+            RenderCancelled: 当渲染被取消时
+        """
+        if detect_format(output_path, options.get('output_format')) != 'gif':
+            raise ValueError("按文件大小限制生成只支持GIF")
+        for name in ('palette', 'optimize', 'merge_tolerance', 'adaptive_transitions'):
+            if name in options:
+                raise ValueError(f"按文件大小限制生成时不能指定 {name}")
+        
+        target = max_bytes * BUDGET_MARGIN
+        settings = self.budget_settings(transition_frames, colors)
+        candidates = []
+        for scale in BUDGET_SCALES:
+            scaled = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+            candidates.extend((scaled,) + setting for setting in settings)
+        loaded = {}
+        estimates = {}
+        
+        def estimate(index):
+            if index not in estimates:
+                scaled, frames, palette_colors, tolerance = candidates[index]
+                # 只保留当前尺寸的图片和调色板
+                for key in [key for key in loaded if scaled not in key]:
+                    del loaded[key]
+                estimates[index] = self._estimate_gif_size(
+                    scaled, frames, palette_colors, dither, tolerance, samples, loaded
+                )
+            return estimates[index]
+        
+        def find(start, correction):
+            # 逐个尺寸检查最低设置，能满足时在该尺寸内二分查找
+            per_size = len(settings)
+            first_size = start // per_size
+            for size_index in range(first_size, len(BUDGET_SCALES)):
+                low = max(start, size_index * per_size)
+                high = size_index * per_size + per_size - 1
+                if estimate(high) * correction > target:
+                    continue
+                while low < high:
+                    middle = (low + high) // 2
+                    if estimate(middle) * correction <= target:
+                        high = middle
+                    else:
+                        low = middle + 1
+                return low
+            return None
+        
+        correction = 1.0
+        start = 0
+        for renders in range(1, BUDGET_MAX_RENDERS + 1):
+            index = find(start, correction)
+            if index is None:
+                break
+            scaled, frames, palette_colors, tolerance = candidates[index]
+            self.create_gif(output_path, scaled, frames, colors=palette_colors, dither=dither,
+                            merge_tolerance=tolerance, **options)
+            actual = os.path.getsize(output_path)
+            if actual <= max_bytes:
+                return {
+                    'size': scaled,
+                    'transition_frames': frames,
+                    'colors': palette_colors,
+                    'merge_tolerance': tolerance,
+                    'estimated_bytes': estimates[index],
+                    'bytes': actual,
+                    'renders': renders,
+                }
+            # 估算偏小，按实际比例修正后从下一个设置继续
+            correction = max(correction, actual / max(estimates[index], 1))
+            start = index + 1
+        
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+        raise ValueError(f"无法在 {max_bytes} 字节内生成GIF")
+    
+    def _merge_frames(self, frames, merge_tolerance):
+        """按 merge_tolerance 合并连续的相似帧（见 delta.merge_similar_frames）
+        
+        Yields:
+            tuple: (帧数组, 显示时间, 附加信息, 合并的帧数)，不合并时帧数总是1
+        """
+        if merge_tolerance is None:
+            for frame, duration, extra in frames:
+                yield frame, duration, extra, 1
+            return
+        for merged in merge_similar_frames(frames, merge_tolerance):
+            if merged[3] > 1:
+                self.instrumentation.count('frames_merged', merged[3] - 1)
+            yield merged
+    
+    def _encode_frame(self, frame, quantizer, delta):
+        """量化一帧，需要时计算相对上一帧的差分
+        
+        Args:
+            frame: uint8 帧数组
+            quantizer: PaletteQuantizer，None 表示逐帧自适应调色板
+            delta: DeltaOptimizer，None 表示写入完整帧
+            
+        Returns:
+            tuple: ('P' 模式图片, 偏移 (x, y), 透明色索引或None)
+        """
+        instrumentation = self.instrumentation
+        with instrumentation.span('quantize'):
+            if quantizer is not None:
+                indices = quantizer.quantize(frame)
+                frame_palette = quantizer.palette
+                transparent_index = quantizer.transparent_index
+                to_image = quantizer.to_image
+            else:
+                # 逐帧自适应调色板，没有空闲的透明色索引，只裁剪变化区域
+                image = Image.fromarray(frame).convert('P', palette=Image.Palette.ADAPTIVE)
+                indices = np.asarray(image)
+                frame_palette = np.array(image.getpalette(), dtype=np.uint8).reshape(-1, 3)
+                transparent_index = None
+                to_image = lambda crop, src=image: self._with_palette(crop, src)
+        
+        if delta is not None:
+            with instrumentation.span('optimize'):
+                indices, offset, transparency = delta.apply(indices, frame_palette, transparent_index)
+        else:
+            offset, transparency = (0, 0), None
+        return to_image(indices), offset, transparency
+    
+    def _global_palette(self, size, colors, dither, workers, executor, reserve_transparent, monitor,
+                        histogram=False):
+        """生成全局调色板，有 segment_cache 时按图片文件集合缓存
+        
+        键与图片顺序无关，调整顺序后仍使用同一个调色板，已缓存的片段因此保持有效。
+        """
+        build = lambda: self.build_palette(
+            size, colors, dither, workers, executor, reserve_transparent, monitor, histogram
+        )
+        cache = self.segment_cache
+        if cache is None:
+            return build()
+        
+        key = (
+            'palette', tuple(size), colors, dither, reserve_transparent, self.fade_color(), histogram,
+            int(self.resample_filter), tuple(sorted(source_identity(item.path) for item in self.image_items)),
+        )
+        quantizer = cache.get(key)
+        if quantizer is None:
+            quantizer = build()
+            cache.put(key, quantizer, quantizer._lut.nbytes + len(quantizer.palette_bytes))
+        return quantizer
+    
+    def _write_segments(self, writer, size, transition_frames, workers, executor, palette, colors, dither,
+                        quantizer, delta, monitor, adaptive_transitions=False, merge_tolerance=None):
+        """按片段写入全部帧，复用 segment_cache 中仍然有效的片段（见 create_gif）
+        
+        片段为开头淡入、每张图片、每个过渡和结尾淡出。片段的键包含源文件标识和
+        渲染设置，不包含显示时间，显示时间在写入时重新生成。
+        差分帧依赖上一帧的画面，因此片段还记录编码时所基于的上一片段；
+        紧跟在缓存片段之后重新编码的片段从完整帧开始，可以放在任何位置。
+        """
+        cache = self.segment_cache
+        instrumentation = self.instrumentation
+        items = self.image_items
+        last = len(items) - 1
+        identities = [source_identity(item.path) for item in items]
+        ident = lambda i: None if i is None else identities[i]
+        fade_color = self.fade_color()
+        settings = (
+            tuple(size), transition_frames, palette, colors, dither, delta is not None,
+            fade_color, int(self.resample_filter), adaptive_transitions, merge_tolerance,
+        )
+        disposal = 1 if delta is not None else 0
+        palette_id = hashlib.sha1(quantizer.palette_bytes).hexdigest() if quantizer else None
+        
+        def palette_sources(kind, slides):
+            # 'pair' 模式下每张图片和它之后的过渡共用由相邻两张图片生成的调色板
+            if kind == 'fade_in':
+                return (None, 0)
+            if kind == 'fade_out' or slides[0] == last:
+                return (last, None)
+            return (slides[0], slides[0] + 1)
+        
+        # 把时间轴按片段分组，并查找每个片段的缓存
+        segments = []
+        for spec in self.build_timeline(transition_frames, adaptive=adaptive_transitions):
+            if segments and segments[-1][0] == spec.kind and segments[-1][1] == spec.slides:
+                segments[-1][2].append(spec)
+            else:
+                segments.append((spec.kind, spec.slides, [spec]))
+        
+        plan = []
+        previous = None  # 上一片段的内容键，写入后的画面只取决于它
+        for kind, slides, specs in segments:
+            sources = palette_sources(kind, slides) if palette == 'pair' else None
+            segment_palette = tuple(ident(i) for i in sources) if sources else palette_id
+            content = (settings, segment_palette, kind, tuple(ident(i) for i in slides), specs[0].effect)
+            encoded = cache.get((content, previous)) if previous is not None else None
+            if encoded is None:
+                encoded = cache.get((content, None))
+            plan.append((kind, slides, specs, sources, content, encoded))
+            previous = content if delta is not None else None
+        
+        # 只处理需要重新编码的片段用到的图片
+        needed = sorted({
+            i for kind, slides, specs, sources, content, encoded in plan if encoded is None
+            for i in slides + (sources or ()) if i is not None
+        })
+        slide_arrays = self._iter_slide_arrays(
+            size, workers, executor, monitor, items=[items[i] for i in needed]
+        )
+        loaded_slides = zip(needed, slide_arrays)
+        loaded = {}
+        
+        def slide(i):
+            while i not in loaded:
+                index, array = next(loaded_slides)
+                loaded[index] = array
+            return loaded[i]
+        
+        total = sum(len(specs) for kind, slides, specs, sources, content, encoded in plan)
+        done = 0
+        base = None
+        try:
+            for kind, slides, specs, sources, content, encoded in plan:
+                if encoded is not None:
+                    instrumentation.count('segments_from_cache')
+                    # 合并过的帧覆盖多个时间轴帧，显示时间按当前时间轴重新相加
+                    position = 0
+                    for block, transparency, count in encoded:
+                        duration = sum(spec.duration for spec in specs[position:position + count])
+                        position += count
+                        done += count
+                        written = writer.bytes_written
+                        with instrumentation.span('write'):
+                            writer.write_encoded(block, duration, transparency, disposal)
+                        instrumentation.count('bytes_written', writer.bytes_written - written)
+                        monitor.report('write', done, total)
+                    # 缓存片段结束时的画面不可用，下一个重新编码的片段从完整帧开始
+                    base = None
+                    if delta is not None:
+                        delta.reset()
+                    continue
                 
-                image = Image.open(item['path'])
-                background = Image.new('RGB', size, (255, 255, 255))
-                resized_image = self.resize_image(image, size)
+                # 释放之后不再需要的图片
+                first = min(i for i in slides + (sources or ()) if i is not None)
+                for index in [index for index in loaded if index < first]:
+                    del loaded[index]
                 
-                x = (size[0] - resized_image.size[0]) // 2
-                y = (size[1] - resized_image.size[1]) // 2
+                if sources is not None:
+                    with instrumentation.span('palette'):
+                        pair = [fade_color if i is None else slide(i) for i in sources]
+                        quantizer = PaletteQuantizer.from_sources(
+                            pair, colors, dither=dither, reserve_transparent=delta is not None,
+                            reserve_colors=fade_colors(pair)
+                        )
                 
-                background.paste(resized_image, (x, y))
-                processed_images.append(background)
+                weights = [spec.weight for spec in specs]
+                if kind == 'slide':
+                    frames = [slide(slides[0])]
+                elif kind == 'transition':
+                    effect = get_transition(specs[0].effect)
+                    frames = instrumentation.timed(
+                        'blend', effect.frames(slide(slides[0]), slide(slides[1]), weights), slide=slides[0]
+                    )
+                else:
+                    frames = instrumentation.timed(
+                        'blend', blend_frames(fade_color, slide(slides[1]), weights), slide=slides[1]
+                    )
                 
-            except Exception as e:
-                raise ValueError(f"处理图片 {item['name']} 时出错: {str(e)}")
-        
-        # 固定使用白色作为过渡色
-        transition_color = (255, 255, 255)
-        
-        # 添加开头淡入效果
-        fade_in = self.create_fade_frames(
-            processed_images[0], 
-            transition_frames, 
-            'in',
-            transition_color
-        )
-        frames.extend(fade_in)
-        durations.extend([40] * transition_frames)  # 淡入用40ms每帧
-        
-        # 添加主帧和过渡帧
-        for i in range(len(processed_images)):
-            # 添加当前帧
-            frames.append(processed_images[i])
-            durations.append(self.image_items[i]['duration'])
-            
-            # 添加过渡帧（最后一张图片不需要过渡）
-            if i < len(processed_images) - 1:
-                transition = self.create_transition_frames(
-                    processed_images[i],
-                    processed_images[i + 1],
-                    transition_frames
+                encoded = []
+                frames = self._merge_frames(
+                    ((frame, spec.duration, spec) for spec, frame in zip(specs, frames)), merge_tolerance
                 )
-                frames.extend(transition)
+                for frame, duration, spec, count in frames:
+                    done += count
+                    if kind != 'slide':
+                        instrumentation.count('pixels_blended', size[0] * size[1] * count)
+                    monitor.report('blend', done, total)
+                    instrumentation.count('frames_produced', count)
+                    
+                    image, offset, transparency = self._encode_frame(frame, quantizer, delta)
+                    monitor.report('quantize', done, total)
+                    
+                    written = writer.bytes_written
+                    with instrumentation.span('write'):
+                        block = writer.encode_frame(image, offset)
+                        writer.write_encoded(block, duration, transparency, disposal)
+                    instrumentation.count('bytes_written', writer.bytes_written - written)
+                    monitor.report('write', done, total)
+                    encoded.append((block, transparency, count))
                 
-                # 过渡帧时间计算
-                transition_base = (self.image_items[i]['duration'] + self.image_items[i + 1]['duration']) // 2
-                transition_total_time = transition_base // 3
-                frame_duration = max(transition_total_time // transition_frames, 20)
-                durations.extend([frame_duration] * transition_frames)
-        
-        # 添加结尾淡出效果
-        fade_out = self.create_fade_frames(
-            processed_images[-1], 
-            transition_frames, 
-            'out',
-            transition_color
-        )
-        frames.extend(fade_out)
-        durations.extend([40] * transition_frames)  # 淡出用40ms每帧
-        
-        # 保存GIF
-        frames[0].save(
-            output_path,
-            save_all=True,
-            append_images=frames[1:],
-            duration=durations,
-            loop=0
-        )
+                cache.put((content, base), encoded, sum(len(block) for block, _, _ in encoded))
+                base = content if delta is not None else None
+        finally:
+            slide_arrays.close()
+    
+    def _with_palette(self, indices, source):
+        """用 source 的调色板包装索引数组"""
+        image = Image.fromarray(np.ascontiguousarray(indices))
+        image.putpalette(source.getpalette())
+        return image
     
     def move_image(self, old_index, new_index):
         """移动图片位置，用于拖拽排序
@@ -309,6 +1994,18 @@ class GifMaker:
         item = self.image_items.pop(old_index)
         self.image_items.insert(new_index, item)
     
+    def set_transition(self, index, name):
+        """设置指定图片到下一张图片的过渡效果
+        
+        Args:
+            index: 图片索引
+            name: 过渡效果名称，见 transitions.TRANSITIONS
+            
+        Raises:
+            ValueError: 当效果不存在时
+        """
+        self.image_items[index].transition = get_transition(name).name
+    
     def update_duration(self, index, duration):
         """更新指定图片的显示时间
         
@@ -316,4 +2013,4 @@ class GifMaker:
             index: 图片索引
             duration: 新的显示时间（毫秒）
         """
-        self.image_items[index]['duration'] = duration
\ No newline at end of file
+        self.image_items[index].duration = duration
\ No newline at end of file
@@ -2,8 +2,43 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
 from PIL import Image, ImageTk
-from gif_maker import GifMaker
+from gif_maker import GifMaker, RenderCancelled
+from thumbnails import ThumbnailCache
+from preview import PreviewRenderer, fit_preview_size
+from segment_cache import SegmentCache
+from transitions import TRANSITIONS, get_transition
+from outputs import FORMAT_SUFFIXES, available_formats
+from slides import PROJECT_SUFFIX
 import os
+import queue
+import threading
+
+# 图片列表中每一行的高度（像素）
+ROW_HEIGHT = 110
+
+# 渲染阶段在界面上显示的名称
+STAGE_NAMES = {
+    'palette': '采样调色板',
+    'decode': '解码图片',
+    'blend': '生成过渡',
+    'quantize': '量化颜色',
+    'write': '写入文件',
+}
+
+# 批量导入的排序方式：界面名称 -> GifMaker.iter_import 的 order 参数
+IMPORT_ORDERS = {
+    '文件名': 'name',
+    '拍摄时间': 'exif',
+}
+
+# 保存对话框中各输出格式的名称
+FORMAT_NAMES = {
+    'gif': 'GIF文件',
+    'webp': 'WebP动画',
+    'apng': 'APNG动画',
+    'mp4': 'MP4视频',
+    'webm': 'WebM视频',
+}
 
 class GifMakerGUI:
     def __init__(self):
@@ -11,9 +46,34 @@ class GifMakerGUI:
         self.window.title("GIF制作器")
         self.window.geometry("800x600")
         
-        self.gif_maker = GifMaker()
-        self.preview_images = []  # 存储预览图片对象
+        # 已编码片段缓存，修改显示时间或顺序后再次生成时复用未变化的部分
+        self.gif_maker = GifMaker(segment_cache=SegmentCache())
+        # 缩略图缓存，直接保存 PhotoImage，移动和删除时不需要重新读取图片
+        self.thumbnails = ThumbnailCache(factory=ImageTk.PhotoImage)
+        self.rows = {}  # 当前显示的行：图片索引 -> 行框架
+        self.spare_rows = []  # 可复用的隐藏行
+        
+        # 后台渲染：任务队列、后台线程发往界面的事件队列和当前任务
+        self.render_jobs = queue.Queue()
+        self.render_events = queue.Queue()
+        self.render_thread = None
+        self.current_job = None
+        self.pending_job_count = 0
+        
+        # 后台批量导入：任务队列、后台线程发往界面的事件队列
+        self.import_jobs = queue.Queue()
+        self.import_events = queue.Queue()
+        self.import_thread = None
+        
+        # 低分辨率预览：渲染器、当前帧位置和播放定时器
+        self.preview = PreviewRenderer(self.gif_maker)
+        self.preview_position = 0
+        self.preview_after_id = None
+        self.preview_photo = None
+        
         self.setup_ui()
+        self.window.after(100, self.poll_render_events)
+        self.window.after(100, self.poll_import_events)
         
     def setup_ui(self):
         # 创建主框架
@@ -28,6 +88,39 @@ class GifMakerGUI:
         self.add_btn = ttk.Button(control_frame, text="添加图片", command=self.add_image)
         self.add_btn.pack(pady=5)
         
+        self.add_folder_btn = ttk.Button(control_frame, text="添加文件夹", command=self.add_folder)
+        self.add_folder_btn.pack(pady=5)
+        
+        # 项目文件
+        project_frame = ttk.Frame(control_frame)
+        project_frame.pack(pady=5)
+        ttk.Button(project_frame, text="打开项目", command=self.open_project).pack(side=tk.LEFT, padx=2)
+        ttk.Button(project_frame, text="保存项目", command=self.save_project).pack(side=tk.LEFT, padx=2)
+        
+        # 批量导入的排序方式和进度
+        import_frame = ttk.Frame(control_frame)
+        import_frame.pack(pady=5, fill=tk.X)
+        
+        ttk.Label(import_frame, text="排序:").pack(side=tk.LEFT, padx=5)
+        self.import_order_var = tk.StringVar(value='文件名')
+        ttk.Combobox(
+            import_frame, 
+            textvariable=self.import_order_var, 
+            values=list(IMPORT_ORDERS), 
+            state='readonly', 
+            width=8
+        ).pack(side=tk.LEFT, padx=5)
+        
+        self.skip_duplicates_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            import_frame, 
+            text="跳过重复图片", 
+            variable=self.skip_duplicates_var
+        ).pack(side=tk.LEFT, padx=5)
+        
+        self.import_status_var = tk.StringVar(value="")
+        ttk.Label(control_frame, textvariable=self.import_status_var, font=('Arial', 8)).pack(padx=5)
+        
         # 图片大小设置
         size_frame = ttk.LabelFrame(control_frame, text="输出大小")
         size_frame.pack(pady=5, fill=tk.X)
@@ -55,44 +148,87 @@ class GifMakerGUI:
         )
         self.transition_frames_entry.pack(side=tk.LEFT, padx=5)
         
+        # 勾选后淡入淡出使用首尾图片的主要颜色，而不是白色
+        self.auto_fade_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            transition_frame, 
+            text="自动过渡色", 
+            variable=self.auto_fade_var
+        ).pack(side=tk.LEFT, padx=5)
+        
         # 生成GIF按钮
         self.create_btn = ttk.Button(control_frame, text="生成GIF", command=self.create_gif)
         self.create_btn.pack(pady=5)
         
+        # 渲染进度
+        render_frame = ttk.LabelFrame(control_frame, text="渲染进度")
+        render_frame.pack(pady=5, fill=tk.X)
+        
+        self.progress_var = tk.DoubleVar(value=0)
+        self.progress_bar = ttk.Progressbar(
+            render_frame, 
+            variable=self.progress_var, 
+            maximum=100, 
+            length=150
+        )
+        self.progress_bar.pack(padx=5, pady=(5, 2))
+        
+        self.status_var = tk.StringVar(value="空闲")
+        ttk.Label(render_frame, textvariable=self.status_var, font=('Arial', 8)).pack(padx=5)
+        
+        self.cancel_btn = ttk.Button(
+            render_frame, 
+            text="取消", 
+            command=self.cancel_render, 
+            state=tk.DISABLED
+        )
+        self.cancel_btn.pack(pady=5)
+        
+        # 预览
+        preview_frame = ttk.LabelFrame(control_frame, text="预览")
+        preview_frame.pack(pady=5, fill=tk.X)
+        
+        self.preview_label = ttk.Label(preview_frame)
+        self.preview_label.pack(padx=5, pady=5)
+        
+        self.preview_scale = ttk.Scale(
+            preview_frame, 
+            from_=0, 
+            to=0, 
+            orient=tk.HORIZONTAL, 
+            command=self.on_preview_scrub
+        )
+        self.preview_scale.pack(padx=5, fill=tk.X)
+        
+        self.play_btn = ttk.Button(preview_frame, text="播放", command=self.toggle_preview)
+        self.play_btn.pack(pady=5)
+        
         # 右侧图列表框架
         list_frame = ttk.LabelFrame(main_frame, text="拖拽图片到此处或点击添加图片按钮")
         list_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
         
-        # 创建可滚动的画布
+        # 创建可滚动的画布，只为可见的行创建控件
         self.canvas = tk.Canvas(list_frame)
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.canvas.yview)
-        self.scrollable_frame = ttk.Frame(self.canvas)
-        
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        )
-        
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.on_scroll)
         self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.bind('<Configure>', self.on_canvas_configure)
+        self.canvas.bind('<MouseWheel>', self.on_mouse_wheel)
         
         # 设置文件拖放功能
         self.canvas.drop_target_register(DND_FILES)
         self.canvas.dnd_bind('<<Drop>>', self.on_drop)
         
-        # 设置图片项目的拖放功能
-        # self.scrollable_frame.bind('<Button-1>', self.on_drag_start)
-        # self.scrollable_frame.bind('<B1-Motion>', self.on_drag_motion)
-        # self.scrollable_frame.bind('<ButtonRelease-1>', self.on_drag_end)
-        
         scrollbar.pack(side="right", fill="y")
         self.canvas.pack(side="left", fill="both", expand=True)
         
-    def create_image_frame(self, index, image_data):
-        """创建单个图片的预览框架"""
-        frame = ttk.Frame(self.scrollable_frame)
-        frame.pack(fill=tk.X, padx=5, pady=2)
-        frame.index = index  # 存储索引
+    def create_image_frame(self):
+        """创建一个图片行框架，内容由 bind_image_frame 填充"""
+        frame = ttk.Frame(self.canvas)
+        frame.index = None  # 当前显示的图片索引
+        frame.window_id = self.canvas.create_window(
+            5, 0, window=frame, anchor="nw",
+            width=max(self.canvas.winfo_width() - 10, 1), height=ROW_HEIGHT - 4
+        )
         
         # 添加拖动提示
         drag_label = ttk.Label(frame, text="☰", cursor="fleur")  # 只在拖动图标上显示移动光标
@@ -104,81 +240,271 @@ class GifMakerGUI:
         drag_label.bind('<ButtonRelease-1>', self.on_drag_end)
         
         # 预览图片
-        img = Image.open(image_data['path'])
-        original_size = img.size  # 获取原始分辨率
-        img.thumbnail((100, 100))  # 缩放预览图
-        photo = ImageTk.PhotoImage(img)
-        self.preview_images.append(photo)  # 保持引用
-        
-        label = ttk.Label(frame, image=photo)
-        label.pack(side=tk.LEFT, padx=5)
+        frame.preview_label = ttk.Label(frame)
+        frame.preview_label.pack(side=tk.LEFT, padx=5)
         
         # 文件信息框架（文件名和分辨率）
         info_frame = ttk.Frame(frame)
         info_frame.pack(side=tk.LEFT, padx=5)
         
         # 文件名
-        name_label = ttk.Label(info_frame, text=image_data['name'])
-        name_label.pack(anchor='w')
+        frame.name_label = ttk.Label(info_frame)
+        frame.name_label.pack(anchor='w')
         
         # 分辨率信息
-        resolution_label = ttk.Label(
+        frame.resolution_label = ttk.Label(
             info_frame, 
-            text=f"分辨率: {original_size[0]}×{original_size[1]}", 
             font=('Arial', 8)  # 使用小一号的字体
         )
-        resolution_label.pack(anchor='w')
+        frame.resolution_label.pack(anchor='w')
         
         # 持续时间设置
         duration_frame = ttk.Frame(frame)
         duration_frame.pack(side=tk.LEFT, padx=5)
         
-        duration_var = tk.StringVar(value=str(image_data['duration']))
-        duration_entry = ttk.Entry(duration_frame, textvariable=duration_var, width=8)
+        frame.duration_var = tk.StringVar()
+        duration_entry = ttk.Entry(duration_frame, textvariable=frame.duration_var, width=8)
         duration_entry.pack(side=tk.LEFT)
         ttk.Label(duration_frame, text="ms").pack(side=tk.LEFT)
         
-        # 删除按钮
+        # 到下一张图片的过渡效果
+        frame.transition_var = tk.StringVar()
+        frame.transition_box = ttk.Combobox(
+            frame, 
+            textvariable=frame.transition_var, 
+            values=[transition.label for transition in TRANSITIONS.values()], 
+            state='readonly', 
+            width=8
+        )
+        frame.transition_box.pack(side=tk.LEFT, padx=5)
+        
+        # 删除按钮，删除时使用行当前显示的索引
         delete_btn = ttk.Button(
             frame, 
             text="删除",
-            command=lambda idx=index: self.delete_image(idx)
+            command=lambda: self.delete_image(frame.index)
         )
         delete_btn.pack(side=tk.RIGHT, padx=5)
         
         # 更新持续时间的回调
         def update_duration(event=None):
+            if frame.index is None:
+                return
             try:
-                new_duration = int(duration_var.get())
-                self.gif_maker.update_duration(index, new_duration)
+                new_duration = int(frame.duration_var.get())
+                self.gif_maker.update_duration(frame.index, new_duration)
             except ValueError:
                 messagebox.showerror("错误", "请输入有效的数字")
-                duration_var.set(str(image_data['duration']))
+                frame.duration_var.set(str(self.gif_maker.image_items[frame.index].duration))
         
         duration_entry.bind('<FocusOut>', update_duration)
         duration_entry.bind('<Return>', update_duration)
         
+        # 更新过渡效果的回调
+        def update_transition(event=None):
+            if frame.index is None:
+                return
+            names = {transition.label: name for name, transition in TRANSITIONS.items()}
+            self.gif_maker.set_transition(frame.index, names[frame.transition_var.get()])
+        
+        frame.transition_box.bind('<<ComboboxSelected>>', update_transition)
+        
         return frame
+    
+    def bind_image_frame(self, frame, index):
+        """让行框架显示指定索引的图片"""
+        image_data = self.gif_maker.image_items[index]
+        frame.index = index
+        
+        # 分辨率使用添加图片时读取的文件头信息，不需要重新打开文件
+        resolution = f"分辨率: {image_data.width}×{image_data.height}"
+        try:
+            photo, _ = self.thumbnails.get(image_data.path)
+        except Exception:
+            photo = ''
+        frame.preview_label.configure(image=photo)
+        frame.name_label.configure(text=image_data.name)
+        frame.resolution_label.configure(text=resolution)
+        frame.duration_var.set(str(image_data.duration))
+        frame.transition_var.set(get_transition(image_data.transition).label)
+        # 最后一张图片之后没有过渡
+        is_last = index == len(self.gif_maker.image_items) - 1
+        frame.transition_box.configure(state=tk.DISABLED if is_last else 'readonly')
+        
+        self.canvas.coords(frame.window_id, 5, index * ROW_HEIGHT + 2)
+        self.canvas.itemconfigure(frame.window_id, state='normal')
+    
+    def update_visible_rows(self, changed_from=None, changed_to=None):
+        """按滚动位置创建、复用或隐藏行
+        
+        Args:
+            changed_from: 内容发生变化的第一个索引，None 表示没有变化
+            changed_to: 内容发生变化的最后一个索引，None 表示直到列表末尾
+        """
+        count = len(self.gif_maker.image_items)
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), count * ROW_HEIGHT))
+        
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), ROW_HEIGHT)
+        first = max(0, int(top // ROW_HEIGHT) - 1)
+        last = min(count, int((top + height) // ROW_HEIGHT) + 2)
+        
+        # 隐藏移出可见范围的行
+        for index in [i for i in self.rows if not first <= i < last]:
+            frame = self.rows.pop(index)
+            frame.index = None
+            self.canvas.itemconfigure(frame.window_id, state='hidden')
+            self.spare_rows.append(frame)
+        
+        # 只重新填充内容变化的行和新进入可见范围的行
+        for index in range(first, last):
+            frame = self.rows.get(index)
+            if frame is None:
+                frame = self.spare_rows.pop() if self.spare_rows else self.create_image_frame()
+                self.rows[index] = frame
+            elif changed_from is None or index < changed_from or (
+                    changed_to is not None and index > changed_to):
+                continue
+            self.bind_image_frame(frame, index)
         
     def refresh_image_list(self):
         """刷新图片列表显示"""
-        # 清除现有项目
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        self.preview_images.clear()
-        
-        # 重新创建所有项目
-        for i, image_data in enumerate(self.gif_maker.image_items):
-            self.create_image_frame(i, image_data)
+        self.update_visible_rows(changed_from=0)
+    
+    def on_scroll(self, *args):
+        """滚动条拖动时滚动画布并更新可见行"""
+        self.canvas.yview(*args)
+        self.update_visible_rows()
+    
+    def on_mouse_wheel(self, event):
+        """鼠标滚轮滚动"""
+        self.on_scroll('scroll', -1 if event.delta > 0 else 1, 'units')
+    
+    def on_canvas_configure(self, event):
+        """画布大小变化时调整行宽度"""
+        for frame in list(self.rows.values()) + self.spare_rows:
+            self.canvas.itemconfigure(frame.window_id, width=max(event.width - 10, 1))
+        self.update_visible_rows()
     
     def add_image(self):
         files = filedialog.askopenfilenames(
             title="选择图片",
             filetypes=[("图片文件", "*.png *.jpg *.jpeg")]
         )
-        for file in files:
-            self.gif_maker.add_image(file)
-        self.refresh_image_list()
+        if files:
+            self.start_import(files)
+    
+    def add_folder(self):
+        folder = filedialog.askdirectory(title="选择图片文件夹")
+        if folder:
+            self.start_import([folder])
+    
+    def open_project(self):
+        """打开项目文件，替换当前图片列表并恢复输出设置"""
+        path = filedialog.askopenfilename(
+            title="打开项目",
+            filetypes=[("ezGIF 项目", '*' + PROJECT_SUFFIX)]
+        )
+        if not path:
+            return
+        try:
+            settings, missing = self.gif_maker.load_project(path)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        
+        self.stop_preview()
+        for key, var in (('width', self.width_var), ('height', self.height_var),
+                         ('transition_frames', self.transition_frames_var)):
+            if key in settings:
+                var.set(str(settings[key]))
+        self.auto_fade_var.set(bool(settings.get('auto_fade_color', False)))
+        self.update_visible_rows(changed_from=0)
+        self.import_status_var.set(f"共 {len(self.gif_maker.image_items)} 张图片")
+        if missing:
+            messagebox.showwarning("警告", f"{len(missing)} 张图片找不到或无法打开:\n" + "\n".join(missing[:10]))
+    
+    def save_project(self):
+        """把图片列表和输出设置保存为项目文件"""
+        path = filedialog.asksaveasfilename(
+            defaultextension=PROJECT_SUFFIX,
+            filetypes=[("ezGIF 项目", '*' + PROJECT_SUFFIX)]
+        )
+        if not path:
+            return
+        settings = {
+            'width': self.width_var.get(),
+            'height': self.height_var.get(),
+            'transition_frames': self.transition_frames_var.get(),
+            'auto_fade_color': self.auto_fade_var.get(),
+        }
+        try:
+            self.gif_maker.save_project(path, settings)
+        except OSError as e:
+            messagebox.showerror("错误", f"保存项目失败: {str(e)}")
+    
+    def start_import(self, paths):
+        """在后台线程中批量导入文件和文件夹，结果分批加入列表
+        
+        Args:
+            paths: 文件或文件夹路径列表
+        """
+        order = IMPORT_ORDERS.get(self.import_order_var.get(), 'name')
+        # 查重用的图片列表在主线程中复制，后台线程不读取正在追加的 image_items
+        known_items = list(self.gif_maker.image_items) if self.skip_duplicates_var.get() else None
+        self.import_jobs.put((list(paths), order, known_items))
+        self.import_status_var.set("正在导入")
+        if self.import_thread is None:
+            self.import_thread = threading.Thread(target=self.import_worker, daemon=True)
+            self.import_thread.start()
+    
+    def import_worker(self):
+        """后台导入线程：读取文件头，通过事件队列把每批图片信息发给界面"""
+        while True:
+            paths, order, known_items = self.import_jobs.get()
+            
+            def progress(done, total):
+                self.import_events.put(('progress', (done, total)))
+            
+            try:
+                batches = self.gif_maker.iter_import(
+                    paths, order=order, progress=progress,
+                    skip_duplicates=known_items is not None, known_items=known_items
+                )
+                for batch in batches:
+                    self.import_events.put(('batch', batch))
+            except Exception as e:
+                self.import_events.put(('error', str(e)))
+            self.import_events.put(('done', self.import_jobs.qsize()))
+    
+    def poll_import_events(self):
+        """在主线程中把后台导入的图片加入列表，每次轮询只刷新一次界面"""
+        start = None
+        latest_progress = None
+        try:
+            while True:
+                kind, data = self.import_events.get_nowait()
+                if kind == 'batch':
+                    if start is None:
+                        start = len(self.gif_maker.image_items)
+                    self.gif_maker.image_items.extend(data)
+                elif kind == 'progress':
+                    latest_progress = data
+                elif kind == 'error':
+                    messagebox.showerror("错误", f"导入图片失败: {data}")
+                elif kind == 'done' and not data:
+                    latest_progress = None
+                    self.import_status_var.set(f"共 {len(self.gif_maker.image_items)} 张图片")
+        except queue.Empty:
+            pass
+        
+        if latest_progress is not None:
+            done, total = latest_progress
+            self.import_status_var.set(f"导入 {done}/{total}")
+        if start is not None:
+            # 原来的最后一行也需要更新（过渡效果变为可选）
+            self.update_visible_rows(changed_from=max(start - 1, 0))
+        self.window.after(100, self.poll_import_events)
     
     def create_gif(self):
         if not self.gif_maker.image_items:
@@ -195,20 +521,197 @@ class GifMakerGUI:
             messagebox.showerror("错误", "请输入有效的数值")
             return
             
+        # 只列出当前环境可以写入的格式，按扩展名决定输出格式
         output_path = filedialog.asksaveasfilename(
             defaultextension=".gif",
-            filetypes=[("GIF文件", "*.gif")]
+            filetypes=[
+                (FORMAT_NAMES[output_format], '*' + FORMAT_SUFFIXES[output_format])
+                for output_format in available_formats()
+            ]
         )
         if output_path:
+            # 复制当前图片列表，渲染期间可以继续编辑
+            snapshot = GifMaker(
+                slide_cache=self.gif_maker.slide_cache, 
+                segment_cache=self.gif_maker.segment_cache
+            )
+            snapshot.image_items = [item.copy() for item in self.gif_maker.image_items]
+            snapshot.auto_fade_color = self.auto_fade_var.get()
+            job = {
+                'maker': snapshot,
+                'output_path': output_path,
+                'size': (width, height),
+                'transition_frames': transition_frames,
+                'cancel_event': threading.Event(),
+            }
+            self.pending_job_count += 1
+            self.render_jobs.put(job)
+            self.update_render_status()
+            
+            if self.render_thread is None:
+                self.render_thread = threading.Thread(target=self.render_worker, daemon=True)
+                self.render_thread.start()
+    
+    def render_worker(self):
+        """后台渲染线程：依次执行队列中的任务，通过事件队列通知界面"""
+        while True:
+            job = self.render_jobs.get()
+            self.render_events.put(('start', job, None))
+            
+            def progress(stage, done, total, job=job):
+                self.render_events.put(('progress', job, (stage, done, total)))
+            
             try:
-                self.gif_maker.create_gif(
-                    output_path, 
-                    size=(width, height),
-                    transition_frames=transition_frames
+                job['maker'].create_gif(
+                    job['output_path'], 
+                    size=job['size'],
+                    transition_frames=job['transition_frames'],
+                    progress=progress,
+                    cancel_event=job['cancel_event']
                 )
-                messagebox.showinfo("成功", "GIF生成成功！")
+                self.render_events.put(('done', job, None))
+            except RenderCancelled:
+                self.render_events.put(('cancelled', job, None))
             except Exception as e:
-                messagebox.showerror("错误", f"生成GIF失败: {str(e)}")
+                self.render_events.put(('error', job, str(e)))
+    
+    def poll_render_events(self):
+        """在主线程中处理后台渲染线程发来的事件"""
+        latest_progress = None
+        try:
+            while True:
+                kind, job, data = self.render_events.get_nowait()
+                if kind == 'progress':
+                    # 只显示最新的进度，避免频繁刷新界面
+                    latest_progress = data
+                    continue
+                if kind == 'start':
+                    self.current_job = job
+                    self.pending_job_count -= 1
+                    self.progress_var.set(0)
+                    self.cancel_btn.configure(state=tk.NORMAL)
+                    self.update_render_status("准备中")
+                    continue
+                
+                latest_progress = None
+                self.current_job = None
+                self.cancel_btn.configure(state=tk.DISABLED)
+                self.progress_var.set(100 if kind == 'done' else 0)
+                if kind == 'done':
+                    self.update_render_status("完成")
+                    messagebox.showinfo("成功", f"生成成功！\n{job['output_path']}")
+                elif kind == 'cancelled':
+                    self.update_render_status("已取消")
+                else:
+                    self.update_render_status("失败")
+                    messagebox.showerror("错误", f"生成GIF失败: {data}")
+        except queue.Empty:
+            pass
+        
+        if latest_progress is not None and self.current_job is not None:
+            stage, done, total = latest_progress
+            self.progress_var.set(100 * done / total if total else 0)
+            self.update_render_status(f"{STAGE_NAMES.get(stage, stage)} {done}/{total}")
+        
+        self.window.after(100, self.poll_render_events)
+    
+    def update_render_status(self, text=None):
+        """更新渲染状态文字，附带排队中的任务数"""
+        if text is None:
+            text = "渲染中" if self.current_job is not None else "空闲"
+        if self.pending_job_count > 0:
+            text = f"{text}（排队 {self.pending_job_count}）"
+        self.status_var.set(text)
+    
+    def cancel_render(self):
+        """取消当前渲染任务，未完成的文件会被删除"""
+        if self.current_job is not None:
+            self.current_job['cancel_event'].set()
+            self.cancel_btn.configure(state=tk.DISABLED)
+            self.update_render_status("正在取消")
+    
+    def refresh_preview(self):
+        """用当前图片列表和设置更新预览渲染器
+        
+        Returns:
+            bool: 设置有效且有图片时返回True
+        """
+        try:
+            size = (int(self.width_var.get()), int(self.height_var.get()))
+            transition_frames = int(self.transition_frames_var.get())
+            if min(size) < 1 or transition_frames < 1:
+                raise ValueError("无效的预览设置")
+        except ValueError:
+            return False
+        
+        self.gif_maker.auto_fade_color = self.auto_fade_var.get()
+        items = self.gif_maker.image_items
+        self.preview.update(items, transition_frames, fit_preview_size(size))
+        self.preview_scale.configure(to=max(len(items) - 1, 0))
+        self.preview_position = min(self.preview_position, max(len(self.preview) - 1, 0))
+        return len(self.preview) > 0
+    
+    def show_preview_frame(self, position):
+        """显示预览时间轴中的一帧，返回该帧的显示时间"""
+        try:
+            frame, duration = self.preview.frame(position)
+        except ValueError as e:
+            self.stop_preview()
+            messagebox.showerror("错误", str(e))
+            return None
+        self.preview_photo = ImageTk.PhotoImage(Image.fromarray(frame))
+        self.preview_label.configure(image=self.preview_photo)
+        self.preview_position = position
+        return duration
+    
+    def toggle_preview(self):
+        """开始或暂停预览播放"""
+        if self.preview_after_id is not None:
+            self.stop_preview()
+        elif self.refresh_preview():
+            self.play_btn.configure(text="暂停")
+            self.preview_tick()
+    
+    def stop_preview(self):
+        """停止预览播放"""
+        if self.preview_after_id is not None:
+            self.window.after_cancel(self.preview_after_id)
+            self.preview_after_id = None
+        self.play_btn.configure(text="播放")
+    
+    def preview_tick(self):
+        """显示当前帧并按其显示时间安排下一帧，后台预取后续的帧"""
+        duration = self.show_preview_frame(self.preview_position)
+        if duration is None:
+            return
+        self.preview.prefetch(self.preview_position + 1)
+        
+        next_position = self.preview_position + 1
+        if next_position >= len(self.preview):
+            # 每轮播放结束时同步图片列表的修改
+            next_position = 0
+            if not self.refresh_preview():
+                self.stop_preview()
+                return
+        self.preview_position = next_position
+        self.preview_after_id = self.window.after(duration, self.preview_tick)
+    
+    def on_preview_scrub(self, value):
+        """拖动预览滑块时立即跳到对应图片"""
+        if not self.refresh_preview():
+            return
+        index = min(int(round(float(value))), len(self.gif_maker.image_items) - 1)
+        position = self.preview.slide_start(index)
+        if position == self.preview_position and self.preview_after_id is not None:
+            return
+        if self.preview_after_id is not None:
+            # 播放中从新位置继续
+            self.window.after_cancel(self.preview_after_id)
+            self.preview_position = position
+            self.preview_tick()
+        else:
+            self.show_preview_frame(position)
+            self.preview.prefetch(position + 1)
     
     # 拖拽相关方法
     def on_drag_start(self, event):
@@ -216,75 +719,50 @@ class GifMakerGUI:
         widget = event.widget  # 直接使用触发事件的widget（拖动图标）
         frame = widget.winfo_parent()
         frame = self.window.nametowidget(frame)
-        if hasattr(frame, 'index'):
+        if getattr(frame, 'index', None) is not None:
             self._drag_data = {
-                'widget': frame,
                 'index': frame.index,
                 'y': event.y_root
             }
-            # 移除全局光标设置
-            # self.window.config(cursor="fleur")  
     
     def on_drag_motion(self, event):
         """拖动图片项目时的处理"""
         if hasattr(self, '_drag_data'):
-            # 获取当前鼠标位置下的部件
-            widget = event.widget.winfo_containing(event.x_root, event.y_root)
-            if widget:
-                # 获取目标框架
-                target_frame = widget.winfo_parent()
-                if target_frame:
-                    target_frame = self.window.nametowidget(target_frame)
-                    
-                    # 确保目标框架有index属性且图片列表不为空
-                    if (hasattr(target_frame, 'index') and 
-                        len(self.gif_maker.image_items) > 0):
-                        
-                        # 获取目标索引值（而不是直接使用属性）
-                        target_index = getattr(target_frame, 'index')
-                        current_index = self._drag_data['index']
-                        
-                        # 确保索引是有效的整数
-                        if (isinstance(target_index, int) and 
-                            isinstance(current_index, int) and
-                            0 <= target_index < len(self.gif_maker.image_items) and
-                            0 <= current_index < len(self.gif_maker.image_items) and
-                            target_index != current_index):
-                            
-                            try:
-                                # 移动图片
-                                self.gif_maker.move_image(current_index, target_index)
-                                self.refresh_image_list()
-                                self._drag_data['index'] = target_index
-                                self._drag_data['y'] = event.y_root
-                            except Exception as e:
-                                print(f"移动图片时出错: {str(e)}")
+            # 根据鼠标在画布中的位置计算目标索引
+            canvas_y = self.canvas.canvasy(event.y_root - self.canvas.winfo_rooty())
+            target_index = int(canvas_y // ROW_HEIGHT)
+            current_index = self._drag_data['index']
+            
+            if (0 <= target_index < len(self.gif_maker.image_items) and
+                    target_index != current_index):
+                try:
+                    # 移动图片，只刷新两个位置之间的行
+                    self.gif_maker.move_image(current_index, target_index)
+                    self.update_visible_rows(
+                        changed_from=min(current_index, target_index),
+                        changed_to=max(current_index, target_index)
+                    )
+                    self._drag_data['index'] = target_index
+                    self._drag_data['y'] = event.y_root
+                except Exception as e:
+                    print(f"移动图片时出错: {str(e)}")
     
     def on_drag_end(self, event):
         """结束拖动图片项目"""
         if hasattr(self, '_drag_data'):
-            # 移除全局光标设置
-            # self.window.config(cursor="")
             del self._drag_data
     
     def delete_image(self, index):
         """删除图片"""
-        if self.gif_maker.delete_image(index):
-            self.refresh_image_list()
+        if index is not None and self.gif_maker.delete_image(index):
+            self.update_visible_rows(changed_from=max(index - 1, 0))
     
     def on_drop(self, event):
         """处理文件拖放"""
         # 获取拖放的文件路径
         files = event.data
         if files:
-            # 在Windows系统中，文件路径可能带有大括号和引号，需要处理
-            files = files.replace('{', '').replace('}', '')
-            file_list = files.split() if ' ' in files else [files]
-            
-            # 过滤出支持的图片文件
-            valid_extensions = ('.png', '.jpg', '.jpeg', '.PNG', '.JPG', '.JPEG')
-            for file_path in file_list:
-                if file_path.endswith(valid_extensions):
-                    self.gif_maker.add_image(file_path)
-            
-            self.refresh_image_list()
\ No newline at end of file
+            # 拖放数据是Tcl列表，含空格的路径用大括号包围，需要按Tcl规则拆分
+            file_list = self.window.tk.splitlist(files)
+            # 文件和文件夹都交给后台导入，不支持的文件在导入时被忽略
+            self.start_import(file_list)
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""渲染流程的插桩接口
+
+GifMaker 在各阶段发出计时区间 (span) 和计数器 (counter)，由监听器接收。
+没有监听器时 span() 返回共享的空上下文，count() 直接返回，开销接近于零。
+
+监听器只需实现两个方法:
+    on_span(stage, seconds, tags)
+    on_count(name, value, tags)
+
+示例:
+    aggregator = StageAggregator()
+    maker.instrumentation.add_listener(aggregator)
+    maker.create_gif('out.gif')
+    aggregator.print_report()
+"""
+from contextlib import nullcontext
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+
+# 没有监听器时使用的空上下文
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    """计时区间，退出时把耗时发送给监听器"""
+    
+    __slots__ = ('_instrumentation', '_stage', '_tags', '_start')
+    
+    def __init__(self, instrumentation, stage, tags):
+        self._instrumentation = instrumentation
+        self._stage = stage
+        self._tags = tags
+    
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._instrumentation.record_span(self._stage, time.perf_counter() - self._start, self._tags)
+        return False
+
+
+class Instrumentation:
+    """插桩事件分发器"""
+    
+    def __init__(self):
+        self.listeners = []
+    
+    @property
+    def enabled(self):
+        """是否有监听器"""
+        return bool(self.listeners)
+    
+    def add_listener(self, listener):
+        """添加监听器"""
+        self.listeners.append(listener)
+    
+    def remove_listener(self, listener):
+        """移除监听器"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+    
+    def span(self, stage, **tags):
+        """返回计时区间的上下文管理器
+        
+        Args:
+            stage: 阶段名称，例如 'decode'、'blend'
+            **tags: 附加信息，例如 slide=图片索引
+            
+        Returns:
+            上下文管理器，退出时记录耗时
+        """
+        if not self.listeners:
+            return _NULL_SPAN
+        return _Span(self, stage, tags)
+    
+    def record_span(self, stage, seconds, tags=None):
+        """直接记录一段已测量的耗时"""
+        for listener in self.listeners:
+            listener.on_span(stage, seconds, tags or {})
+    
+    def count(self, name, value=1, **tags):
+        """累加计数器，例如解码的字节数、生成的帧数"""
+        if not self.listeners:
+            return
+        for listener in self.listeners:
+            listener.on_count(name, value, tags)
+    
+    def timed(self, stage, iterable, **tags):
+        """包装迭代器，把每次取下一项的耗时记为一个区间
+        
+        用于统计生成器（例如混合帧）内部的耗时，不包括使用方处理每一项的时间。
+        """
+        if not self.listeners:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record_span(stage, time.perf_counter() - start, tags)
+            yield item
+
+
+class StageAggregator:
+    """按阶段汇总耗时和计数器的监听器（线程安全）"""
+    
+    def __init__(self, per_slide=False):
+        """初始化汇总器
+        
+        Args:
+            per_slide: 是否同时按图片索引 (tags 中的 slide) 汇总
+        """
+        self.per_slide = per_slide
+        self.stages = {}  # 阶段 -> [调用次数, 总耗时, 最大耗时]
+        self.slides = {}  # (阶段, 图片索引) -> [调用次数, 总耗时, 最大耗时]
+        self.counters = {}
+        self._lock = threading.Lock()
+    
+    def on_span(self, stage, seconds, tags):
+        with self._lock:
+            self._add(self.stages, stage, seconds)
+            if self.per_slide and 'slide' in tags:
+                self._add(self.slides, (stage, tags['slide']), seconds)
+    
+    def on_count(self, name, value, tags):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    @staticmethod
+    def _add(table, key, seconds):
+        entry = table.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+    
+    def summary(self):
+        """返回可序列化为JSON的汇总结果"""
+        with self._lock:
+            result = {
+                'stages': {
+                    stage: {'calls': calls, 'seconds': round(total, 6), 'max_seconds': round(peak, 6)}
+                    for stage, (calls, total, peak) in self.stages.items()
+                },
+                'counters': dict(self.counters),
+            }
+            if self.per_slide:
+                result['slides'] = {
+                    f"{stage}:{slide}": {'calls': calls, 'seconds': round(total, 6)}
+                    for (stage, slide), (calls, total, _) in self.slides.items()
+                }
+            return result
+    
+    def report(self):
+        """生成按阶段划分的耗时报告文本"""
+        summary = self.summary()
+        total = sum(stage['seconds'] for stage in summary['stages'].values()) or 1.0
+        lines = [f"{'阶段':<12}{'次数':>8}{'耗时(s)':>12}{'占比':>8}{'最大(ms)':>12}"]
+        for stage, data in sorted(summary['stages'].items(), key=lambda kv: -kv[1]['seconds']):
+            lines.append(
+                f"{stage:<12}{data['calls']:>8}{data['seconds']:>12.3f}"
+                f"{data['seconds'] / total:>8.1%}{data['max_seconds'] * 1000:>12.1f}"
+            )
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f"{name}: {value}")
+        return '\n'.join(lines)
+    
+    def print_report(self):
+        """打印按阶段划分的耗时报告"""
+        print(self.report())
+
+
+class ProfileCapture:
+    """可选的 cProfile / tracemalloc 采集
+    
+    示例:
+        with ProfileCapture(memory=True) as capture:
+            maker.create_gif('out.gif')
+        print(capture.report())
+    """
+    
+    def __init__(self, cpu=True, memory=False):
+        """初始化采集器
+        
+        Args:
+            cpu: 是否使用 cProfile 采集函数耗时
+            memory: 是否使用 tracemalloc 采集内存分配
+        """
+        self.cpu = cpu
+        self.memory = memory
+        self.profile = None
+        self.snapshot = None
+        self.peak_bytes = None
+        self._started_tracemalloc = False
+    
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.cpu:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self.profile is not None:
+            self.profile.disable()
+        if self.memory and tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        return False
+    
+    def report(self, limit=20):
+        """生成采集结果文本
+        
+        Args:
+            limit: 显示的函数或分配位置数量
+            
+        Returns:
+            str: cProfile 按累计耗时排序的结果和 tracemalloc 的主要分配位置
+        """
+        parts = []
+        if self.profile is not None:
+            stream = io.StringIO()
+            pstats.Stats(self.profile, stream=stream).sort_stats('cumulative').print_stats(limit)
+            parts.append(stream.getvalue())
+        if self.snapshot is not None:
+            parts.append(f"内存峰值: {self.peak_bytes / 1024 / 1024:.1f} MB")
+            for stat in self.snapshot.statistics('lineno')[:limit]:
+                parts.append(str(stat))
+        return '\n'.join(parts)
@@ -1,6 +1,17 @@
-from gui import GifMakerGUI
+import sys
 
 def main():
+    # serve 启动本地渲染服务
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        from server import main as server_main
+        sys.exit(server_main(sys.argv[2:]))
+    
+    # 带参数运行时使用命令行批量渲染，不加载图形界面
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main())
+    
+    from gui import GifMakerGUI
     app = GifMakerGUI()
     app.window.mainloop()
 
@@ -0,0 +1,471 @@
+"""GIF以外的动画输出格式
+
+所有写入器都逐帧接收 uint8 RGB 数组和显示时间（毫秒），不在内存中保留全部帧：
+    'webp': 动画WebP，使用Pillow的 libwebp 动画编码器（私有接口不可用时改为关闭时一次保存）
+    'apng': 动画PNG，逐帧编码后直接写入 fcTL/fdAT 块
+    'mp4', 'webm': 通过 imageio 的 pyav 插件编码（需要安装 av，不需要 ffmpeg 程序）
+
+视频使用固定帧率，每帧按累计时间重复，使总时间与GIF一致。
+"""
+from io import BytesIO
+import functools
+import os
+import struct
+import time
+import zlib
+from PIL import Image, features
+import numpy as np
+
+# 扩展名 -> 输出格式
+FORMAT_EXTENSIONS = {
+    '.gif': 'gif',
+    '.webp': 'webp',
+    '.png': 'apng',
+    '.apng': 'apng',
+    '.mp4': 'mp4',
+    '.webm': 'webm',
+}
+
+# 输出格式 -> 默认扩展名
+FORMAT_SUFFIXES = {'gif': '.gif', 'webp': '.webp', 'apng': '.png', 'mp4': '.mp4', 'webm': '.webm'}
+
+# 视频格式使用的编码器
+VIDEO_CODECS = {'mp4': 'libx264', 'webm': 'libvpx-vp9'}
+
+# 视频帧率，足以表示最短 20ms 的过渡帧
+VIDEO_FPS = 50
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def detect_format(output_path, output_format=None):
+    """确定输出格式
+    
+    Args:
+        output_path: 输出文件路径
+        output_format: 指定的格式，None 表示按扩展名判断
+        
+    Returns:
+        str: 输出格式
+        
+    Raises:
+        ValueError: 当格式不支持时
+    """
+    if output_format is None:
+        extension = os.path.splitext(output_path)[1].lower()
+        output_format = FORMAT_EXTENSIONS.get(extension, 'gif')
+    if output_format not in FORMAT_SUFFIXES:
+        raise ValueError(f"不支持的输出格式: {output_format}")
+    return output_format
+
+
+def available_formats():
+    """列出当前环境可以写入的输出格式
+    
+    Returns:
+        list: 输出格式列表
+    """
+    formats = ['gif', 'apng']
+    if features.check('webp'):
+        formats.append('webp')
+    try:
+        import av
+    except ImportError:
+        return formats
+    for output_format, codec in VIDEO_CODECS.items():
+        try:
+            av.codec.Codec(codec, 'w')
+        except Exception:
+            continue
+        formats.append(output_format)
+    return formats
+
+
+def open_writer(output_path, size, output_format, loop=0, quality=80):
+    """创建非GIF格式的写入器
+    
+    Args:
+        output_path: 输出文件路径
+        size: 画面大小 (宽, 高)
+        output_format: 'webp'、'apng'、'mp4' 或 'webm'
+        loop: 循环次数，0 表示无限循环（视频忽略）
+        quality: WebP 有损压缩质量 0..100
+        
+    Returns:
+        写入器，提供 write_frame(frame, duration)、close() 和 abort()
+        
+    Raises:
+        ValueError: 当格式在当前环境不可用时
+    """
+    if output_format not in available_formats():
+        raise ValueError(f"当前环境不支持输出格式: {output_format}")
+    if output_format == 'webp':
+        return WebPWriter(output_path, size, loop, quality)
+    if output_format == 'apng':
+        return ApngWriter(output_path, size, loop)
+    return VideoWriter(output_path, size, VIDEO_CODECS[output_format])
+
+
+class _StreamWriter:
+    """写入器公共部分：帧计数、字节数和上下文管理"""
+    
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.frame_count = 0
+        self.bytes_written = 0
+    
+    def close(self):
+        raise NotImplementedError
+    
+    def abort(self):
+        """放弃写入并删除不完整的文件"""
+        try:
+            os.remove(self.output_path)
+        except OSError:
+            pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def _new_webp_encoder(size, loop):
+    """创建Pillow内部的动画WebP编码器（私有接口，参数按 Pillow 11/12 的顺序）"""
+    from PIL import _webp
+    # 参数依次为：背景色、循环次数、最小化大小、关键帧间隔、混合模式、详细输出
+    return _webp.WebPAnimEncoder(tuple(size), 0, loop, False, 3, 5, False, False)
+
+
+def _add_webp_frame(encoder, image, timestamp, quality, method):
+    """向编码器加入一帧，image 为 None 时结束动画"""
+    im = None if image is None else image.getim()
+    encoder.add(im, timestamp, False, quality, 100, method)
+
+
+@functools.lru_cache(maxsize=None)
+def webp_encoder_available():
+    """检查Pillow内部的动画WebP编码器接口是否与这里的用法一致
+    
+    WebPAnimEncoder 和 Image.getim 不是公开接口，参数在Pillow版本之间变化过。
+    用一帧 1x1 的图片完整地试编码一次，任何一步出错都视为不可用。
+    
+    Returns:
+        bool: 可以逐帧编码时为True
+    """
+    try:
+        encoder = _new_webp_encoder((1, 1), 0)
+        _add_webp_frame(encoder, Image.new('RGB', (1, 1)), 0, 80, 0)
+        _add_webp_frame(encoder, None, 100, 80, 0)
+        return encoder.assemble('', '', '') is not None
+    except Exception:
+        return False
+
+
+class WebPWriter(_StreamWriter):
+    """动画WebP写入器
+    
+    帧在加入时即被编码，编码器只保留压缩后的数据，关闭时写入文件。
+    当前Pillow的内部编码器接口不可用时（见 webp_encoder_available），
+    改为保留全部帧并在关闭时用公开的 Image.save(save_all=True) 保存，结果相同但内存占用随帧数增长。
+    """
+    
+    def __init__(self, output_path, size, loop=0, quality=80, method=4):
+        """初始化写入器
+        
+        Args:
+            output_path: 输出文件路径
+            size: 画面大小 (宽, 高)
+            loop: 循环次数，0 表示无限循环
+            quality: 有损压缩质量 0..100
+            method: 压缩方法 0..6，越大越慢、文件越小
+        """
+        super().__init__(output_path)
+        self.loop = loop
+        self.quality = quality
+        self.method = method
+        self._timestamp = 0
+        self._encoder = None
+        self._frames = None  # 不能逐帧编码时保留的 (图片, 显示时间)
+        if webp_encoder_available():
+            self._encoder = _new_webp_encoder(size, loop)
+        else:
+            self._frames = []
+    
+    def write_frame(self, frame, duration):
+        """编码一帧
+        
+        Args:
+            frame: uint8 RGB 帧数组
+            duration: 帧显示时间（毫秒）
+        """
+        image = Image.fromarray(np.ascontiguousarray(frame))
+        if self._frames is not None:
+            self._frames.append((image, int(duration)))
+        else:
+            _add_webp_frame(self._encoder, image, self._timestamp, self.quality, self.method)
+        self._timestamp += int(duration)
+        self.frame_count += 1
+    
+    def close(self):
+        """结束编码并写入文件"""
+        if self._frames is not None:
+            self._save_frames()
+            return
+        if self._encoder is None:
+            return
+        _add_webp_frame(self._encoder, None, self._timestamp, self.quality, 0)
+        data = self._encoder.assemble('', '', '')
+        self._encoder = None
+        if data is None:
+            raise OSError("WebP编码失败")
+        with open(self.output_path, 'wb') as f:
+            f.write(data)
+        self.bytes_written = len(data)
+    
+    def _save_frames(self):
+        """用公开接口一次保存全部帧"""
+        frames, self._frames = self._frames, None
+        if not frames:
+            raise OSError("WebP编码失败: 没有任何帧")
+        images = [image for image, _ in frames]
+        images[0].save(
+            self.output_path, format='WEBP', save_all=True, append_images=images[1:],
+            duration=[duration for _, duration in frames], loop=self.loop,
+            quality=self.quality, method=self.method
+        )
+        self.bytes_written = os.path.getsize(self.output_path)
+    
+    def abort(self):
+        self._encoder = None
+        self._frames = None
+
+
+class ApngWriter(_StreamWriter):
+    """动画PNG写入器
+    
+    每帧只写入与上一帧相比变化的矩形区域，用Pillow编码为PNG后取出图像数据，
+    作为 fcTL + IDAT/fdAT 块直接写入文件。acTL 块中的总帧数在关闭时回填，
+    因此不需要预先知道帧数。
+    """
+    
+    def __init__(self, output_path, size, loop=0):
+        """初始化写入器并写入文件头
+        
+        Args:
+            output_path: 输出文件路径
+            size: 画面大小 (宽, 高)
+            loop: 循环次数，0 表示无限循环
+        """
+        super().__init__(output_path)
+        self.size = size
+        self.loop = loop
+        self._sequence = 0
+        self._previous = None
+        self._fp = open(output_path, 'wb')
+        width, height = size
+        self._write(PNG_SIGNATURE)
+        # 8位RGB，不隔行
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        self._actl_offset = self._fp.tell()
+        self._write_chunk(b'acTL', struct.pack('>II', 0, loop))
+    
+    def _write(self, data):
+        self._fp.write(data)
+        self.bytes_written += len(data)
+    
+    def _write_chunk(self, tag, data):
+        crc = zlib.crc32(tag + data)
+        self._write(struct.pack('>I', len(data)) + tag + data + struct.pack('>I', crc))
+    
+    def _next_sequence(self):
+        sequence = self._sequence
+        self._sequence += 1
+        return sequence
+    
+    def write_frame(self, frame, duration):
+        """编码并写入一帧
+        
+        Args:
+            frame: uint8 RGB 帧数组
+            duration: 帧显示时间（毫秒）
+        """
+        frame = np.asarray(frame)[..., :3]
+        left, top = 0, 0
+        region = frame
+        if self._previous is not None:
+            changed = (frame != self._previous).any(axis=2)
+            rows = np.flatnonzero(changed.any(axis=1))
+            if len(rows) == 0:
+                region = frame[:1, :1]
+            else:
+                cols = np.flatnonzero(changed.any(axis=0))
+                top, left = int(rows[0]), int(cols[0])
+                region = frame[top:rows[-1] + 1, left:cols[-1] + 1]
+        self._previous = frame.copy()
+        
+        # 延迟以分数表示，分子只有16位
+        delay_num, delay_den = int(duration), 1000
+        if delay_num > 0xFFFF:
+            delay_num, delay_den = round(duration / 10), 100
+        height, width = region.shape[:2]
+        # 处置方式为不处置，混合方式为覆盖
+        control = struct.pack('>IIIIIHHBB', self._next_sequence(), width, height, left, top,
+                              delay_num, delay_den, 0, 0)
+        self._write_chunk(b'fcTL', control)
+        
+        for data in self._encode(region):
+            if self.frame_count == 0:
+                self._write_chunk(b'IDAT', data)
+            else:
+                self._write_chunk(b'fdAT', struct.pack('>I', self._next_sequence()) + data)
+        self.frame_count += 1
+    
+    def _encode(self, region):
+        """用Pillow编码PNG，返回其中各个 IDAT 块的数据"""
+        buffer = BytesIO()
+        Image.fromarray(np.ascontiguousarray(region)).save(buffer, 'PNG')
+        png = buffer.getvalue()
+        chunks = []
+        position = len(PNG_SIGNATURE)
+        while position < len(png):
+            length, tag = struct.unpack('>I4s', png[position:position + 8])
+            if tag == b'IDAT':
+                chunks.append(png[position + 8:position + 8 + length])
+            position += 12 + length
+        return chunks
+    
+    def close(self):
+        """写入结束块，回填总帧数并关闭文件"""
+        if self._fp is None:
+            return
+        self._write_chunk(b'IEND', b'')
+        data = struct.pack('>II', self.frame_count, self.loop)
+        self._fp.seek(self._actl_offset)
+        self._fp.write(struct.pack('>I', len(data)) + b'acTL' + data + struct.pack('>I', zlib.crc32(b'acTL' + data)))
+        self._fp.close()
+        self._fp = None
+    
+    def abort(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        super().abort()
+
+
+class VideoWriter(_StreamWriter):
+    """通过 imageio 的 pyav 插件写入 MP4/WebM 视频
+    
+    视频为固定帧率，每帧按累计显示时间重复若干次，短于一帧间隔的帧可能被跳过。
+    """
+    
+    def __init__(self, output_path, size, codec, fps=VIDEO_FPS):
+        """初始化写入器
+        
+        Args:
+            output_path: 输出文件路径
+            size: 画面大小 (宽, 高)
+            codec: 视频编码器名称，例如 'libx264'
+            fps: 帧率
+        """
+        import imageio.v3 as iio
+        
+        super().__init__(output_path)
+        self.fps = fps
+        self._elapsed = 0  # 已写入帧的累计时间（毫秒）
+        self._written = 0  # 已写入的视频帧数
+        # yuv420p 要求宽高为偶数
+        self._padding = ((0, size[1] % 2), (0, size[0] % 2), (0, 0))
+        self._file = iio.imopen(output_path, 'w', plugin='pyav')
+        self._file.init_video_stream(codec, fps=fps, pixel_format='yuv420p')
+    
+    def write_frame(self, frame, duration):
+        """按显示时间重复写入一帧
+        
+        Args:
+            frame: uint8 RGB 帧数组
+            duration: 帧显示时间（毫秒）
+        """
+        frame = np.asarray(frame)[..., :3]
+        if any(pad for _, pad in self._padding[:2]):
+            frame = np.pad(frame, self._padding, mode='edge')
+        self._elapsed += int(duration)
+        target = round(self._elapsed * self.fps / 1000)
+        while self._written < target:
+            self._file.write_frame(np.ascontiguousarray(frame))
+            self._written += 1
+        self.frame_count += 1
+    
+    def close(self):
+        """结束编码并关闭文件"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self.bytes_written = os.path.getsize(self.output_path)
+    
+    def abort(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+        super().abort()
+
+
+def compare_formats(maker, output_base, size=(800, 600), transition_frames=15, formats=None, **options):
+    """用同一组图片生成多种格式，比较文件大小和编码时间
+    
+    Args:
+        maker: GifMaker 对象
+        output_base: 输出路径（不含扩展名），每种格式加上对应的扩展名
+        size: 目标图片大小 (宽, 高)
+        transition_frames: 过渡帧数
+        formats: 要比较的格式列表，默认为当前环境可用的全部格式
+        **options: 传给 create_gif 的其他参数
+        
+    Returns:
+        list: 每种格式一项 {'format', 'path', 'bytes', 'seconds', 'ratio'}，
+            ratio 为相对GIF的大小（未生成GIF时为 None）
+    """
+    results = []
+    for output_format in formats or available_formats():
+        path = output_base + FORMAT_SUFFIXES[output_format]
+        start = time.perf_counter()
+        maker.create_gif(path, size, transition_frames, output_format=output_format, **options)
+        results.append({
+            'format': output_format,
+            'path': path,
+            'bytes': os.path.getsize(path),
+            'seconds': round(time.perf_counter() - start, 4),
+        })
+    
+    gif_bytes = next((result['bytes'] for result in results if result['format'] == 'gif'), None)
+    for result in results:
+        result['ratio'] = round(result['bytes'] / gif_bytes, 4) if gif_bytes else None
+    return results
+
+
+def format_report(results):
+    """把 compare_formats 的结果排版为文本表格
+    
+    Args:
+        results: compare_formats 返回的列表
+        
+    Returns:
+        str: 报告文本
+    """
+    # 中文字符显示宽度为2，表头的宽度相应减小
+    lines = [f"{'格式':<6}{'大小(KB)':>10}{'相对GIF':>10}{'耗时(s)':>9}"]
+    for result in results:
+        ratio = f"{result['ratio']:.1%}" if result['ratio'] is not None else '-'
+        lines.append(
+            f"{result['format']:<8}{result['bytes'] / 1024:>12.1f}{ratio:>12}{result['seconds']:>11.2f}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,199 @@
+from PIL import Image
+import numpy as np
+
+# 4x4 Bayer 有序抖动矩阵
+BAYER_4X4 = np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+], dtype=np.float32)
+
+# 每张图片用于生成调色板的最大采样像素数
+DEFAULT_SAMPLES = 65536
+# 过渡色向每张图片的平均颜色渐变时在调色板中保留的中间颜色数（按 1/2、1/4、1/8 ... 的比例）
+FADE_RAMP_STEPS = 3
+
+
+def sample_pixels(source, max_samples=DEFAULT_SAMPLES):
+    """从图片或颜色中等间隔采样像素
+    
+    Args:
+        source: uint8 图片数组 (高, 宽, 3) 或颜色元组
+        max_samples: 最多采样的像素数
+        
+    Returns:
+        numpy.ndarray: uint8 像素数组 (n, 3)
+    """
+    if not isinstance(source, np.ndarray):
+        return np.array([source[:3]], dtype=np.uint8)
+    pixels = source.reshape(-1, source.shape[-1])[:, :3]
+    step = max(1, len(pixels) // max_samples)
+    return pixels[::step]
+
+
+def fade_colors(sources, steps=FADE_RAMP_STEPS):
+    """找出来源中的纯色（过渡色），返回需要在调色板中保留的颜色
+    
+    淡入淡出帧是过渡色与图片的混合，靠近过渡色的几帧只有很少的采样像素参与中位切分，
+    因此过渡色本身和它向各图片平均颜色渐变的几个中间颜色需要直接保留。
+    中间颜色按 1/2、1/4、1/8 ... 的比例取，越靠近过渡色越密，与淡入淡出帧的颜色分布一致。
+    
+    Args:
+        sources: uint8 图片数组或颜色元组的序列
+        steps: 过渡色向每张图片渐变的中间颜色数
+        
+    Returns:
+        list: 颜色元组列表，过渡色在前；来源中没有纯色时为空
+    """
+    colors = [tuple(int(v) for v in s[:3]) for s in sources if not isinstance(s, np.ndarray)]
+    means = [sample_pixels(s).mean(axis=0) for s in sources if isinstance(s, np.ndarray)]
+    ramp = []
+    for color in colors:
+        start = np.array(color, dtype=np.float64)
+        for end in means:
+            for k in range(1, steps + 1):
+                ramp.append(tuple(int(v) for v in np.rint(start + (end - start) / 2 ** (steps + 1 - k))))
+    return colors + ramp
+
+
+class PaletteQuantizer:
+    """基于查找表的调色板量化器
+    
+    调色板确定后预先计算 RGB -> 调色板索引 的查找表，
+    之后每一帧的量化只需要一次查表，且同样的输入总是得到同样的输出。
+    """
+    
+    def __init__(self, palette, lut_bits=5, dither=False, reserve_transparent=False, exact_colors=()):
+        """初始化量化器并计算查找表
+        
+        Args:
+            palette: uint8 调色板数组 (n, 3)，n 不超过256
+            lut_bits: 查找表每个通道使用的位数
+            dither: 是否使用有序抖动
+            reserve_transparent: 是否在调色板末尾保留一个透明色索引
+            exact_colors: 必须量化后不变的颜色（需要在调色板中），查找表中它们所在的单元
+                直接映射到它们，靠前的颜色优先；使用抖动时不保证
+        """
+        self.palette = np.ascontiguousarray(palette, dtype=np.uint8).reshape(-1, 3)
+        max_colors = 255 if reserve_transparent else 256
+        if not 0 < len(self.palette) <= max_colors:
+            raise ValueError(f"调色板颜色数必须在1到{max_colors}之间")
+        self.lut_bits = lut_bits
+        self.dither = dither
+        # 透明色索引不会出现在查找表中，只用于差分帧中未变化的像素
+        self.transparent_index = len(self.palette) if reserve_transparent else None
+        self.exact_colors = [tuple(int(v) for v in color[:3]) for color in exact_colors]
+        self._lut = self._build_lut()
+        self._dither_cache = {}
+    
+    @classmethod
+    def from_sources(cls, sources, colors=256, max_samples=DEFAULT_SAMPLES, reserve_colors=(), **kwargs):
+        """从若干图片或颜色的采样像素生成调色板
+        
+        reserve_colors 中的颜色与透明色一样在调色板末尾保留位置，不依赖中位切分的结果，
+        并且量化后保持不变（见 fade_colors）。最多保留颜色数的 1/8，靠前的优先。
+        
+        Args:
+            sources: uint8 图片数组或颜色元组的序列
+            colors: 调色板颜色数
+            max_samples: 每张图片最多采样的像素数
+            reserve_colors: 必须原样出现在调色板中的颜色
+            **kwargs: 传给构造函数的其他参数
+            
+        Returns:
+            PaletteQuantizer: 量化器
+        """
+        if kwargs.get('reserve_transparent'):
+            colors = min(colors, 255)
+        reserved = list(dict.fromkeys(tuple(int(v) for v in color[:3]) for color in reserve_colors))
+        reserved = reserved[:min(max(1, colors // 8), colors - 1)]
+        samples = np.concatenate([sample_pixels(s, max_samples) for s in sources])
+        sample_image = Image.fromarray(samples.reshape(1, -1, 3))
+        quantized = sample_image.quantize(colors - len(reserved), method=Image.Quantize.MEDIANCUT)
+        used = int(np.asarray(quantized).max()) + 1
+        palette = np.array(quantized.getpalette()[:used * 3], dtype=np.uint8).reshape(-1, 3)
+        if reserved:
+            palette = np.concatenate([palette, np.array(reserved, dtype=np.uint8)])
+        return cls(palette, exact_colors=reserved, **kwargs)
+    
+    @property
+    def palette_bytes(self):
+        """调色板的 RGBRGB... 字节（包含保留的透明色）"""
+        if self.transparent_index is not None:
+            return self.palette.tobytes() + b'\x00\x00\x00'
+        return self.palette.tobytes()
+    
+    def _build_lut(self):
+        """为每个量化后的 RGB 单元计算最近的调色板索引"""
+        bits = self.lut_bits
+        levels = 1 << bits
+        step = 256 // levels
+        centers = np.arange(levels, dtype=np.float32) * step + (step - 1) / 2
+        r, g, b = np.meshgrid(centers, centers, centers, indexing='ij')
+        cells = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+        
+        palette = self.palette.astype(np.float32)
+        palette_norm = (palette ** 2).sum(axis=1)
+        lut = np.empty(len(cells), dtype=np.uint8)
+        # 距离平方 = |c|^2 - 2c·p + |p|^2，|c|^2 对 argmin 无影响可以省略
+        chunk = 32768
+        for start in range(0, len(cells), chunk):
+            block = cells[start:start + chunk]
+            distance = palette_norm - 2 * (block @ palette.T)
+            lut[start:start + chunk] = distance.argmin(axis=1)
+        
+        # 保留的颜色所在的单元直接映射到它们，倒序写入使靠前的颜色优先
+        shift = 8 - bits
+        for color in reversed(self.exact_colors):
+            matches = np.flatnonzero((self.palette == color).all(axis=1))
+            if len(matches) == 0:
+                raise ValueError(f"调色板中没有颜色 {color}")
+            r, g, b = (v >> shift for v in color)
+            lut[(r << (2 * bits)) | (g << bits) | b] = matches[-1]
+        return lut
+    
+    def _dither_offsets(self, height, width):
+        """按帧尺寸平铺的抖动偏移量（缓存复用）"""
+        key = (height, width)
+        if key not in self._dither_cache:
+            # 抖动幅度约等于调色板在每个通道上的平均间距
+            spread = 256 / max(2.0, len(self.palette) ** (1 / 3))
+            matrix = ((BAYER_4X4 + 0.5) / 16 - 0.5) * spread
+            tiled = np.tile(matrix, (height // 4 + 1, width // 4 + 1))[:height, :width]
+            self._dither_cache[key] = np.rint(tiled).astype(np.int16)[..., np.newaxis]
+        return self._dither_cache[key]
+    
+    def quantize(self, frame):
+        """把 RGB 帧映射为调色板索引
+        
+        Args:
+            frame: uint8 图片数组 (高, 宽, 3)
+            
+        Returns:
+            numpy.ndarray: uint8 索引数组 (高, 宽)
+        """
+        rgb = frame[..., :3]
+        if self.dither:
+            offsets = self._dither_offsets(rgb.shape[0], rgb.shape[1])
+            rgb = np.clip(rgb + offsets, 0, 255).astype(np.uint8)
+        
+        shift = 8 - self.lut_bits
+        index = (rgb[..., 0] >> shift).astype(np.uint32) << (2 * self.lut_bits)
+        index |= (rgb[..., 1] >> shift).astype(np.uint32) << self.lut_bits
+        index |= rgb[..., 2] >> shift
+        return self._lut[index]
+    
+    def to_image(self, indices):
+        """把索引数组包装成带调色板的 PIL 图片
+        
+        Args:
+            indices: uint8 索引数组 (高, 宽)
+            
+        Returns:
+            PIL Image: 'P' 模式图片
+        """
+        image = Image.fromarray(np.ascontiguousarray(indices, dtype=np.uint8))
+        # 对 'L' 图片设置调色板会把它变为 'P' 模式
+        image.putpalette(self.palette_bytes)
+        return image
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+import queue
+import threading
+import numpy as np
+
+# 预览默认的最大尺寸
+PREVIEW_SIZE = (240, 180)
+
+
+def fit_preview_size(output_size, max_size=PREVIEW_SIZE):
+    """按输出GIF的比例计算不超过 max_size 的预览尺寸
+    
+    Args:
+        output_size: 输出GIF大小 (宽, 高)
+        max_size: 预览最大尺寸 (宽, 高)
+        
+    Returns:
+        tuple: 预览尺寸 (宽, 高)
+    """
+    ratio = min(max_size[0] / output_size[0], max_size[1] / output_size[1], 1.0)
+    return (max(1, int(output_size[0] * ratio)), max(1, int(output_size[1] * ratio)))
+
+
+class PreviewRenderer:
+    """低分辨率预览帧渲染器
+    
+    根据 GifMaker.build_timeline 按需渲染任意一帧，不需要先渲染整个序列。
+    已渲染的帧和缩小的图片分别保存在有上限的LRU缓存中，帧的缓存键只包含
+    图片路径、过渡效果和进度，因此调整显示时间或顺序后仍然可以复用。
+    prefetch 在后台线程中提前渲染后续的帧。
+    """
+    
+    def __init__(self, maker, size=PREVIEW_SIZE, max_frames=256, max_slides=16):
+        """初始化渲染器
+        
+        Args:
+            maker: GifMaker 对象，用于读取图片和生成时间轴
+            size: 预览尺寸 (宽, 高)
+            max_frames: 最多缓存的帧数
+            max_slides: 最多缓存的缩小图片数
+        """
+        self.maker = maker
+        self.size = size
+        self.max_frames = max_frames
+        self.max_slides = max_slides
+        self.items = []
+        self.timeline = []
+        self._frames = OrderedDict()
+        self._slides = OrderedDict()
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._requests = queue.Queue()
+        self._thread = None
+    
+    def update(self, items, transition_frames, size=None):
+        """更新图片列表和过渡设置，已缓存的帧尽量保留
+        
+        Args:
+            items: 图片信息列表（会被复制）
+            transition_frames: 过渡帧数
+            size: 新的预览尺寸，None 表示不变
+        """
+        with self._lock:
+            if size is not None and tuple(size) != tuple(self.size):
+                self.size = tuple(size)
+                self._frames.clear()
+                self._slides.clear()
+            self.items = [item.copy() for item in items]
+            self.timeline = self.maker.build_timeline(transition_frames, self.items)
+            self._generation += 1
+    
+    def __len__(self):
+        return len(self.timeline)
+    
+    def slide_start(self, index):
+        """返回第 index 张图片本身那一帧在时间轴中的位置"""
+        for position, frame in enumerate(self.timeline):
+            if frame.kind == 'slide' and frame.slides[0] == index:
+                return position
+        return 0
+    
+    def _frame_key(self, spec):
+        paths = tuple(None if i is None else self.items[i].path for i in spec.slides)
+        # 淡入淡出帧还取决于过渡色（自动过渡色随首尾图片变化）
+        color = self.maker.fade_color() if None in spec.slides else None
+        return paths, spec.weight, spec.effect, color
+    
+    def _slide(self, index):
+        """读取缩小到预览尺寸的图片（LRU缓存）"""
+        path = self.items[index].path
+        with self._lock:
+            slide = self._slides.get(path)
+            if slide is not None:
+                self._slides.move_to_end(path)
+                return slide
+        slide = np.asarray(self.maker.load_slide(self.items[index], self.size))
+        with self._lock:
+            self._slides[path] = slide
+            while len(self._slides) > self.max_slides:
+                self._slides.popitem(last=False)
+        return slide
+    
+    def frame(self, position):
+        """返回时间轴中第 position 帧的 uint8 数组，未缓存时立即渲染
+        
+        Args:
+            position: 帧在时间轴中的位置
+            
+        Returns:
+            tuple: (uint8 帧数组, 显示时间毫秒)
+            
+        Raises:
+            ValueError: 当图片处理出错时
+        """
+        with self._lock:
+            spec = self.timeline[position]
+            key = self._frame_key(spec)
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                return frame, spec.duration
+        
+        frame = self.maker.render_frame(spec, self._slide)
+        
+        with self._lock:
+            self._frames[key] = frame
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        return frame, spec.duration
+    
+    def prefetch(self, position, count=16):
+        """在后台线程中渲染从 position 开始的 count 帧
+        
+        之前提交但尚未处理的请求会被新的请求取代。
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._prefetch_worker, daemon=True)
+            self._thread.start()
+        self._requests.put((self._generation, position, count))
+    
+    def _prefetch_worker(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            # 只处理最新的请求
+            try:
+                while True:
+                    request = self._requests.get_nowait()
+                    if request is None:
+                        return
+            except queue.Empty:
+                pass
+            
+            generation, position, count = request
+            for offset in range(count):
+                if generation != self._generation or not self._requests.empty():
+                    break
+                with self._lock:
+                    if not self.timeline:
+                        break
+                    current = (position + offset) % len(self.timeline)
+                try:
+                    self.frame(current)
+                except (ValueError, IndexError):
+                    break
+    
+    def close(self):
+        """停止后台预取线程"""
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread = None
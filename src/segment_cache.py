@@ -0,0 +1,107 @@
+from collections import OrderedDict
+import os
+import threading
+
+# 默认缓存上限：256MB
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def source_identity(path):
+    """返回标识源文件内容的元组 (绝对路径, 修改时间, 文件大小)
+    
+    Args:
+        path: 源图片路径
+        
+    Returns:
+        tuple: 文件标识，文件不存在时修改时间和大小为 None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (os.path.abspath(path), None, None)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+class SegmentCache:
+    """已编码GIF片段的内存缓存
+    
+    GIF输出按片段划分：开头淡入、每张图片、每个过渡和结尾淡出。
+    每个片段缓存编码后的帧 (图像块, 透明色索引, 合并的时间轴帧数)，键由影响片段内容的
+    输入组成（源文件标识、渲染设置、调色板等），不包含显示时间，
+    因此只修改显示时间或调整顺序后可以直接复用。
+    超过容量上限时按最近使用顺序淘汰。
+    """
+    
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """初始化缓存
+        
+        Args:
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # 键 -> (值, 字节数)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """读取缓存的值
+        
+        Args:
+            key: 可哈希的缓存键
+            
+        Returns:
+            缓存的值，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, value, nbytes):
+        """写入一个值，必要时淘汰最久未使用的条目
+        
+        Args:
+            key: 可哈希的缓存键
+            value: 缓存的值，例如编码后的帧列表或调色板
+            nbytes: 值占用的字节数，用于容量统计
+        """
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self._total_bytes += nbytes
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, size) = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                self.evictions += 1
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+    
+    def stats(self):
+        """返回缓存统计信息
+        
+        Returns:
+            dict: 命中数、未命中数、命中率、淘汰数、条目数和总字节数
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+            }
@@ -0,0 +1,712 @@
+"""本地渲染服务
+
+在本机启动一个HTTP服务，其他工具通过它提交渲染任务，不需要各自导入 GifMaker。
+任务进入有上限的队列，由固定数量的工作进程渲染，每个工作进程在任务之间保留
+SlideCache（可选，磁盘）和 SegmentCache（内存），重复渲染相同的图片时可以直接复用。
+
+用法:
+    python server.py --port 8765 --workers 2 --root ~/Pictures
+    python main.py serve --port 8765
+
+接口 (JSON):
+    POST   /jobs                  提交任务，返回 202 和任务状态；队列已满时返回 503
+    GET    /jobs/<id>[?wait=秒]    任务状态，wait 表示最多等待任务结束的秒数
+    GET    /jobs/<id>/result[?name=文件名&wait=秒]
+                                  下载输出文件，默认为主输出；任务未结束时返回 409
+    DELETE /jobs/<id>             取消排队中的任务，或删除已结束任务的文件
+    GET    /metrics               队列长度、运行中的任务数、任务计数和延迟统计
+    GET    /health                服务是否在运行
+
+提交任务的请求体:
+    {
+        "manifest": {...},
+        "files": {"cover.png": "<base64>"},
+        "compare": false
+    }
+"manifest" 与 cli.py 的清单格式相同。清单中的相对路径指向随请求上传的 "files"，
+绝对路径只允许位于 --root 指定的目录中。输出文件只使用清单中 "output" 的文件名，
+保存在服务的工作目录中，通过 /jobs/<id>/result 下载。
+上传的文件按内容保存在工作目录的 uploads 中，相同的文件在不同任务中使用同一个路径，
+因此工作进程的缓存在任务之间也可以命中；总大小超过上限时删除最久未使用的文件。
+工作进程异常退出（例如内存不足）时重建进程池，受影响的任务重试一次。
+
+服务只监听本机地址，不做身份验证。
+"""
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import base64
+import binascii
+import copy
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from cli import parse_manifest, render_manifest
+from segment_cache import SegmentCache
+from slide_cache import SlideCache
+
+# 默认的监听地址和端口
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 排队任务数上限，超过时拒绝新任务
+DEFAULT_MAX_QUEUE = 64
+# 保留的已结束任务数，超过时删除最早的任务及其文件
+DEFAULT_MAX_JOBS = 256
+# 请求体大小上限（字节），包括 base64 编码的上传文件
+DEFAULT_MAX_REQUEST_BYTES = 256 * 1024 * 1024
+# 每个工作进程的 SegmentCache 大小上限（字节）
+SEGMENT_CACHE_BYTES = 256 * 1024 * 1024
+# 按内容保存上传文件的子目录，以及其中文件的总大小上限（字节）
+UPLOAD_DIR = 'uploads'
+DEFAULT_MAX_UPLOAD_BYTES = 1024 * 1024 * 1024
+# 工作进程异常退出时，一个任务最多尝试的次数
+RENDER_ATTEMPTS = 2
+# 统计延迟时保留的最近任务数
+LATENCY_WINDOW = 1024
+# wait 参数的上限（秒）
+MAX_WAIT_SECONDS = 300
+# 下载输出文件时每次写入的字节数
+STREAM_CHUNK = 256 * 1024
+# 输出文件扩展名 -> Content-Type
+CONTENT_TYPES = {
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.png': 'image/apng',
+    '.mp4': 'video/mp4',
+    '.webm': 'video/webm',
+}
+
+# 工作进程中在任务之间保留的缓存，由 _init_worker 创建
+_slide_cache = None
+_segment_cache = None
+
+
+def _init_worker(cache_dir, segment_cache_bytes):
+    """工作进程初始化：创建在任务之间复用的缓存"""
+    global _slide_cache, _segment_cache
+    # Ctrl+C 由服务进程处理，正在渲染的任务在关闭时正常结束
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _slide_cache = SlideCache(cache_dir) if cache_dir else None
+    _segment_cache = SegmentCache(segment_cache_bytes)
+
+
+def _render_job(job_id, manifest, compare):
+    """在工作进程中渲染一个任务，结果中附加本次任务的缓存命中数"""
+    slide_hits = _slide_cache.hits if _slide_cache is not None else 0
+    segment_hits = _segment_cache.hits if _segment_cache is not None else 0
+    result = render_manifest(job_id, compare, manifest, _slide_cache, _segment_cache)
+    result['cache'] = {
+        'worker': os.getpid(),
+        'slide_hits': (_slide_cache.hits if _slide_cache is not None else 0) - slide_hits,
+        'segment_hits': (_segment_cache.hits if _segment_cache is not None else 0) - segment_hits,
+    }
+    return result
+
+
+def _percentiles(values):
+    """返回延迟样本的 p50、p95 和最大值（秒）"""
+    if not values:
+        return {'p50': None, 'p95': None, 'max': None}
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[int(round(q * (len(ordered) - 1)))], 4)
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'max': round(ordered[-1], 4)}
+
+
+def _upload_slide(slide, uploads):
+    """把清单中指向上传文件的图片条目改为上传文件保存的路径"""
+    if isinstance(slide, str) and slide in uploads:
+        return uploads[slide]
+    if isinstance(slide, dict) and isinstance(slide.get('path'), str) and slide['path'] in uploads:
+        return dict(slide, path=uploads[slide['path']])
+    return slide
+
+
+class ServiceBusy(Exception):
+    """任务队列已满"""
+    pass
+
+
+class RenderJob:
+    """一个渲染任务的状态"""
+    
+    def __init__(self, job_id, directory, manifest, compare, uploads=()):
+        self.id = job_id
+        self.directory = directory
+        self.uploads = list(uploads)  # 任务使用的上传文件路径
+        self.manifest = manifest
+        self.compare = compare
+        self.status = 'queued'  # queued、running、ok、error 或 cancelled
+        self.result = None
+        self.created = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+    
+    def outputs(self):
+        """返回任务生成的输出文件路径列表，主输出在最前"""
+        if self.status != 'ok':
+            return []
+        paths = [self.result['output']]
+        paths.extend(rendition['output'] for rendition in self.result.get('renditions', []))
+        paths.extend(item['path'] for item in self.result.get('formats', []) if item['path'] not in paths)
+        return paths
+    
+    def describe(self):
+        """返回可序列化为JSON的任务状态"""
+        status = {'id': self.id, 'status': self.status}
+        if self.started is not None:
+            status['wait_seconds'] = round(self.started - self.created, 4)
+        if self.finished is not None and self.started is not None:
+            status['render_seconds'] = round(self.finished - self.started, 4)
+        if self.result is not None:
+            status['result'] = self.result
+            status['outputs'] = [os.path.basename(path) for path in self.outputs()]
+        return status
+
+
+class RenderService:
+    """渲染任务队列和工作进程池
+    
+    任务按提交顺序排队，workers 个分发线程各自取出一个任务交给进程池，
+    因此同时渲染的任务数不超过 workers，未开始的任务都留在队列中，可以统计和取消。
+    工作进程使用 spawn 方式启动，与HTTP服务的线程互不影响。
+    """
+    
+    def __init__(self, work_dir=None, workers=2, max_queue=DEFAULT_MAX_QUEUE, cache_dir=None, roots=(),
+                 max_jobs=DEFAULT_MAX_JOBS, segment_cache_bytes=SEGMENT_CACHE_BYTES,
+                 max_upload_bytes=DEFAULT_MAX_UPLOAD_BYTES):
+        """初始化服务并启动工作进程
+        
+        Args:
+            work_dir: 保存上传文件和输出文件的目录，None 表示使用临时目录（关闭时删除）
+            workers: 工作进程数，也是同时渲染的任务数
+            max_queue: 排队任务数上限
+            cache_dir: SlideCache 目录，None 表示不使用磁盘缓存
+            roots: 允许清单直接引用的本地目录列表
+            max_jobs: 保留的已结束任务数
+            segment_cache_bytes: 每个工作进程的 SegmentCache 大小上限（字节）
+            max_upload_bytes: 保留的上传文件总大小上限（字节）
+        
+        Raises:
+            ValueError: 当参数无效时
+        """
+        if workers < 1:
+            raise ValueError("工作进程数必须大于0")
+        if max_queue < 1:
+            raise ValueError("队列长度必须大于0")
+        self._owns_work_dir = work_dir is None
+        self.work_dir = os.path.abspath(work_dir or tempfile.mkdtemp(prefix='ezgif-'))
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_jobs = max_jobs
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.max_upload_bytes = max_upload_bytes
+        self.upload_dir = os.path.realpath(os.path.join(self.work_dir, UPLOAD_DIR))
+        os.makedirs(self.upload_dir, exist_ok=True)
+        # 上传文件路径 -> 大小，按最近使用的顺序排列；工作目录中已有的文件按修改时间排列
+        self._uploads = OrderedDict()
+        existing = []
+        with os.scandir(self.upload_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.tmp'):
+                    # 上次运行中断时未完成的写入
+                    os.remove(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    existing.append((stat.st_mtime_ns, entry.path, stat.st_size))
+        for _, path, size in sorted(existing):
+            self._uploads[path] = size
+        
+        self._pool_args = (cache_dir, segment_cache_bytes)
+        self._pool = self._new_pool()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()  # 任务ID -> RenderJob
+        self._lock = threading.Lock()
+        self._running = 0
+        self._counts = {'submitted': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0,
+                        'pool_restarts': 0}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)  # (等待, 渲染, 总计) 秒
+        self._started = time.monotonic()
+        self._closing = False
+        self._dispatchers = [
+            threading.Thread(target=self._dispatch, daemon=True) for _ in range(workers)
+        ]
+        for thread in self._dispatchers:
+            thread.start()
+    
+    def _new_pool(self):
+        """创建工作进程池，工作进程在第一个任务提交时启动"""
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=self._pool_args
+        )
+    
+    def _replace_pool(self, broken):
+        """替换已损坏的进程池（其他分发线程可能已经替换过）
+        
+        Returns:
+            bool: 可以在新的进程池中重试时返回True；服务正在关闭时返回False
+        """
+        with self._lock:
+            if self._closing:
+                return False
+            if self._pool is broken:
+                self._pool = self._new_pool()
+                self._counts['pool_restarts'] += 1
+        broken.shutdown(wait=False)
+        return True
+    
+    def _allowed(self, path, directory):
+        """检查图片路径是否位于任务目录、上传目录或允许的本地目录中"""
+        real = os.path.realpath(path)
+        for root in [directory, self.upload_dir] + self.roots:
+            if os.path.commonpath([real, root]) == root:
+                return True
+        return False
+    
+    def _store_upload(self, name, data):
+        """按内容保存一个上传文件，返回保存的路径
+        
+        文件名为内容的SHA-256加原扩展名。已有相同内容的文件时不再写入，
+        路径和修改时间都不变，工作进程的缓存（按路径和修改时间识别文件）因此可以命中。
+        """
+        path = os.path.join(self.upload_dir, hashlib.sha256(data).hexdigest() + os.path.splitext(name)[1].lower())
+        with self._lock:
+            if path in self._uploads and os.path.exists(path):
+                self._uploads.move_to_end(path)
+                return path
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            if path in self._uploads and os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, path)
+            self._uploads[path] = len(data)
+            self._uploads.move_to_end(path)
+        return path
+    
+    def _evict_uploads(self):
+        """删除最久未使用的上传文件，直到总大小不超过上限（调用时需持有锁）
+        
+        排队中和正在渲染的任务使用的文件不会被删除。
+        """
+        total = sum(self._uploads.values())
+        if total <= self.max_upload_bytes:
+            return
+        in_use = {path for job in self._jobs.values() if job.status in ('queued', 'running') for path in job.uploads}
+        for path in list(self._uploads):
+            if total <= self.max_upload_bytes:
+                break
+            if path in in_use:
+                continue
+            total -= self._uploads.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def submit(self, manifest, files=None, compare=False):
+        """提交一个渲染任务
+        
+        Args:
+            manifest: 清单对象（格式见 cli.py）
+            files: 上传的文件 {文件名: 字节}，清单中的相对路径指向这些文件
+            compare: 是否生成全部可用格式（见 cli.render_manifest）
+        
+        Returns:
+            RenderJob: 新任务
+        
+        Raises:
+            ValueError: 当清单或上传文件无效时
+            ServiceBusy: 当队列已满或服务正在关闭时
+        """
+        if not isinstance(manifest, dict):
+            raise ValueError("清单必须是JSON对象")
+        if self._closing:
+            raise ServiceBusy("服务正在关闭")
+        job_id = uuid.uuid4().hex
+        directory = os.path.realpath(os.path.join(self.work_dir, job_id))
+        os.makedirs(directory)
+        try:
+            uploads = {}  # 上传文件名 -> 按内容保存的路径
+            for name, data in (files or {}).items():
+                if not name or os.path.basename(name) != name or name in ('.', '..'):
+                    raise ValueError(f"无效的上传文件名: {name!r}")
+                uploads[name] = self._store_upload(name, data)
+            
+            # 指向上传文件的图片改为按内容保存的路径；输出文件只保留文件名，写入任务目录
+            manifest = copy.deepcopy(manifest)
+            if isinstance(manifest.get('slides'), list):
+                manifest['slides'] = [_upload_slide(slide, uploads) for slide in manifest['slides']]
+            manifest['output'] = os.path.basename(manifest.get('output') or 'output.gif')
+            for rendition in manifest.get('renditions', []):
+                if isinstance(rendition, dict) and 'output' in rendition:
+                    rendition['output'] = os.path.basename(rendition['output'])
+            parsed = parse_manifest(manifest, directory)
+            for slide in parsed['slides']:
+                if not self._allowed(slide['path'], directory):
+                    raise ValueError(f"不允许访问的图片路径: {slide['path']}")
+            
+            job = RenderJob(job_id, directory, parsed, compare, uploads.values())
+            with self._lock:
+                if self._closing:
+                    raise ServiceBusy("服务正在关闭")
+                try:
+                    self._queue.put_nowait(job)
+                except queue.Full:
+                    self._counts['rejected'] += 1
+                    raise ServiceBusy(f"任务队列已满 ({self.max_queue})")
+                self._jobs[job_id] = job
+                self._counts['submitted'] += 1
+                self._evict_uploads()
+            return job
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+    
+    def _dispatch(self):
+        """分发线程：取出任务交给进程池并等待结果"""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.status == 'cancelled':
+                    continue
+                job.status = 'running'
+                job.started = time.monotonic()
+                self._running += 1
+            self._finish(job, self._run(job))
+    
+    def _run(self, job):
+        """在进程池中渲染任务，返回结果
+        
+        工作进程异常退出会使整个进程池失效（BrokenProcessPool），此时重建进程池，
+        任务最多尝试 RENDER_ATTEMPTS 次；同一时间在该进程池中渲染的其他任务也会各自重试。
+        """
+        error = None
+        for _ in range(RENDER_ATTEMPTS):
+            pool = self._pool
+            try:
+                return pool.submit(_render_job, job.id, job.manifest, job.compare).result()
+            except BrokenProcessPool as e:
+                error = e
+                if not self._replace_pool(pool):
+                    break
+            except Exception as e:
+                # 服务正在关闭
+                error = e
+                break
+        return {'manifest': job.id, 'status': 'error', 'error': str(error) or type(error).__name__}
+    
+    def _finish(self, job, result):
+        with self._lock:
+            job.finished = time.monotonic()
+            job.result = result
+            job.status = 'ok' if result.get('status') == 'ok' else 'error'
+            self._running -= 1
+            self._counts['succeeded' if job.status == 'ok' else 'failed'] += 1
+            self._latencies.append((job.started - job.created, job.finished - job.started,
+                                    job.finished - job.created))
+            job.done.set()
+            self._prune()
+            self._evict_uploads()
+    
+    def _prune(self):
+        """删除超出 max_jobs 的最早的已结束任务（调用时需持有锁）"""
+        finished = [job for job in self._jobs.values() if job.done.is_set()]
+        for job in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self._jobs[job.id]
+            shutil.rmtree(job.directory, ignore_errors=True)
+    
+    def get(self, job_id):
+        """返回任务，不存在时返回 None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def cancel(self, job_id):
+        """取消排队中的任务，或删除已结束的任务及其文件
+        
+        Args:
+            job_id: 任务ID
+        
+        Returns:
+            bool: 成功时返回True；任务不存在或正在渲染时返回False
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status == 'running':
+                return False
+            if job.status == 'queued':
+                # 仍留在队列中，分发线程取出时跳过
+                job.status = 'cancelled'
+                job.finished = time.monotonic()
+                self._counts['cancelled'] += 1
+                job.done.set()
+            del self._jobs[job_id]
+        shutil.rmtree(job.directory, ignore_errors=True)
+        return True
+    
+    def metrics(self):
+        """返回可序列化为JSON的服务指标"""
+        with self._lock:
+            latencies = list(self._latencies)
+            counts = dict(self._counts)
+            running = self._running
+            queued = sum(1 for job in self._jobs.values() if job.status == 'queued')
+        return {
+            'uptime_seconds': round(time.monotonic() - self._started, 1),
+            'workers': self.workers,
+            'queue_depth': queued,
+            'queue_capacity': self.max_queue,
+            'running': running,
+            'jobs': counts,
+            'latency_seconds': {
+                'samples': len(latencies),
+                'wait': _percentiles([item[0] for item in latencies]),
+                'render': _percentiles([item[1] for item in latencies]),
+                'total': _percentiles([item[2] for item in latencies]),
+            },
+        }
+    
+    def close(self):
+        """停止分发线程和工作进程，等待正在渲染的任务结束，排队中的任务不再执行"""
+        with self._lock:
+            self._closing = True
+            try:
+                while True:
+                    job = self._queue.get_nowait()
+                    if job.status == 'queued':
+                        job.status = 'cancelled'
+                        job.done.set()
+            except queue.Empty:
+                pass
+        for _ in self._dispatchers:
+            self._queue.put(None)
+        with self._lock:
+            pool = self._pool
+        pool.shutdown(wait=True, cancel_futures=True)
+        for thread in self._dispatchers:
+            thread.join()
+        if self._owns_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """把HTTP请求转换为 RenderService 调用"""
+    
+    server_version = 'ezGIF'
+    
+    @property
+    def service(self):
+        return self.server.service
+    
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_error(self, status, message):
+        self._send_json(status, {'error': message})
+    
+    def _route(self):
+        """拆分请求路径，返回 (路径段列表, 查询参数字典)"""
+        parts = urlsplit(self.path)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        return segments, query
+    
+    def _wait(self, job, query):
+        """按 wait 参数等待任务结束"""
+        try:
+            seconds = min(float(query.get('wait', 0)), MAX_WAIT_SECONDS)
+        except ValueError:
+            seconds = 0
+        if seconds > 0:
+            job.done.wait(seconds)
+    
+    def do_GET(self):
+        segments, query = self._route()
+        if segments == ['health']:
+            self._send_json(HTTPStatus.OK, {'status': 'ok'})
+        elif segments == ['metrics']:
+            self._send_json(HTTPStatus.OK, self.service.metrics())
+        elif len(segments) in (2, 3) and segments[0] == 'jobs':
+            job = self.service.get(segments[1])
+            if job is None:
+                self._send_error(HTTPStatus.NOT_FOUND, "任务不存在")
+            elif len(segments) == 2:
+                self._wait(job, query)
+                self._send_json(HTTPStatus.OK, job.describe())
+            elif segments[2] == 'result':
+                self._wait(job, query)
+                self._send_result(job, query.get('name'))
+            else:
+                self._send_error(HTTPStatus.NOT_FOUND, "未知的路径")
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, "未知的路径")
+    
+    def _send_result(self, job, name=None):
+        """以流的方式发送任务的输出文件"""
+        if not job.done.is_set():
+            self._send_json(HTTPStatus.CONFLICT, job.describe())
+            return
+        outputs = job.outputs()
+        if not outputs:
+            self._send_json(HTTPStatus.CONFLICT, job.describe())
+            return
+        if name is None:
+            path = outputs[0]
+        else:
+            path = next((output for output in outputs if os.path.basename(output) == name), None)
+            if path is None:
+                self._send_error(HTTPStatus.NOT_FOUND, f"没有输出文件: {name}")
+                return
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self._send_error(HTTPStatus.GONE, "输出文件已被删除")
+            return
+        with f:
+            self.send_response(HTTPStatus.OK)
+            content_type = CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream')
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, STREAM_CHUNK)
+    
+    def do_POST(self):
+        segments, _ = self._route()
+        if segments != ['jobs']:
+            self._send_error(HTTPStatus.NOT_FOUND, "未知的路径")
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_error(HTTPStatus.BAD_REQUEST, "无效的 Content-Length")
+            return
+        if length > self.server.max_request_bytes:
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+            self.close_connection = True
+            return
+        try:
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError("请求体必须是JSON对象")
+            files = {
+                name: base64.b64decode(data, validate=True)
+                for name, data in (request.get('files') or {}).items()
+            }
+            job = self.service.submit(request.get('manifest'), files, bool(request.get('compare', False)))
+        except ServiceBusy as e:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+        except (ValueError, TypeError, AttributeError, binascii.Error) as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        else:
+            self._send_json(HTTPStatus.ACCEPTED, job.describe())
+    
+    def do_DELETE(self):
+        segments, _ = self._route()
+        if len(segments) != 2 or segments[0] != 'jobs':
+            self._send_error(HTTPStatus.NOT_FOUND, "未知的路径")
+        elif self.service.cancel(segments[1]):
+            self._send_json(HTTPStatus.OK, {'id': segments[1], 'status': 'deleted'})
+        elif self.service.get(segments[1]) is None:
+            self._send_error(HTTPStatus.NOT_FOUND, "任务不存在")
+        else:
+            self._send_error(HTTPStatus.CONFLICT, "任务正在渲染，无法取消")
+
+
+class RenderServer(ThreadingHTTPServer):
+    """每个请求一个线程的HTTP服务，共享同一个 RenderService"""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, service, max_request_bytes=DEFAULT_MAX_REQUEST_BYTES):
+        """初始化服务
+        
+        Args:
+            address: 监听地址 (主机, 端口)，端口为0时自动选择
+            service: RenderService 对象
+            max_request_bytes: 请求体大小上限（字节）
+        """
+        self.service = service
+        self.max_request_bytes = max_request_bytes
+        super().__init__(address, RenderRequestHandler)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="本地GIF渲染服务")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="监听地址，默认只接受本机连接")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument('-w', '--workers', type=int, default=2, help="工作进程数")
+    parser.add_argument('--queue', type=int, default=DEFAULT_MAX_QUEUE, help="排队任务数上限")
+    parser.add_argument('--work-dir', help="保存上传和输出文件的目录，默认使用临时目录")
+    parser.add_argument('--cache-dir', help="SlideCache 目录，在任务之间复用处理后的图片")
+    parser.add_argument('--root', action='append', default=[],
+                        help="允许清单直接引用的本地图片目录，可以指定多次")
+    parser.add_argument('--max-jobs', type=int, default=DEFAULT_MAX_JOBS, help="保留的已结束任务数")
+    return parser
+
+
+def main(argv=None):
+    """服务入口，按 Ctrl+C 停止
+    
+    Returns:
+        int: 退出码
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        service = RenderService(args.work_dir, args.workers, args.queue, args.cache_dir, args.root,
+                                args.max_jobs)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    with service:
+        server = RenderServer((args.host, args.port), service)
+        host, port = server.server_address[:2]
+        print(f"渲染服务已启动: http://{host}:{port}/ (工作目录 {service.work_dir})", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
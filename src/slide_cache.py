@@ -0,0 +1,149 @@
+import hashlib
+import os
+import numpy as np
+
+# 默认缓存上限：2GB
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+class SlideCache:
+    """处理后图片的磁盘缓存
+    
+    以源文件路径、修改时间、文件大小、目标尺寸和缩放滤镜作为键，
+    把缩放并居中后的图片数组保存为 .npy 文件，读取时使用内存映射。
+    超过容量上限时按最近使用时间淘汰（命中时会更新文件的修改时间）。
+    """
+    
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """初始化缓存
+        
+        Args:
+            directory: 缓存目录，不存在时自动创建
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+    
+    def _entries(self):
+        """列出缓存文件 (路径, 最近使用时间, 大小)"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npy') and entry.is_file():
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        return entries
+    
+    def key(self, path, size, resample):
+        """计算缓存键
+        
+        Args:
+            path: 源图片路径
+            size: 目标图片大小 (宽, 高)
+            resample: 缩放滤镜
+            
+        Returns:
+            str: 缓存键，源文件不存在时返回 None
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        raw = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{size[0]}x{size[1]}|{int(resample)}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    
+    def _file(self, key):
+        return os.path.join(self.directory, key + '.npy')
+    
+    def get(self, path, size, resample):
+        """读取缓存的图片数组
+        
+        Args:
+            path: 源图片路径
+            size: 目标图片大小 (宽, 高)
+            resample: 缩放滤镜
+            
+        Returns:
+            numpy.ndarray: 只读的内存映射数组，未命中时返回 None
+        """
+        key = self.key(path, size, resample)
+        if key is not None:
+            cache_file = self._file(key)
+            try:
+                array = np.load(cache_file, mmap_mode='r')
+                os.utime(cache_file)  # 更新最近使用时间
+                self.hits += 1
+                return array
+            except (OSError, ValueError):
+                pass
+        self.misses += 1
+        return None
+    
+    def put(self, path, size, resample, array):
+        """写入图片数组，必要时淘汰最久未使用的条目
+        
+        Args:
+            path: 源图片路径
+            size: 目标图片大小 (宽, 高)
+            resample: 缩放滤镜
+            array: 处理后的 uint8 图片数组
+        """
+        key = self.key(path, size, resample)
+        if key is None:
+            return
+        cache_file = self._file(key)
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            np.save(f, np.asarray(array))
+        try:
+            old_size = os.path.getsize(cache_file)
+        except OSError:
+            old_size = 0
+        os.replace(temp_file, cache_file)
+        self._total_bytes += os.path.getsize(cache_file) - old_size
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+    
+    def _evict(self):
+        """按最近使用时间从旧到新删除缓存文件，直到低于容量上限"""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._total_bytes = sum(size for _, _, size in entries)
+        for cache_file, _, size in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(cache_file)
+            except OSError:
+                # 文件可能仍被内存映射占用（Windows），跳过
+                continue
+            self._total_bytes -= size
+            self.evictions += 1
+    
+    def clear(self):
+        """删除所有缓存文件"""
+        for cache_file, _, _ in self._entries():
+            try:
+                os.remove(cache_file)
+            except OSError:
+                pass
+        self._total_bytes = sum(size for _, _, size in self._entries())
+    
+    def stats(self):
+        """返回缓存统计信息
+        
+        Returns:
+            dict: 命中数、未命中数、命中率、淘汰数、条目数和总字节数
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries()),
+            'bytes': self._total_bytes,
+        }
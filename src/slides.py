@@ -0,0 +1,235 @@
+import gzip
+import hashlib
+import json
+import os
+from PIL import Image
+
+# EXIF 中的拍摄时间（Exif IFD 中的 DateTimeOriginal）和修改时间（IFD0 中的 DateTime）
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+# 计算文件摘要时每次读取的字节数
+DIGEST_CHUNK = 1024 * 1024
+
+# 项目文件的扩展名
+PROJECT_SUFFIX = '.ezgif'
+# 项目文件格式版本，结构变化时递增
+PROJECT_VERSION = 1
+# 项目文件中每张图片按以下顺序保存为一个数组
+PROJECT_FIELDS = (
+    'path', 'duration', 'transition', 'format', 'mode', 'width', 'height',
+    'file_size', 'mtime_ns', 'digest', 'captured',
+)
+
+
+def file_digest(path):
+    """计算文件内容的SHA-1摘要
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        str: 十六进制摘要
+    
+    Raises:
+        OSError: 当文件无法读取时
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Slide:
+    """队列中的一张图片
+    
+    除了显示时间和过渡效果，还保存添加时从文件头读取的格式、模式和分辨率，
+    以及文件大小、修改时间和内容摘要，用于判断文件是否变化而不需要重新解码。
+    内容摘要需要读取整个文件，因此添加时不计算，保存项目时才计算（见 ensure_digest）。
+    """
+    
+    __slots__ = (
+        'path', 'name', 'duration', 'transition', 'format', 'mode', 'width', 'height',
+        'file_size', 'mtime_ns', 'digest', 'captured',
+    )
+    
+    def __init__(self, path, duration=1000, transition=None, format=None, mode=None, width=0, height=0,
+                 file_size=None, mtime_ns=None, digest=None, captured=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.duration = duration
+        self.transition = transition
+        self.format = format
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.file_size = file_size
+        self.mtime_ns = mtime_ns
+        self.digest = digest
+        self.captured = captured
+    
+    @classmethod
+    def probe(cls, path, duration=1000, exif=False):
+        """读取图片文件头和文件状态，生成图片信息
+        
+        只读取格式、模式和分辨率，完整的解码校验推迟到生成GIF时。
+        
+        Args:
+            path: 图片文件路径
+            duration: 图片显示持续时间（毫秒）
+            exif: 是否读取EXIF拍摄时间（没有时为 None）
+        
+        Returns:
+            Slide: 图片信息
+        
+        Raises:
+            Exception: 当文件无法作为图片打开时
+        """
+        slide = cls(path, duration)
+        slide._probe(exif)
+        return slide
+    
+    def _probe(self, exif=False):
+        stat = os.stat(self.path)
+        with Image.open(self.path) as img:
+            self.format = img.format
+            self.mode = img.mode
+            self.width, self.height = img.size
+            if exif:
+                tags = img.getexif()
+                captured = tags.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or tags.get(EXIF_DATETIME) or ''
+                # EXIF 时间格式为 "YYYY:MM:DD HH:MM:SS"，可以直接按字符串排序
+                self.captured = str(captured).strip('\x00 ') or None
+        self.file_size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        # 文件内容可能已变化，旧的摘要不再有效
+        self.digest = None
+    
+    def ensure_digest(self):
+        """计算并保存内容摘要（已有时直接返回）
+        
+        只有文件大小和修改时间与添加时记录的相同时才计算，
+        否则摘要与保存的文件头信息可能不对应，保持为 None。
+        
+        Returns:
+            str: 十六进制摘要，文件已变化或无法读取时为 None
+        """
+        if self.digest is None:
+            try:
+                stat = os.stat(self.path)
+                if stat.st_size == self.file_size and stat.st_mtime_ns == self.mtime_ns:
+                    self.digest = file_digest(self.path)
+            except OSError:
+                pass
+        return self.digest
+    
+    @property
+    def size(self):
+        """原始分辨率 (宽, 高)"""
+        return (self.width, self.height)
+    
+    def copy(self):
+        """返回图片信息的浅拷贝"""
+        other = Slide.__new__(Slide)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        return other
+    
+    def refresh(self):
+        """检查文件是否变化，必要时更新保存的信息
+        
+        文件大小和修改时间都未变时不读取文件；否则有内容摘要时先比较摘要，
+        内容相同（例如只是修改时间变了）时只更新文件状态，
+        内容不同或没有摘要时才重新读取文件头。
+        
+        Returns:
+            str: 'unchanged'、'touched'、'changed' 或 'missing'（文件不存在或无法打开）
+        """
+        try:
+            stat = os.stat(self.path)
+            if stat.st_size == self.file_size and stat.st_mtime_ns == self.mtime_ns:
+                return 'unchanged'
+            if self.digest is not None and file_digest(self.path) == self.digest:
+                self.file_size = stat.st_size
+                self.mtime_ns = stat.st_mtime_ns
+                return 'touched'
+            self._probe(exif=self.captured is not None)
+        except Exception:
+            return 'missing'
+        return 'changed'
+    
+    def __repr__(self):
+        return f"Slide({self.path!r}, duration={self.duration!r}, size={self.size!r})"
+
+
+def write_project(path, slides, settings=None):
+    """把图片列表和设置保存为项目文件
+    
+    项目文件是 gzip 压缩的紧凑JSON，每张图片按 PROJECT_FIELDS 的顺序保存为一个数组。
+    尚未计算内容摘要的图片在这里计算（见 Slide.ensure_digest）。
+    与项目文件在同一磁盘上的图片路径保存为相对于项目文件目录的路径，
+    这样整个目录移动后仍然可以打开。先写入临时文件再替换，写入失败不会损坏原文件。
+    
+    Args:
+        path: 项目文件路径
+        slides: Slide 列表
+        settings: 可选的设置字典（需要可以序列化为JSON），例如输出大小和过渡帧数
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    rows = []
+    for slide in slides:
+        slide.ensure_digest()
+        row = [getattr(slide, name) for name in PROJECT_FIELDS]
+        try:
+            row[0] = os.path.relpath(os.path.abspath(slide.path), base)
+        except ValueError:  # Windows 上不同的盘符
+            row[0] = os.path.abspath(slide.path)
+        rows.append(row)
+    
+    project = {
+        'version': PROJECT_VERSION,
+        'fields': list(PROJECT_FIELDS),
+        'settings': settings or {},
+        'slides': rows,
+    }
+    data = json.dumps(project, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    temp_path = path + '.tmp'
+    with gzip.open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def read_project(path):
+    """读取项目文件，不检查图片文件（见 Slide.refresh）
+    
+    Args:
+        path: 项目文件路径
+    
+    Returns:
+        tuple: (Slide 列表, 设置字典)
+    
+    Raises:
+        ValueError: 当文件不是有效的项目文件或版本不受支持时
+    """
+    try:
+        with gzip.open(path, 'rb') as f:
+            project = json.loads(f.read().decode('utf-8'))
+        version = project['version']
+        fields = project['fields']
+        rows = project['slides']
+    except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"无法读取项目文件 {path}: {str(e)}")
+    if version > PROJECT_VERSION:
+        raise ValueError(f"不支持的项目文件版本: {version}")
+    
+    base = os.path.dirname(os.path.abspath(path))
+    slides = []
+    for row in rows:
+        values = dict(zip(fields, row))
+        if 'path' not in values:
+            raise ValueError(f"项目文件 {path} 中的图片缺少路径")
+        values['path'] = os.path.normpath(os.path.join(base, values['path']))
+        slides.append(Slide(**{name: values[name] for name in PROJECT_FIELDS if name in values}))
+    return slides, project.get('settings') or {}
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from PIL import Image
+import os
+
+# 列表预览缩略图的最大尺寸
+THUMBNAIL_SIZE = (100, 100)
+
+
+def load_thumbnail(path, max_size=THUMBNAIL_SIZE):
+    """读取图片的缩略图
+    
+    对JPEG使用 draft 按缩小的比例解码，不需要解码全分辨率图片。
+    
+    Args:
+        path: 图片文件路径
+        max_size: 缩略图最大尺寸 (宽, 高)
+        
+    Returns:
+        tuple: (PIL Image 缩略图, 原始分辨率 (宽, 高))
+    """
+    with Image.open(path) as img:
+        original_size = img.size
+        if img.format == 'JPEG':
+            img.draft('RGB', max_size)
+        img.thumbnail(max_size)
+        return img.copy(), original_size
+
+
+class ThumbnailCache:
+    """按路径缓存缩略图的LRU缓存
+    
+    文件的修改时间变化后缓存自动失效。
+    可以提供 factory 把缩略图转换为界面使用的对象（例如 ImageTk.PhotoImage），
+    缓存中保存的是转换后的对象。
+    """
+    
+    def __init__(self, max_items=512, max_size=THUMBNAIL_SIZE, factory=None):
+        """初始化缓存
+        
+        Args:
+            max_items: 最多缓存的缩略图数量
+            max_size: 缩略图最大尺寸 (宽, 高)
+            factory: 可选的转换函数，参数为 PIL Image
+        """
+        self.max_items = max_items
+        self.max_size = max_size
+        self.factory = factory
+        self._entries = OrderedDict()  # 路径 -> (修改时间, 缩略图, 原始分辨率)
+    
+    def get(self, path):
+        """获取缩略图，未缓存时读取并加入缓存
+        
+        Args:
+            path: 图片文件路径
+            
+        Returns:
+            tuple: (缩略图对象, 原始分辨率 (宽, 高))
+        """
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == mtime:
+            self._entries.move_to_end(path)
+            return entry[1], entry[2]
+        
+        thumbnail, original_size = load_thumbnail(path, self.max_size)
+        if self.factory is not None:
+            thumbnail = self.factory(thumbnail)
+        self._entries[path] = (mtime, thumbnail, original_size)
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+        return thumbnail, original_size
+    
+    def discard(self, path):
+        """移除指定路径的缓存"""
+        self._entries.pop(path, None)
+    
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
@@ -0,0 +1,273 @@
+"""图片之间的过渡效果
+
+每种效果把过渡进度（定点权重 0..256，与 blending 相同）映射为一帧，
+帧由数组切片复制或预先计算的索引表一次取值生成，写入复用的输出缓冲区。
+新的效果继承 Transition 并用 register_transition 注册后即可在
+Slide 的 transition 属性中按名称选择。
+"""
+import numpy as np
+from blending import WEIGHT_BITS, WEIGHT_ONE, blend_frames
+
+# 未指定过渡效果时使用交叉淡化
+DEFAULT_TRANSITION = 'crossfade'
+
+# 溶解效果中同时出现的方块边长（像素），比逐像素溶解更易压缩
+DISSOLVE_CELL = 4
+
+# 已注册的过渡效果：名称 -> Transition 对象，按注册顺序排列
+TRANSITIONS = {}
+
+
+def register_transition(transition):
+    """注册过渡效果，同名效果会被替换
+    
+    Args:
+        transition: Transition 对象
+        
+    Returns:
+        Transition: 传入的对象
+    """
+    TRANSITIONS[transition.name] = transition
+    return transition
+
+
+def get_transition(name=None):
+    """按名称查找过渡效果
+    
+    Args:
+        name: 效果名称，None 表示默认的交叉淡化
+        
+    Returns:
+        Transition: 过渡效果
+        
+    Raises:
+        ValueError: 当效果不存在时
+    """
+    transition = TRANSITIONS.get(name or DEFAULT_TRANSITION)
+    if transition is None:
+        raise ValueError(f"不支持的过渡效果: {name}")
+    return transition
+
+
+class Transition:
+    """过渡效果基类
+    
+    子类实现 render，把 src 到 dst 在给定进度下的一帧写入输出缓冲区。
+    """
+    
+    name = None
+    label = None  # 界面上显示的名称
+    # 两张图片相近时是否可以减少帧数；运动类效果的帧数决定运动的流畅度，不能减少
+    adaptive = False
+    
+    def render(self, src, dst, weight, out):
+        """生成一帧
+        
+        Args:
+            src: uint8 起始图片数组 (高, 宽, 通道)
+            dst: uint8 目标图片数组，尺寸与 src 相同
+            weight: 过渡进度，0..256
+            out: 与 src 尺寸相同的 uint8 输出缓冲区
+        """
+        raise NotImplementedError
+    
+    def frames(self, src, dst, weights):
+        """依次生成过渡的每一帧
+        
+        生成的数组是同一个输出缓冲区，在取下一帧之前有效，需要保留时请自行复制。
+        
+        Args:
+            src: uint8 起始图片数组 (高, 宽, 通道)
+            dst: uint8 目标图片数组，尺寸与 src 相同
+            weights: 每一帧的过渡进度序列，取值 0..256
+            
+        Yields:
+            numpy.ndarray: uint8 过渡帧
+            
+        Raises:
+            ValueError: 当两张图片尺寸不一致时
+        """
+        src, dst = _check_pair(src, dst)
+        out = np.empty_like(src)
+        for weight in weights:
+            self.render(src, dst, int(weight), out)
+            yield out
+
+
+def _check_pair(src, dst):
+    src = np.asarray(src, dtype=np.uint8)
+    dst = np.asarray(dst, dtype=np.uint8)
+    if src.shape != dst.shape:
+        raise ValueError("过渡的两张图片尺寸不一致")
+    return src, dst
+
+
+class Crossfade(Transition):
+    """交叉淡化，使用 blend_frames 批量混合"""
+    
+    name = 'crossfade'
+    label = '淡入淡出'
+    adaptive = True
+    
+    def render(self, src, dst, weight, out):
+        np.copyto(out, next(blend_frames(src, dst, [weight])))
+    
+    def frames(self, src, dst, weights):
+        return blend_frames(src, dst, weights)
+
+
+class Slide(Transition):
+    """滑动：起始图片向 direction 方向移出，目标图片从反方向跟随进入"""
+    
+    LABELS = {'left': '向左滑动', 'right': '向右滑动', 'up': '向上滑动', 'down': '向下滑动'}
+    
+    def __init__(self, direction):
+        self.direction = direction
+        self.name = f'slide_{direction}'
+        self.label = self.LABELS[direction]
+    
+    def render(self, src, dst, weight, out):
+        # 上下方向转置为左右方向处理，转置视图的切片复制不需要额外内存
+        if self.direction in ('up', 'down'):
+            src, dst, out = (a.swapaxes(0, 1) for a in (src, dst, out))
+        width = src.shape[1]
+        offset = (width * weight) >> WEIGHT_BITS
+        if self.direction in ('right', 'down'):
+            out[:, offset:] = src[:, :width - offset]
+            out[:, :offset] = dst[:, width - offset:]
+        else:
+            out[:, :width - offset] = src[:, offset:]
+            out[:, width - offset:] = dst[:, :offset]
+
+
+class Wipe(Transition):
+    """擦除：两张图片都不动，分界线向 direction 方向移动露出目标图片"""
+    
+    LABELS = {'left': '向左擦除', 'right': '向右擦除', 'up': '向上擦除', 'down': '向下擦除'}
+    
+    def __init__(self, direction):
+        self.direction = direction
+        self.name = f'wipe_{direction}'
+        self.label = self.LABELS[direction]
+    
+    def render(self, src, dst, weight, out):
+        if self.direction in ('up', 'down'):
+            src, dst, out = (a.swapaxes(0, 1) for a in (src, dst, out))
+        width = src.shape[1]
+        edge = (width * weight) >> WEIGHT_BITS
+        if self.direction == 'left' or self.direction == 'up':
+            edge = width - edge
+            src, dst = dst, src
+        out[:, :edge] = dst[:, :edge]
+        out[:, edge:] = src[:, edge:]
+
+
+class Zoom(Transition):
+    """缩放：目标图片从中心放大覆盖起始图片
+    
+    每个进度对应一张最近邻取样的索引表，生成帧时只需要一次 np.take。
+    """
+    
+    name = 'zoom'
+    label = '缩放'
+    
+    def __init__(self):
+        self._maps = {}  # (高, 宽, 权重) -> (上, 左, 扁平索引表)
+    
+    def _index_map(self, height, width, weight):
+        key = (height, width, weight)
+        entry = self._maps.get(key)
+        if entry is None:
+            if len(self._maps) > 2 * WEIGHT_ONE:
+                self._maps.clear()
+            scaled_height = (height * weight) >> WEIGHT_BITS
+            scaled_width = (width * weight) >> WEIGHT_BITS
+            rows = np.arange(scaled_height) * height // max(scaled_height, 1)
+            cols = np.arange(scaled_width) * width // max(scaled_width, 1)
+            flat = (rows[:, np.newaxis] * width + cols).astype(np.intp)
+            entry = ((height - scaled_height) // 2, (width - scaled_width) // 2, flat)
+            self._maps[key] = entry
+        return entry
+    
+    def render(self, src, dst, weight, out):
+        height, width = src.shape[:2]
+        top, left, flat = self._index_map(height, width, weight)
+        bottom, right = top + flat.shape[0], left + flat.shape[1]
+        # 只复制缩放区域以外的部分
+        out[:top] = src[:top]
+        out[bottom:] = src[bottom:]
+        out[top:bottom, :left] = src[top:bottom, :left]
+        out[top:bottom, right:] = src[top:bottom, right:]
+        pixels = dst.reshape(height * width, -1)
+        np.take(pixels, flat, axis=0, out=out[top:bottom, left:right], mode='clip')
+
+
+class Dissolve(Transition):
+    """溶解：目标图片以随机顺序的小方块逐渐出现
+    
+    方块顺序由固定种子生成，同样的尺寸总是得到同样的结果。
+    像素按出现顺序预先排好，连续生成时每帧只复制新出现的像素。
+    """
+    
+    name = 'dissolve'
+    label = '溶解'
+    
+    def __init__(self, cell=DISSOLVE_CELL, seed=0):
+        self.cell = cell
+        self.seed = seed
+        self._orders = {}  # (高, 宽) -> (像素顺序, 按方块数计的像素数)
+    
+    def _order(self, height, width):
+        key = (height, width)
+        entry = self._orders.get(key)
+        if entry is None:
+            cell_rows = -(-height // self.cell)
+            cell_cols = -(-width // self.cell)
+            rank = np.random.default_rng(self.seed).permutation(cell_rows * cell_cols)
+            rank = rank.reshape(cell_rows, cell_cols).repeat(self.cell, 0).repeat(self.cell, 1)
+            rank = rank[:height, :width].ravel()
+            order = np.argsort(rank, kind='stable')
+            # 前 k 个方块包含的像素数
+            counts = np.searchsorted(rank[order], np.arange(cell_rows * cell_cols + 1))
+            entry = (order, counts)
+            self._orders = {key: entry}
+        return entry
+    
+    def _count(self, counts, weight):
+        cells = len(counts) - 1
+        return counts[(cells * weight + WEIGHT_ONE // 2) >> WEIGHT_BITS]
+    
+    def render(self, src, dst, weight, out):
+        height, width = src.shape[:2]
+        order, counts = self._order(height, width)
+        shown = order[:self._count(counts, weight)]
+        np.copyto(out, src)
+        out.reshape(height * width, -1)[shown] = dst.reshape(height * width, -1)[shown]
+    
+    def frames(self, src, dst, weights):
+        src, dst = _check_pair(src, dst)
+        height, width = src.shape[:2]
+        order, counts = self._order(height, width)
+        out = src.copy()
+        out_pixels = out.reshape(height * width, -1)
+        dst_pixels = dst.reshape(height * width, -1)
+        shown = 0
+        for weight in weights:
+            count = self._count(counts, int(weight))
+            if count < shown:
+                # 进度倒退时重新生成整帧
+                self.render(src, dst, int(weight), out)
+            else:
+                index = order[shown:count]
+                out_pixels[index] = dst_pixels[index]
+            shown = count
+            yield out
+
+
+register_transition(Crossfade())
+for _direction in ('left', 'right', 'up', 'down'):
+    register_transition(Slide(_direction))
+for _direction in ('left', 'right', 'up', 'down'):
+    register_transition(Wipe(_direction))
+register_transition(Zoom())
+register_transition(Dissolve())